@@ -1,38 +1,89 @@
 import os
 import asyncio
-from model_api import ModelAPI
+import chunker
+import dedup
+from file_walker import FileWalker
 from project_loader import ProjectLoader
+import incremental
+import metrics
+import pretriage
 import reporter
+from run_journal import RunJournal
+from symbol_index import SymbolIndex
 
 
 class Agent:
-    def __init__(self, model=None):
-        """Создает агента и привязывает модель анализа."""
-        self.model = model or ModelAPI()
+    def __init__(
+        self,
+        model=None,
+        concurrency: int = 1,
+        since: str | None = None,
+        state_file: str | None = None,
+        loader_options: dict | None = None,
+        batch_tokens: int = 0,
+        journal_file: str | None = None,
+        resume: bool = False,
+        escalation_model=None,
+        pretriage_min_score: int | None = None,
+        pretriage_workers: int | None = None,
+        walker_options: dict | None = None,
+        dedup_threshold: float | None = None,
+        dry_run: bool = False,
+        symbol_index: bool = True,
+    ):
+        """Создает агента и привязывает модель анализа.
+
+        since — git-ссылка, относительно которой анализируются только измененные файлы;
+        state_file — файл состояния инкрементального режима (коммит и прошлые результаты);
+        loader_options — параметры ProjectLoader для клонирования (кэш, depth, sparse);
+        batch_tokens — бюджет токенов пакетного запроса для мелких файлов (0 — выключено);
+        journal_file — журнал запуска (план и результаты файлов по мере готовности);
+        resume — продолжить прерванный запуск по журналу, пропуская готовые файлы;
+        escalation_model — каскад: более сильная модель, которая повторно анализирует
+        файлы, отмеченные первичным (дешевым) анализом вместо deep_dive;
+        pretriage_min_score — включает локальную статическую оценку риска: файлы
+        с оценкой ниже порога не отправляются модели, остальные анализируются
+        и попадают в отчет в порядке убывания риска;
+        pretriage_workers — число процессов для статической оценки (None — по CPU);
+        walker_options — параметры FileWalker (include/exclude, max_file_size, .gitignore);
+        dedup_threshold — включает поиск копий: точные и почти точные (сходство
+        MinHash не ниже порога) копии файла не анализируются, им переносится
+        результат первого файла кластера;
+        dry_run — только показать, какие файлы и как будут проанализированы, без LLM;
+        symbol_index — строить индекс символов проекта и добавлять в промпт файла
+        определения, на которые он ссылается (вместо поиска в памяти по имени файла).
+        """
+        self._model = model
+        self.concurrency = max(1, concurrency)
+        self.since = since
+        self.state_file = state_file
+        self.loader_options = loader_options or {}
+        self.batch_tokens = batch_tokens
+        self.journal_file = journal_file
+        self.resume = resume
+        self.escalation_model = escalation_model
+        self.pretriage_min_score = pretriage_min_score
+        self.pretriage_workers = pretriage_workers
+        self.walker_options = walker_options or {}
+        self.dedup_threshold = dedup_threshold
+        self.dry_run = dry_run
+        self.symbol_index = symbol_index
+
+    @property
+    def model(self):
+        """Модель анализа; OpenAI (ModelAPI) создается, только если модель не передана."""
+        if self._model is None:
+            from model_api import ModelAPI
+
+            self._model = ModelAPI()
+        return self._model
 
     async def run_from_git(self, git_url: str, output_file: str = "analysis_report.md"):
         """Клонирует проект, анализирует файлы и сохраняет итоговый отчет."""
-        loader = ProjectLoader()
+        loader = ProjectLoader(**self.loader_options)
         path = loader.clone_project(git_url)
         try:
-            files = self._collect_files(path)
-            print(f"[agent] Файлов для анализа: {len(files)}")
-            plan_text = await self.model.get_plan(files)
-            if plan_text:
-                print("[agent] План анализа:")
-                print(plan_text)
-            analysis_results = {}
-            action_log = []
-            for file_path in files:
-                print(f"[agent] Анализ файла: {file_path}")
-                steps, result = await self._run_file_actions(file_path)
-                analysis_results[file_path] = result
-                action_log.extend(steps)
-            reflection = await self.model.reflect(plan_text or "", action_log)
-            report_md = reporter.generate_report(analysis_results, reflection=reflection)
-            reporter.save_report(report_md, output_file)
-            reporter.print_report_console(report_md)
-            print(f"\nОтчет сохранен в файл: {output_file}")
+            await self._run_analysis(loader, path, output_file)
         finally:
             loader.cleanup()
 
@@ -40,28 +91,361 @@ class Agent:
         """Анализирует локальный проект, уже размещенный в sandbox."""
         loader = ProjectLoader()
         path = loader.use_local_project(local_path)
-        try:
-            files = self._collect_files(path)
-            print(f"[agent] Файлов для анализа: {len(files)}")
-            plan_text = await self.model.get_plan(files)
-            if plan_text:
-                print("[agent] План анализа:")
-                print(plan_text)
-            analysis_results = {}
-            action_log = []
-            for file_path in files:
-                print(f"[agent] Анализ файла: {file_path}")
-                steps, result = await self._run_file_actions(file_path)
-                analysis_results[file_path] = result
-                action_log.extend(steps)
+        # Не очищаем локальный путь, только при явном клоне
+        await self._run_analysis(loader, path, output_file)
+
+    async def _run_analysis(self, loader: ProjectLoader, path: str, output_file: str):
+        """Общий сценарий: план, анализ файлов, рефлексия и отчет."""
+        with metrics.span("run"):
+            await self._run_analysis_steps(loader, path, output_file)
+
+    async def _run_analysis_steps(self, loader: ProjectLoader, path: str, output_file: str):
+        """Шаги _run_analysis: отбор файлов, план, анализ, рефлексия и отчет."""
+        all_files = self._collect_files(path)
+        files, reused_results = self._select_incremental(loader, path, all_files)
+        copies: dict[str, list[tuple[str, float]]] = {}
+        if self.dedup_threshold is not None:
+            files, copies = self._apply_dedup(files)
+        skipped = {}
+        if self.pretriage_min_score is not None:
+            files, skipped = self._apply_pretriage(files)
+        if self.dry_run:
+            self._print_dry_run(path, files, reused_results, copies, skipped)
+            return
+        journal = RunJournal(self.journal_file) if self.journal_file else None
+        plan_text, done = None, {}
+        if journal is not None:
+            if self.resume:
+                plan_text, done = self._load_journal(journal, path, files)
+            else:
+                journal.reset()
+        pending = [f for f in files if f not in done]
+        print(f"[agent] Файлов для анализа: {len(pending)}")
+        if self.symbol_index and pending:
+            self._build_symbol_index(path, all_files)
+        if plan_text is None:
+            with metrics.span("plan"):
+                plan_text = await self.model.get_plan(files)
+            if journal is not None and plan_text:
+                journal.record_plan(plan_text)
+        if plan_text:
+            print("[agent] План анализа:")
+            print(plan_text)
+        if self.pretriage_min_score is not None:
+            # Файлы уже упорядочены по риску: самые важные находки идут в начале отчета
+            rest = [f for f in all_files if f in reused_results or f in skipped]
+            report_order = []
+            for file_path in files + rest:
+                report_order.append(file_path)
+                report_order.extend(copy for copy, _ in copies.get(file_path, []))
+        else:
+            selected = set(files)
+            for group in copies.values():
+                selected.update(copy for copy, _ in group)
+            report_order = [f for f in all_files if f in selected or f in reused_results]
+        writer = reporter.ReportWriter(output_file, report_order)
+        # Результаты сразу уходят в отчет и журнал; в памяти остаются только шаги
+        # файлов для рефлексии, а результаты — лишь для состояния инкрементального режима
+        steps_by_file: dict[str, list[str]] = {}
+        state_results = dict(reused_results) if self.state_file else None
+
+        def record(file_path: str, steps: list[str], result: str):
+            writer.add(file_path, result)
+            steps_by_file[file_path] = steps
+            if state_results is not None:
+                state_results[file_path] = result
+
+        def fan_out(file_path: str, result: str):
+            for copy, similarity in copies.get(file_path, []):
+                record(copy, *self._copy_result(path, copy, file_path, similarity, result))
+
+        for file_path, result in reused_results.items():
+            writer.add(file_path, result)
+        for file_path, (steps, result) in {**skipped, **done}.items():
+            record(file_path, steps, result)
+            fan_out(file_path, result)
+        reused_results.clear()
+        done.clear()
+
+        def on_result(file_path: str, steps: list[str], result: str):
+            record(file_path, steps, result)
+            fan_out(file_path, result)
+            if journal is not None:
+                journal.record_file(incremental.relative_path(file_path, path), steps, result)
+
+        await self._analyze_files(pending, on_result=on_result)
+        if journal is not None:
+            journal.close()
+        action_log = []
+        for file_path in report_order:
+            action_log.extend(steps_by_file.get(file_path, []))
+        if state_results is not None:
+            self._save_incremental_state(loader, path, state_results)
+        with metrics.span("reflect"):
             reflection = await self.model.reflect(plan_text or "", action_log)
-            report_md = reporter.generate_report(analysis_results, reflection=reflection)
-            reporter.save_report(report_md, output_file)
-            reporter.print_report_console(report_md)
-            print(f"\nОтчет сохранен в файл: {output_file}")
-        finally:
-            # Не очищаем локальный путь, только при явном клоне
-            pass
+        writer.finish(reflection=reflection)
+        self.model.memory.save()
+        await self.model.aclose()
+        if self.escalation_model is not None:
+            await self.escalation_model.aclose()
+        print(f"\nОтчет сохранен в файл: {output_file}")
+
+    def _print_dry_run(
+        self,
+        path: str,
+        files: list[str],
+        reused_results: dict[str, str],
+        copies: dict[str, list[tuple[str, float]]],
+        skipped: dict[str, tuple[list[str], str]],
+    ):
+        """Печатает, что будет сделано с каждым файлом, без обращений к модели."""
+        print("[agent] Пробный запуск: модель не вызывается")
+        for unit in self._plan_batches(files):
+            names = ", ".join(incremental.relative_path(f, path) for f in unit)
+            print(f"  анализ: {names}" if len(unit) == 1 else f"  пакет ({len(unit)}): {names}")
+        for original, group in copies.items():
+            for copy, similarity in group:
+                rel_copy = incremental.relative_path(copy, path)
+                rel_original = incremental.relative_path(original, path)
+                print(f"  копия {rel_original} ({similarity:.0%}): {rel_copy}")
+        for file_path in reused_results:
+            print(f"  из прошлого запуска: {incremental.relative_path(file_path, path)}")
+        for file_path, (_, result) in skipped.items():
+            print(f"  пропуск: {incremental.relative_path(file_path, path)} ({result})")
+        print(
+            f"[agent] К анализу {len(files)}, копий {sum(len(g) for g in copies.values())}, "
+            f"из прошлого запуска {len(reused_results)}, пропущено {len(skipped)}"
+        )
+
+    def _apply_dedup(
+        self, files: list[str]
+    ) -> tuple[list[str], dict[str, list[tuple[str, float]]]]:
+        """Ищет копии файлов: анализируется только первый файл каждого кластера.
+
+        Возвращает файлы для анализа и копии по представителю: [(копия, сходство)].
+        """
+        duplicates = dedup.find_duplicates(files, self.dedup_threshold)
+        copies = {}
+        for copy, (original, similarity) in duplicates.items():
+            copies.setdefault(original, []).append((copy, similarity))
+        print(
+            f"[agent] Копии файлов: {len(duplicates)} (кластеров {len(copies)}), "
+            "результат переносится без повторного анализа"
+        )
+        return [f for f in files if f not in duplicates], copies
+
+    def _copy_result(
+        self, path: str, copy: str, original: str, similarity: float, result: str
+    ) -> tuple[list[str], str]:
+        """Шаги и результат копии: результат представителя с пометкой об источнике."""
+        steps = [f"{copy}: duplicate_of {os.path.basename(original)}"]
+        if result.startswith("ERROR"):
+            return steps, result
+        rel_path = incremental.relative_path(original, path)
+        if similarity >= 1.0:
+            note = f"_Точная копия `{rel_path}`, результат перенесен без повторного анализа._"
+        else:
+            note = (
+                f"_Почти точная копия `{rel_path}` (сходство {similarity:.0%}), результат "
+                "перенесен без повторного анализа; номера строк могут отличаться._"
+            )
+        return steps, f"{note}\n\n{result}"
+
+    def _apply_pretriage(
+        self, files: list[str]
+    ) -> tuple[list[str], dict[str, tuple[list[str], str]]]:
+        """Статически оценивает файлы до обращений к модели.
+
+        Возвращает файлы для анализа по убыванию риска (при равной оценке — в
+        исходном порядке) и шаги/результаты для пропущенных файлов.
+        """
+        scores = pretriage.triage_files(files, self.pretriage_workers)
+        kept = []
+        skipped = {}
+        for file_path, score, reasons in scores:
+            if score >= self.pretriage_min_score:
+                kept.append((file_path, score))
+                continue
+            skipped[file_path] = (
+                [f"{file_path}: pretriage_skipped"],
+                f"Пропущен предварительной статической оценкой: {', '.join(reasons)}",
+            )
+        kept.sort(key=lambda item: -item[1])
+        print(
+            f"[agent] Предварительная оценка: к анализу {len(kept)}, пропущено {len(skipped)}"
+        )
+        return [file_path for file_path, _ in kept], skipped
+
+    def _build_symbol_index(self, path: str, files: list[str]):
+        """Строит индекс символов по всем файлам проекта и подключает его к моделям."""
+        with metrics.span("symbol_index"):
+            index = SymbolIndex.build(files, path)
+        print(f"[agent] Индекс символов: {len(index)} определений в {len(files)} файлах")
+        for model in (self.model, self.escalation_model):
+            if model is not None:
+                model.symbol_index = index
+
+    def _load_journal(
+        self, journal: RunJournal, path: str, files: list[str]
+    ) -> tuple[str | None, dict[str, tuple[list[str], str]]]:
+        """Возвращает план и готовые (без ERROR) результаты прерванного запуска."""
+        plan_text, recorded = journal.load()
+        done = {}
+        for file_path in files:
+            entry = recorded.get(incremental.relative_path(file_path, path))
+            if entry is not None and not entry[1].startswith("ERROR"):
+                done[file_path] = entry
+        print(f"[agent] Продолжение по журналу: готово файлов {len(done)}")
+        return plan_text, done
+
+    def _select_incremental(
+        self, loader: ProjectLoader, path: str, files: list[str]
+    ) -> tuple[list[str], dict[str, str]]:
+        """Оставляет для анализа только измененные файлы, если задан since или state_file.
+
+        Возвращает файлы для анализа и результаты прошлого запуска для остальных.
+        """
+        previous = {}
+        since = self.since
+        if self.state_file:
+            state = incremental.load_state(self.state_file)
+            previous = state.get("results") or {}
+            since = since or state.get("commit")
+        if not since:
+            return files, {}
+        changed = loader.get_changed_files(since, path)
+        if changed is None:
+            print("[agent] Инкрементальный режим недоступен, анализируем все файлы")
+            return files, {}
+        if not self.state_file:
+            # Без сохраненных результатов анализируем только сами изменения
+            selected = [f for f in files if incremental.relative_path(f, path) in changed]
+            return selected, {}
+        selected, reused = incremental.select_files(files, path, changed, previous)
+        print(
+            f"[agent] Инкрементальный режим (с {since}): изменено {len(selected)}, "
+            f"из прошлого запуска {len(reused)}"
+        )
+        return selected, reused
+
+    def _save_incremental_state(
+        self, loader: ProjectLoader, path: str, analysis_results: dict[str, str]
+    ):
+        """Сохраняет текущий коммит и успешные результаты для следующего запуска."""
+        results = {
+            incremental.relative_path(file_path, path): result
+            for file_path, result in analysis_results.items()
+            if result and not result.startswith("ERROR")
+        }
+        incremental.save_state(self.state_file, loader.get_head_commit(path), results)
+
+    async def _analyze_files(
+        self, files: list[str], on_result=None
+    ) -> dict[str, tuple[list[str], str]]:
+        """Анализирует файлы параллельно, не более self.concurrency задач одновременно.
+
+        Задача — один файл или пакет мелких файлов (см. _plan_batches).
+        on_result(file_path, steps, result) вызывается сразу по готовности каждого файла,
+        и тогда результаты не накапливаются (возвращается пустой словарь); без него
+        возвращаются шаги и результат по каждому файлу в порядке files.
+        Ошибка одного файла не отменяет анализ остальных.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        units = self._plan_batches(files)
+        per_file = {}
+
+        async def worker(unit: list[str]):
+            async with semaphore:
+                try:
+                    if len(unit) == 1:
+                        print(f"[agent] Анализ файла: {unit[0]}")
+                        with metrics.span("file_analysis"):
+                            outcomes = [(unit[0], await self._run_file_actions(unit[0]))]
+                    else:
+                        print(f"[agent] Пакетный анализ файлов: {len(unit)}")
+                        with metrics.span("batch_analysis"):
+                            outcomes = await self._run_batch_actions(unit)
+                except Exception as e:
+                    outcomes = []
+                    for file_path in unit:
+                        print(f"[agent] Ошибка анализа: {file_path} ({e})")
+                        outcomes.append(
+                            (
+                                file_path,
+                                (
+                                    [f"{file_path}: analysis_failed"],
+                                    f"ERROR: Анализ файла не выполнен ({e})",
+                                ),
+                            )
+                        )
+            for file_path, outcome in outcomes:
+                if on_result is not None:
+                    on_result(file_path, *outcome)
+                else:
+                    per_file[file_path] = outcome
+
+        await asyncio.gather(*(worker(unit) for unit in units))
+        if on_result is not None:
+            return {}
+        return {file_path: per_file[file_path] for file_path in files}
+
+    def _plan_batches(self, files: list[str]) -> list[list[str]]:
+        """Группирует мелкие файлы одного языка в пакеты в пределах batch_tokens.
+
+        Мелким считается файл не больше четверти бюджета пакета; остальные файлы
+        анализируются по одному.
+        """
+        if self.batch_tokens <= 0:
+            return [[file_path] for file_path in files]
+        small_limit = self.batch_tokens // 4
+        units = []
+        open_batches: dict[str, tuple[list[str], int]] = {}
+        for file_path in files:
+            try:
+                # Оценка по размеру файла, без чтения содержимого
+                tokens = os.path.getsize(file_path) // chunker.CHARS_PER_TOKEN + 1
+            except OSError:
+                tokens = small_limit + 1
+            if tokens > small_limit:
+                units.append([file_path])
+                continue
+            lang = chunker.detect_language(file_path)
+            batch, used = open_batches.get(lang, ([], 0))
+            if batch and used + tokens > self.batch_tokens:
+                units.append(batch)
+                batch, used = [], 0
+            batch.append(file_path)
+            open_batches[lang] = (batch, used + tokens)
+        units.extend(batch for batch, _ in open_batches.values() if batch)
+        return units
+
+    async def _run_batch_actions(
+        self, file_paths: list[str]
+    ) -> list[tuple[str, tuple[list[str], str]]]:
+        """Анализирует пакет мелких файлов одним запросом, затем при необходимости deep_dive.
+
+        Если ответ не удалось разделить по файлам, файлы анализируются по одному.
+        """
+        items = []
+        for file_path in file_paths:
+            try:
+                with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+                    items.append((file_path, file.read()))
+            except Exception:
+                items.append((file_path, None))
+        readable = [(file_path, code) for file_path, code in items if code is not None]
+        batch_results = None
+        if len(readable) > 1:
+            batch_results = await self.model.analyze_batch(readable)
+            if batch_results is None:
+                print("[agent] Ответ на пакет не разделен по файлам, анализ по одному")
+        outcomes = []
+        for file_path, code in items:
+            primary = batch_results.get(file_path) if batch_results else None
+            outcomes.append(
+                (file_path, await self._run_file_actions(file_path, primary_result=primary))
+            )
+        return outcomes
 
     async def _analyze_file(self, file_path: str):
         """Считывает файл и отправляет код в модель для анализа."""
@@ -74,16 +458,25 @@ class Agent:
         return file_path, result
 
     def _collect_files(self, root_path: str) -> list[str]:
-        """Собирает поддерживаемые файлы в проекте."""
-        files = []
-        for root, _, names in os.walk(root_path):
-            for name in names:
-                if name.endswith((".py", ".cpp", ".cc", ".cxx", ".hpp", ".h", ".java", ".sql")):
-                    files.append(os.path.join(root, name))
-        return sorted(files)
-
-    async def _run_file_actions(self, file_path: str) -> tuple[list[str], str]:
-        """Выполняет динамическую цепочку действий для файла."""
+        """Собирает поддерживаемые файлы в проекте (см. FileWalker)."""
+        walker = FileWalker(root_path, **self.walker_options)
+        with metrics.span("walk"):
+            files = sorted(walker)
+        metrics.incr("files_collected", len(files))
+        for reason, count in walker.skipped.items():
+            metrics.incr("files_skipped", count, reason=reason)
+        if walker.skipped:
+            summary = ", ".join(f"{reason}: {count}" for reason, count in walker.skipped.items())
+            print(f"[agent] Пропущено при обходе: {summary}")
+        return files
+
+    async def _run_file_actions(
+        self, file_path: str, primary_result: str | None = None
+    ) -> tuple[list[str], str]:
+        """Выполняет динамическую цепочку действий для файла.
+
+        primary_result — готовый результат базового анализа (например, из пакета).
+        """
         steps = []
         try:
             with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
@@ -92,16 +485,39 @@ class Agent:
             error_text = f"ERROR: Не удалось прочитать файл ({e})"
             print(f"[agent] Ошибка чтения: {file_path}")
             return [f"{file_path}: read_failed"], error_text
-        steps.append(f"{file_path}: primary_analysis")
-        print("[agent] Шаг: primary_analysis")
-        result = await self.model.analyze_code(file_path, code)
+        if primary_result is None:
+            steps.append(f"{file_path}: primary_analysis")
+            print(f"[agent] Шаг: primary_analysis ({os.path.basename(file_path)})")
+            result = await self.model.analyze_code(file_path, code)
+        else:
+            steps.append(f"{file_path}: batch_analysis")
+            result = primary_result
+        tier_model, tier = self.model, "triage"
         if self._needs_deeper_check(result):
-            steps.append(f"{file_path}: deep_dive")
-            print("[agent] Шаг: deep_dive (уточнение)")
             focus = "Уточни причины, последствия и возможные исправления."
-            result = await self.model.analyze_code(file_path, code, focus_hint=focus)
+            if self.escalation_model is not None:
+                steps.append(f"{file_path}: escalation")
+                print(f"[agent] Шаг: escalation (сильная модель, {os.path.basename(file_path)})")
+                escalated = await self.escalation_model.analyze_code(
+                    file_path, code, focus_hint=focus
+                )
+                # При сбое сильной модели оставляем результат первичного анализа
+                if not escalated.startswith("ERROR"):
+                    result = escalated
+                    tier_model, tier = self.escalation_model, "escalation"
+            else:
+                steps.append(f"{file_path}: deep_dive")
+                print(f"[agent] Шаг: deep_dive (уточнение, {os.path.basename(file_path)})")
+                result = await self.model.deep_dive(file_path, code, result, focus)
+        if self.escalation_model is not None and not result.startswith("ERROR"):
+            result = self._tag_tier(result, tier_model, tier)
         return steps, result
 
+    def _tag_tier(self, result: str, model, tier: str) -> str:
+        """Добавляет к результату отметку уровня каскада, который его получил."""
+        label = f"{model.provider_name}/{model.model_name}"
+        return f"_Уровень: {tier} ({label})_\n\n{result}"
+
     def _needs_deeper_check(self, result: str) -> bool:
         """Решает, нужен ли повторный анализ по результату."""
         if not result:
@@ -1,32 +1,88 @@
+import asyncio
 import os
+import re
 
+import chunker
+import metrics
 from memory import CodeMemory
+from request_scheduler import ProviderError
+
+# Размер контекста моделей (в токенах) по префиксу имени модели
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-3.5-turbo": 16385,
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b": 131072,
+    "GigaChat": 32768,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+_BATCH_MARKER_RE = re.compile(r"^\W*FILE\s+(\d+)\b.*$", re.MULTILINE)
+# Ссылки на строки в ответе модели: «строка 42», «строки 10-15», «line 7», «L12»
+_LINE_REF_RE = re.compile(
+    r"(?:строк\w*|стр\.|lines?|\bL)\s*(\d+)(?:\s*[-–—]\s*(\d+))?", re.IGNORECASE
+)
+_CODE_REF_RE = re.compile(r"`([^`\n]{3,80})`")
+# Заголовки частей из _merge_window_results не указывают на конкретные проблемы
+_WINDOW_HEADER_RE = re.compile(r"^\*\*Строки \d+-\d+:\*\*$", re.MULTILINE)
+# Предел контекста из индекса символов в промпте анализа файла (в токенах)
+SYMBOL_CONTEXT_TOKENS = 1500
+# Во сколько раз сводка группы короче бюджета промпта: сжатие за один уровень иерархии
+_SUMMARY_RATIO = 8
+# Предел уровней сводок: дальше текст просто обрезается до бюджета
+_MAX_SUMMARY_LEVELS = 6
 
 
 class AnalysisAPIBase:
     """Базовая логика анализа: промпты, язык, чанки и память."""
 
-    def __init__(self, model_name: str, prompt_dir: str | None = None, memory=None):
-        """Инициализирует базовую часть анализа и память."""
+    provider_name = "base"
+    # Сколько сводок каталогов (план, рефлексия) запрашивать одновременно
+    summary_concurrency = 8
+
+    def __init__(
+        self,
+        model_name: str,
+        prompt_dir: str | None = None,
+        memory=None,
+        cache=None,
+        token_budget: int | None = None,
+        scheduler=None,
+        request_timeout: float | None = None,
+    ):
+        """Инициализирует базовую часть анализа, память и кэш ответов.
+
+        token_budget — максимальный размер промпта в токенах; по умолчанию половина
+        контекста модели (вторая половина остается на ответ);
+        scheduler — RequestScheduler с лимитами и повторами для запросов к провайдеру;
+        request_timeout — предел одной попытки запроса в секундах: зависший запрос
+        прерывается повторяемой ProviderError, и планировщик повторяет его.
+        """
         self.model_name = model_name
         self.prompt_dir = prompt_dir or os.path.join(os.path.dirname(__file__), "prompts")
         self.memory = memory or CodeMemory()
+        self.cache = cache
+        self.token_budget = token_budget or self._default_token_budget()
+        self.scheduler = scheduler
+        self.request_timeout = request_timeout
+        # SymbolIndex запуска: задается агентом после обхода файлов
+        self.symbol_index = None
+
+    def _default_token_budget(self) -> int:
+        """Возвращает бюджет промпта по размеру контекста модели."""
+        context = DEFAULT_CONTEXT_TOKENS
+        best_prefix = ""
+        for prefix, size in MODEL_CONTEXT_TOKENS.items():
+            if self.model_name.startswith(prefix) and len(prefix) > len(best_prefix):
+                best_prefix, context = prefix, size
+        return context // 2
 
     def detect_language(self, file_path: str) -> str:
         """Определяет язык по расширению файла."""
-        ext = os.path.splitext(file_path)[1].lower()
-        mapping = {
-            ".py": "Python",
-            ".pyw": "Python",
-            ".cpp": "C++",
-            ".cc": "C++",
-            ".cxx": "C++",
-            ".hpp": "C++",
-            ".h": "C++",
-            ".java": "Java",
-            ".sql": "SQL",
-        }
-        return mapping.get(ext, "Generic")
+        return chunker.detect_language(file_path)
 
     def _read_prompt_file(self, filename: str) -> str:
         """Читает файл промпта по имени, возвращает текст или пустую строку."""
@@ -68,58 +124,403 @@ class AnalysisAPIBase:
         }
         return mapping.get(lang, "")
 
-    def _chunk_code(self, code: str, size: int = 500) -> list[str]:
-        """Делит код на чанки фиксированного размера."""
-        return [code[i : i + size] for i in range(0, len(code), size)]
+    def _chunk_code(self, code: str, lang: str = "Generic", size: int = 500) -> list[str]:
+        """Делит код на чанки около size символов по синтаксическим границам."""
+        max_tokens = max(1, size // chunker.CHARS_PER_TOKEN)
+        return [text for _, _, text in chunker.split_code(code, lang, max_tokens)]
+
+    def _code_token_budget(self, *prompt_parts: str) -> int:
+        """Возвращает бюджет токенов на код с учетом остальных частей промпта."""
+        overhead = sum(chunker.estimate_tokens(part) for part in prompt_parts if part)
+        # Запас на служебный текст промпта (имя файла, инструкции)
+        return max(256, self.token_budget - overhead - 200)
 
     async def call_model(self, messages: list[dict]) -> str:
-        """Отправляет сообщения в модель и возвращает текст ответа."""
+        """Отправляет сообщения в модель и возвращает текст ответа.
+
+        Временные сбои (429, 5xx, сеть) подкласс сообщает через ProviderError,
+        чтобы планировщик мог повторить запрос.
+        """
         raise NotImplementedError("call_model должен быть реализован в подклассе")
 
+    async def aclose(self):
+        """Освобождает сетевые ресурсы провайдера (по умолчанию ничего не делает)."""
+
+    async def complete(self, messages: list[dict]) -> str:
+        """Возвращает ответ модели, используя кэш ответов, если он подключен.
+
+        Ошибки провайдера, оставшиеся после повторов, возвращаются строкой ERROR.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(self.provider_name, self.model_name, messages)
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.incr("cache_hits", provider=self.provider_name)
+                return cached
+            metrics.incr("cache_misses", provider=self.provider_name)
+        try:
+            result = await self._dispatch(messages)
+        except ProviderError as e:
+            return f"ERROR: {e}"
+        if key is not None and result and not result.startswith("ERROR"):
+            self.cache.set(key, result)
+        return result
+
+    async def _dispatch(self, messages: list[dict]) -> str:
+        """Вызывает call_model через планировщик запросов (если он подключен)."""
+        if self.scheduler is None:
+            return await self._timed_call(messages)
+        estimated = sum(chunker.estimate_tokens(m.get("content") or "") for m in messages)
+        # Запас на ответ модели, он тоже расходует лимит токенов в минуту
+        return await self.scheduler.run(self._timed_call, messages, estimated + 500)
+
+    async def _timed_call(self, messages: list[dict]) -> str:
+        """Один вызов call_model (одна попытка) с метриками длительности и размеров."""
+        provider = self.provider_name
+        metrics.incr("model_requests", provider=provider)
+        metrics.observe(
+            "prompt_chars", sum(len(m.get("content") or "") for m in messages), provider=provider
+        )
+        with metrics.span("model_call", provider=provider):
+            if self.request_timeout:
+                try:
+                    result = await asyncio.wait_for(
+                        self.call_model(messages), self.request_timeout
+                    )
+                except asyncio.TimeoutError as e:
+                    metrics.incr("request_timeouts", provider=provider)
+                    raise ProviderError(
+                        f"Нет ответа {provider} за {self.request_timeout:g} с", retryable=True
+                    ) from e
+            else:
+                result = await self.call_model(messages)
+        metrics.observe("response_chars", len(result or ""), provider=provider)
+        return result
+
+    def _record_usage(self, usage: dict | None):
+        """Учитывает токены из поля usage ответа провайдера (если оно есть)."""
+        if not usage:
+            return
+        for field in ("prompt_tokens", "completion_tokens"):
+            if usage.get(field):
+                metrics.incr(field, usage[field], provider=self.provider_name)
+
     async def get_plan(self, file_list: list[str]) -> str:
-        """Строит план анализа на основе списка файлов."""
+        """Строит план анализа на основе списка файлов.
+
+        Если список не помещается в бюджет промпта, план строится по сводкам
+        каталогов (см. _summarize), а не по всем именам файлов.
+        """
         system_prompt = self._get_named_prompt(
             "plan.txt",
             "Составь краткий план анализа для списка файлов. Выведи нумерованный список.",
         )
         file_names = ", ".join([os.path.basename(f) for f in file_list])
         user_prompt = f"Файлы проекта: {file_names}"
+        budget = self._code_token_budget(system_prompt)
+        if chunker.estimate_tokens(user_prompt) > budget:
+            lines = _directory_lines([(f, os.path.basename(f)) for f in file_list])
+            overview = await self._summarize(
+                lines,
+                "plan_summary.txt",
+                "Кратко опиши каталоги проекта и какие файлы в них проверить в первую очередь.",
+                "plan",
+                budget,
+            )
+            user_prompt = (
+                f"Проект: {len(file_list)} файлов в {len(lines)} каталогах. "
+                f"Сводка по каталогам:\n{overview}"
+            )
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ]
-        return await self.call_model(messages)
+        return await self.complete(messages)
 
     async def reflect(self, plan_text: str, action_log: list[str]) -> str:
-        """Оценивает результаты анализа и предлагает улучшения."""
+        """Оценивает результаты анализа и предлагает улучшения.
+
+        Длинный журнал действий сначала сжимается в сводки по каталогам (см. _summarize).
+        """
         system_prompt = self._get_named_prompt(
             "reflect.txt",
             "Оцени результаты анализа и укажи, что можно улучшить.",
         )
         log_text = "\n".join(action_log)
         user_prompt = f"План:\n{plan_text}\n\nНаблюдения:\n{log_text}"
+        budget = self._code_token_budget(system_prompt, plan_text)
+        if chunker.estimate_tokens(log_text) > budget:
+            # Записи журнала имеют вид «путь: шаг»; шаги одного файла собираются вместе
+            steps_by_file: dict[str, list[str]] = {}
+            for entry in action_log:
+                file_path, _, step = entry.rpartition(": ")
+                steps_by_file.setdefault(file_path, []).append(step)
+            entries = [
+                (file_path, f"{os.path.basename(file_path)} ({', '.join(steps)})")
+                for file_path, steps in steps_by_file.items()
+            ]
+            overview = await self._summarize(
+                _directory_lines(entries),
+                "reflect_summary.txt",
+                "Кратко обобщи наблюдения анализа: ошибки, углубленные проверки, пропуски.",
+                "reflect",
+                budget,
+            )
+            user_prompt = (
+                f"План:\n{plan_text}\n\n"
+                f"Наблюдения (сводка по {len(steps_by_file)} файлам):\n{overview}"
+            )
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ]
-        return await self.call_model(messages)
+        return await self.complete(messages)
+
+    async def _summarize(
+        self, items: list[str], prompt_file: str, fallback: str, stage: str, budget: int
+    ) -> str:
+        """Иерархически сжимает строки items в текст не больше budget токенов.
+
+        Строки упаковываются в группы по бюджету промпта, группы сводятся параллельно
+        (не больше summary_concurrency запросов), сводки снова группируются, пока
+        текст не поместится. Каждый уровень сокращает объем в несколько раз, поэтому
+        число последовательных запросов растет логарифмически от размера проекта.
+        Если сводка группы не получена, вместо нее остается обрезанный исходный текст.
+        Если уровень не сократил текст, осталась одна сводка или уровней уже
+        _MAX_SUMMARY_LEVELS, текст обрезается до budget без новых запросов.
+        """
+        system_prompt = self._get_named_prompt(prompt_file, fallback)
+        group_budget = self._code_token_budget(system_prompt)
+        # Сводка не длиннее budget: иначе одна сводка уже не помещается и уровни не сходятся
+        summary_tokens = min(budget, max(64, group_budget // _SUMMARY_RATIO))
+        limit = asyncio.Semaphore(self.summary_concurrency)
+
+        async def summarize_group(group: list[str]) -> str:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": "\n".join(group)},
+            ]
+            async with limit:
+                answer = await self.complete(messages)
+            if not answer or answer.startswith("ERROR"):
+                answer = "\n".join(group)
+            return _truncate_tokens(answer.strip(), summary_tokens)
+
+        level = 0
+        tokens = chunker.estimate_tokens("\n".join(items))
+        while tokens > budget and len(items) > 1 and level < _MAX_SUMMARY_LEVELS:
+            level += 1
+            groups = _pack_lines(items, group_budget)
+            print(f"[model] {stage}: сводки уровня {level}, групп {len(groups)}")
+            with metrics.span("summarize", stage=stage):
+                items = await asyncio.gather(*(summarize_group(group) for group in groups))
+            previous, tokens = tokens, chunker.estimate_tokens("\n".join(items))
+            if tokens >= previous:
+                print(f"[model] {stage}: сводки не сокращают текст, он обрезан до бюджета")
+                break
+        return _truncate_tokens("\n\n".join(items), budget)
 
     async def analyze_code(self, file_path: str, code: str, focus_hint: str | None = None) -> str:
-        """Анализирует код файла с учетом языка и памяти."""
+        """Анализирует код файла с учетом языка и памяти.
+
+        Файл, который не помещается в бюджет токенов, анализируется по окнам
+        (по границам функций и классов), ответы по окнам объединяются.
+        """
         lang = self.detect_language(file_path)
         system_prompt = self._get_language_prompt(lang)
-        chunks = self._chunk_code(code)
+        chunks = self._chunk_code(code, lang)
         self.memory.store_chunks(file_path, lang, chunks)
+        context_block = self._context_block(file_path)
+        budget = self._code_token_budget(system_prompt, context_block, focus_hint or "")
+        if chunker.estimate_tokens(code) <= budget:
+            user_prompt = self._build_code_prompt(file_path, lang, code, focus_hint, context_block)
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ]
+            return await self.complete(messages)
+        windows = chunker.split_code(code, lang, budget)
+        print(f"[model] {os.path.basename(file_path)}: анализ по частям ({len(windows)})")
+        requests = []
+        for number, (first_line, last_line, text) in enumerate(windows, start=1):
+            part = f"часть {number} из {len(windows)}, строки {first_line}-{last_line}"
+            user_prompt = self._build_code_prompt(
+                file_path, lang, text, focus_hint, context_block, part=part
+            )
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ]
+            requests.append(self.complete(messages))
+        results = await asyncio.gather(*requests)
+        return self._merge_window_results(windows, results)
+
+    async def analyze_batch(self, items: list[tuple[str, str]]) -> dict[str, str] | None:
+        """Анализирует несколько небольших файлов одного языка одним запросом.
+
+        items — пары (путь, код). Возвращает результаты по путям или None,
+        если ответ модели не удалось надежно разделить по файлам.
+        """
+        lang = self.detect_language(items[0][0])
+        system_prompt = self._get_language_prompt(lang)
         fence_lang = self._get_code_fence_lang(lang)
-        context_chunks = self.memory.query(os.path.basename(file_path), top_k=3)
-        context_block = ""
-        if context_chunks:
-            context_block = "\n".join(
-                [f"- {chunk[:500]}" for chunk in context_chunks if chunk]
+        parts = [
+            f"Ниже {len(items)} файлов на языке {lang}. Найди в каждом баги, логические ошибки "
+            "и уязвимости, игнорируй стиль и форматирование.\n"
+            "Ответь отдельно по каждому файлу, начиная раздел строкой-маркером "
+            "`=== FILE <номер> ===` (для всех файлов по порядку, даже без проблем; "
+            "если проблем нет, напиши «Проблем не найдено»)."
+        ]
+        for number, (file_path, code) in enumerate(items, start=1):
+            self.memory.store_chunks(file_path, lang, self._chunk_code(code, lang))
+            parts.append(
+                f"=== FILE {number}: {os.path.basename(file_path)} ===\n"
+                f"```{fence_lang}\n{code}\n```"
             )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "\n\n".join(parts)},
+        ]
+        answer = await self.complete(messages)
+        if not answer or answer.startswith("ERROR"):
+            return None
+        sections = self._split_batch_answer(answer, len(items))
+        if sections is None:
+            return None
+        return {file_path: sections[number] for number, (file_path, _) in enumerate(items, 1)}
+
+    def _split_batch_answer(self, answer: str, count: int) -> dict[int, str] | None:
+        """Делит ответ по маркерам FILE N; None, если маркеры неполные или повторяются."""
+        markers = list(_BATCH_MARKER_RE.finditer(answer))
+        numbers = [int(marker.group(1)) for marker in markers]
+        if sorted(numbers) != list(range(1, count + 1)):
+            return None
+        sections = {}
+        for marker, next_marker in zip(markers, markers[1:] + [None]):
+            end = next_marker.start() if next_marker else len(answer)
+            text = answer[marker.end() : end].strip()
+            if not text:
+                return None
+            sections[int(marker.group(1))] = text
+        return sections
+
+    async def deep_dive(
+        self, file_path: str, code: str, first_result: str, focus_hint: str
+    ) -> str:
+        """Уточняет первый ответ следующим ходом того же диалога.
+
+        Первый ответ остается в контексте, а вместо всего файла повторно
+        отправляются только фрагменты, на которые он ссылается (номера строк,
+        идентификаторы в `кавычках`). Память повторно не пополняется.
+        """
+        lang = self.detect_language(file_path)
+        system_prompt = self._get_language_prompt(lang)
+        budget = self._code_token_budget(system_prompt, first_result, focus_hint)
+        excerpt = self._flagged_regions(code, first_result, budget)
+        if excerpt is None:
+            return await self.analyze_code(file_path, code, focus_hint=focus_hint)
+        fence_lang = self._get_code_fence_lang(lang)
         user_prompt = (
             f"Файл: {os.path.basename(file_path)}\n"
             f"Язык: {lang}\n"
+            "Фрагменты кода с номерами строк:\n"
+            f"```{fence_lang}\n{excerpt}\n```\n"
+            "Найди баги, логические ошибки и уязвимости. "
+            "Игнорируй стиль и форматирование."
+        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+            {"role": "assistant", "content": first_result},
+            {
+                "role": "user",
+                "content": f"{focus_hint}\nВерни итоговый список проблем целиком.",
+            },
+        ]
+        return await self.complete(messages)
+
+    def _flagged_regions(
+        self, code: str, answer: str, max_tokens: int, context: int = 5
+    ) -> str | None:
+        """Вырезает из кода строки, на которые ссылается ответ, с контекстом ±context строк.
+
+        Возвращает текст с номерами строк или None, если ссылок не найдено.
+        """
+        lines = code.splitlines()
+        if not lines:
+            return None
+        answer = _WINDOW_HEADER_RE.sub("", answer)
+        targets = set()
+        for match in _LINE_REF_RE.finditer(answer):
+            first = int(match.group(1))
+            last = int(match.group(2) or first)
+            if 1 <= first <= len(lines) and first <= last:
+                targets.update(range(first, min(last, len(lines)) + 1))
+        for match in _CODE_REF_RE.finditer(answer):
+            snippet = match.group(1).strip()
+            hits = [n for n, line in enumerate(lines, start=1) if snippet in line]
+            targets.update(hits[:3])
+        if not targets:
+            return None
+        selected = set()
+        for line_no in targets:
+            first, last = max(1, line_no - context), min(len(lines), line_no + context)
+            selected.update(range(first, last + 1))
+        parts = []
+        used = 0
+        previous = None
+        for line_no in sorted(selected):
+            text = f"{line_no:>5}| {lines[line_no - 1]}"
+            used += chunker.estimate_tokens(text)
+            if used > max_tokens:
+                break
+            if previous is not None and line_no != previous + 1:
+                parts.append("  ...")
+            parts.append(text)
+            previous = line_no
+        return "\n".join(parts)
+
+    def _context_block(self, file_path: str) -> str:
+        """Контекст для промпта анализа файла.
+
+        С индексом символов — определения из других файлов, на которые ссылается
+        файл; без него — фрагменты из памяти по имени файла.
+        """
+        if self.symbol_index is not None:
+            max_tokens = min(SYMBOL_CONTEXT_TOKENS, self.token_budget // 4)
+            context = self.symbol_index.context_for(file_path, max_tokens)
+            if not context:
+                return ""
+            metrics.observe("symbol_context_tokens", chunker.estimate_tokens(context))
+            return (
+                "Определения из других файлов проекта, которые использует этот код:\n"
+                f"```\n{context}\n```"
+            )
+        context_chunks = self.memory.query(os.path.basename(file_path), top_k=3)
+        if not context_chunks:
+            return ""
+        return "Контекст из памяти (фрагменты кода):\n" + "\n".join(
+            [f"- {chunk[:500]}" for chunk in context_chunks if chunk]
+        )
+
+    def _build_code_prompt(
+        self,
+        file_path: str,
+        lang: str,
+        code: str,
+        focus_hint: str | None,
+        context_block: str,
+        part: str | None = None,
+    ) -> str:
+        """Собирает пользовательский промпт анализа кода (целиком или для части файла)."""
+        fence_lang = self._get_code_fence_lang(lang)
+        file_line = f"Файл: {os.path.basename(file_path)}"
+        if part:
+            file_line += f" ({part})"
+        user_prompt = (
+            f"{file_line}\n"
+            f"Язык: {lang}\n"
             "Код:\n"
             f"```{fence_lang}\n{code}\n```\n"
             "Найди баги, логические ошибки и уязвимости. "
@@ -128,9 +529,60 @@ class AnalysisAPIBase:
         if focus_hint:
             user_prompt += f"\nДополнительный фокус: {focus_hint}"
         if context_block:
-            user_prompt += "\nКонтекст из памяти (фрагменты кода):\n" + context_block
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
-        return await self.call_model(messages)
+            user_prompt += "\n" + context_block
+        return user_prompt
+
+    def _merge_window_results(
+        self, windows: list[tuple[int, int, str]], results: list[str]
+    ) -> str:
+        """Объединяет ответы по частям файла; если все части упали — возвращает ошибку."""
+        if all(result.startswith("ERROR") for result in results):
+            return results[0]
+        sections = []
+        for (first_line, last_line, _), result in zip(windows, results):
+            sections.append(f"**Строки {first_line}-{last_line}:**\n\n{result.strip()}")
+        return "\n\n".join(sections)
+
+
+def _directory_lines(entries: list[tuple[str, str]]) -> list[str]:
+    """Группирует описания файлов по каталогам: «каталог/ (N): описание, описание».
+
+    entries — пары (путь, описание); каталоги идут в порядке первого появления,
+    пути показываются относительно общего корня.
+    """
+    dirs = [os.path.dirname(file_path) for file_path, _ in entries]
+    try:
+        root = os.path.commonpath([d for d in dirs if d]) if any(dirs) else ""
+    except ValueError:
+        root = ""
+    grouped: dict[str, list[str]] = {}
+    for (_, detail), directory in zip(entries, dirs):
+        rel_dir = os.path.relpath(directory, root) if root and directory else directory or "."
+        grouped.setdefault(rel_dir, []).append(detail)
+    return [
+        f"{rel_dir}/ ({len(details)}): {', '.join(details)}"
+        for rel_dir, details in grouped.items()
+    ]
+
+
+def _pack_lines(lines: list[str], max_tokens: int) -> list[list[str]]:
+    """Упаковывает строки по порядку в группы не больше max_tokens (длинные — обрезаются)."""
+    groups = []
+    current, used = [], 0
+    for line in lines:
+        line = _truncate_tokens(line, max_tokens)
+        tokens = chunker.estimate_tokens(line)
+        if current and used + tokens > max_tokens:
+            groups.append(current)
+            current, used = [], 0
+        current.append(line)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    """Обрезает текст примерно до max_tokens токенов."""
+    limit = max_tokens * chunker.CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[: limit - 1] + "…"
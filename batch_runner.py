@@ -0,0 +1,495 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import queue
+import re
+import signal
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Как часто проверять папку очереди и завершенные задания, с
+POLL_INTERVAL = 1.0
+# Счетчики метрик задания, которые попадают в сводку
+_SUMMARY_COUNTERS = (
+    "files_collected",
+    "model_requests",
+    "cache_hits",
+    "cache_misses",
+    "prompt_tokens",
+    "completion_tokens",
+    "retries",
+)
+
+# Event loop процесса-обработчика: живет между заданиями вместе с keep-alive
+# соединениями общего транспорта; закрывается при завершении процесса (_close_worker)
+_worker_loop = None
+
+
+def parse_jobs(text: str) -> list[dict]:
+    """Разбирает задания: JSONL-объекты {"source": ..., "id": ..., "options": {...}}.
+
+    Строка может быть и просто URL или путем (в кавычках JSON или без них);
+    пустые строки и строки с # пропускаются.
+    """
+    jobs = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError:
+            job = line
+        if isinstance(job, str):
+            job = {"source": job}
+        if not isinstance(job, dict) or not job.get("source"):
+            raise ValueError(f"Задание без source: {line}")
+        jobs.append(job)
+    return jobs
+
+
+def option_args(options: dict) -> list[str]:
+    """Переводит опции задания в аргументы main.py: {"dedup": 0.9} -> ["--dedup", "0.9"].
+
+    True — флаг без значения, False/None — опция пропускается, список — несколько значений.
+    """
+    argv = []
+    for key, value in options.items():
+        flag = "--" + key.replace("_", "-")
+        if value is True:
+            argv.append(flag)
+        elif value is False or value is None:
+            continue
+        elif isinstance(value, (list, tuple)):
+            argv += [flag, *map(str, value)]
+        else:
+            argv += [flag, str(value)]
+    return argv
+
+
+def run_job(job: dict, out_dir: str, default_argv: list[str]) -> dict:
+    """Выполняет одно задание в процессе-обработчике и возвращает его итог для сводки.
+
+    Вывод анализа (и git) пишется в <id>.log, отчет — в <id>.md,
+    метрики — в <id>.metrics.json/.prom. Ошибка задания не останавливает обработчик.
+    """
+    global _worker_loop
+    import main
+    import metrics
+
+    job_id = job["id"]
+    base = os.path.join(out_dir, job_id)
+    record = {
+        "id": job_id,
+        "source": job["source"],
+        "report": f"{base}.md",
+        "log": f"{base}.log",
+        "pid": os.getpid(),
+    }
+    # Свое состояние, коллекция памяти и метрики у каждого задания;
+    # общие аргументы их переопределяют, опции задания — переопределяют общие
+    argv = [
+        job["source"],
+        "--state-file", f"{base}.state.json",
+        "--memory-collection", _collection_name(job_id),
+        "--metrics-out", f"{base}.metrics.json",
+        *default_argv,
+        *option_args(job.get("options") or {}),
+        "--output", f"{base}.md",
+    ]
+    if _worker_loop is None:
+        _worker_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_worker_loop)
+    metrics.reset()
+    started = time.perf_counter()
+    with _redirect_output(record["log"]):
+        try:
+            args = main.build_parser().parse_args(argv)
+            main.run(
+                args, run_coroutine=_worker_loop.run_until_complete, keep_connections=True
+            )
+            record["status"] = "done"
+        except (Exception, SystemExit) as e:
+            traceback.print_exc()
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+    record["duration_sec"] = round(time.perf_counter() - started, 2)
+    counters = metrics.get_metrics().to_dict()["counters"]
+    for name in _SUMMARY_COUNTERS:
+        record[name] = sum(c["value"] for c in counters if c["name"] == name)
+    record.update(_report_stats(record["report"]))
+    return record
+
+
+def _collection_name(job_id: str) -> str:
+    """Имя коллекции памяти задания: хэш id, всегда допустимое для ChromaDB.
+
+    Читаемый id может быть длиннее 63 символов или оканчиваться на «.», «_», «-».
+    """
+    return f"job_{hashlib.sha1(job_id.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _init_worker():
+    """Настраивает процесс-обработчик.
+
+    Ctrl+C обрабатывает родительский процесс: начатые задания дорабатывают.
+    При штатном завершении процесса закрываются соединения и event loop.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
+
+
+def _close_worker():
+    """Закрывает keep-alive соединения общего транспорта и event loop обработчика."""
+    global _worker_loop
+    if _worker_loop is None:
+        return
+    from http_transport import get_shared_transport
+
+    _worker_loop.run_until_complete(get_shared_transport().close())
+    _worker_loop.close()
+    _worker_loop = None
+
+
+@contextmanager
+def _redirect_output(log_path: str):
+    """Перенаправляет stdout и stderr процесса (включая вывод git) в файл лога."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    with open(log_path, "a", encoding="utf-8") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+
+
+def _report_stats(report_path: str) -> dict:
+    """Число файлов в отчете и файлов, анализ которых завершился ошибкой."""
+    try:
+        with open(report_path, "r", encoding="utf-8") as file:
+            lines = file.read().splitlines()
+    except OSError:
+        return {"files_reported": 0, "file_errors": 0}
+    files = errors = 0
+    for idx, line in enumerate(lines):
+        if line.startswith("### Файл:"):
+            files += 1
+            following = next((text for text in lines[idx + 1 :] if text.strip()), "")
+            errors += following.startswith("*ERROR")
+    return {"files_reported": files, "file_errors": errors}
+
+
+class BatchRunner:
+    """Распределяет задания анализа по пулу процессов и ведет сводку.
+
+    Процесс-обработчик выполняет задания по одному (внутри — асинхронный анализ
+    файлов с --concurrency) и переиспользует импорты, event loop и keep-alive
+    соединения общего транспорта; модель и память создаются для каждого задания.
+    Кэш зеркал (sandbox/mirrors) и кэш ответов (llm_cache) общие для всех процессов.
+    Задания можно добавлять во время работы: submit (потокобезопасно),
+    папка очереди и HTTP-интерфейс (serve_http).
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        workers: int | None = None,
+        default_argv: list[str] | None = None,
+        queue_dir: str | None = None,
+    ):
+        """out_dir — каталог отчетов и сводки; default_argv — аргументы main.py для всех заданий.
+
+        queue_dir — папка, из которой забираются файлы *.jsonl с новыми заданиями.
+        """
+        self.out_dir = out_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.default_argv = list(default_argv or [])
+        self.queue_dir = queue_dir
+        self.summary_path = os.path.join(out_dir, "summary")
+        self.jobs: dict[str, dict] = {}
+        self.started = time.time()
+        self._incoming = queue.Queue()
+        self._lock = threading.Lock()
+        self._http = None
+        os.makedirs(out_dir, exist_ok=True)
+        if queue_dir:
+            os.makedirs(os.path.join(queue_dir, "accepted"), exist_ok=True)
+
+    def submit(self, job: dict) -> str:
+        """Ставит задание в очередь и возвращает его id."""
+        with self._lock:
+            job_id = self._unique_id(job)
+            job = {**job, "id": job_id}
+            self.jobs[job_id] = {"id": job_id, "source": job["source"], "status": "queued"}
+        self._incoming.put(job)
+        return job_id
+
+    def status(self) -> list[dict]:
+        """Снимок состояния всех заданий."""
+        with self._lock:
+            return [dict(record) for record in self.jobs.values()]
+
+    def serve_http(self, port: int, host: str = "127.0.0.1") -> str:
+        """Запускает HTTP-интерфейс в фоновом потоке: POST /jobs (JSONL), GET /jobs."""
+        self._http = ThreadingHTTPServer((host, port), _JobsHandler)
+        self._http.daemon_threads = True
+        self._http.runner = self
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+        host, port = self._http.server_address[:2]
+        return f"http://{host}:{port}/jobs"
+
+    def run(self, keep_running: bool = False):
+        """Выполняет задания; keep_running — ждать новых заданий до Ctrl+C."""
+        # spawn: в родителе работают потоки HTTP-интерфейса, fork с потоками небезопасен
+        context = multiprocessing.get_context("spawn")
+        pending = {}
+        with ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=context, initializer=_init_worker
+        ) as pool:
+            try:
+                while True:
+                    self._poll_queue_dir()
+                    while not self._incoming.empty():
+                        job = self._incoming.get()
+                        future = pool.submit(run_job, job, self.out_dir, self.default_argv)
+                        pending[future] = job
+                    if not pending and not keep_running and self._incoming.empty():
+                        break
+                    if not pending:
+                        time.sleep(POLL_INTERVAL)
+                        continue
+                    done, _ = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                    for future, job in pending.items():
+                        if future not in done and future.running():
+                            self._update(job["id"], status="running")
+                    for future in done:
+                        job = pending.pop(future)
+                        self._finish(job, future)
+            except KeyboardInterrupt:
+                print("[batch] Остановка: начатые задания завершаются, остальные отменены")
+                pool.shutdown(wait=True, cancel_futures=True)
+                for future, job in pending.items():
+                    if future.cancelled():
+                        self._update(job["id"], status="cancelled")
+                    else:
+                        self._finish(job, future)
+        if self._http is not None:
+            self._http.shutdown()
+        self.write_summary()
+
+    def _finish(self, job: dict, future):
+        try:
+            record = future.result()
+        except Exception as e:
+            # Процесс-обработчик упал целиком (например, нехватка памяти)
+            record = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        self._update(job["id"], **record)
+        print(
+            f"[batch] {job['id']}: {record['status']}"
+            + (f" ({record['error']})" if record.get("error") else "")
+            + (f", {record['duration_sec']} с" if "duration_sec" in record else "")
+        )
+        self.write_summary()
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self.jobs[job_id].update(fields)
+
+    def _unique_id(self, job: dict) -> str:
+        """id задания: заданный или имя репозитория с коротким хэшем источника и опций."""
+        job_id = job.get("id")
+        if not job_id:
+            key = json.dumps([job["source"], job.get("options")], sort_keys=True)
+            digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+            name = job["source"].rstrip("/").rsplit("/", 1)[-1]
+            job_id = f"{name[:-4] if name.endswith('.git') else name}_{digest}"
+        job_id = re.sub(r"[^A-Za-z0-9_.-]", "_", str(job_id))
+        unique, idx = job_id, 2
+        while unique in self.jobs:
+            unique, idx = f"{job_id}_{idx}", idx + 1
+        return unique
+
+    def _poll_queue_dir(self):
+        """Забирает задания из файлов *.jsonl папки очереди и переносит файлы в accepted/.
+
+        Файл нужно записывать под другим именем и переименовывать в .jsonl, когда он готов.
+        """
+        if not self.queue_dir:
+            return
+        for name in sorted(os.listdir(self.queue_dir)):
+            if not name.endswith(".jsonl"):
+                continue
+            path = os.path.join(self.queue_dir, name)
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    jobs = parse_jobs(file.read())
+            except (OSError, ValueError) as e:
+                print(f"[batch] Пропущен файл очереди {name}: {e}")
+                jobs = []
+            os.replace(path, os.path.join(self.queue_dir, "accepted", name))
+            for job in jobs:
+                print(f"[batch] Задание из очереди: {self.submit(job)}")
+
+    def write_summary(self):
+        """Пишет сводку по всем заданиям: summary.json и summary.md."""
+        records = self.status()
+        totals = {
+            name: sum(record.get(name, 0) for record in records)
+            for name in ("files_reported", "file_errors", *_SUMMARY_COUNTERS)
+        }
+        by_status = {}
+        for record in records:
+            by_status[record["status"]] = by_status.get(record["status"], 0) + 1
+        data = {
+            "started": self.started,
+            "updated": time.time(),
+            "statuses": by_status,
+            "totals": totals,
+            "jobs": records,
+        }
+        tmp_path = f"{self.summary_path}.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, f"{self.summary_path}.json")
+        with open(f"{self.summary_path}.md", "w", encoding="utf-8") as file:
+            file.write(_summary_markdown(records, by_status, totals))
+
+
+def _summary_markdown(records: list[dict], by_status: dict, totals: dict) -> str:
+    """Сводка заданий в виде Markdown-таблицы."""
+    statuses = ", ".join(f"{status}: {count}" for status, count in sorted(by_status.items()))
+    lines = [
+        "# Сводка пакетного анализа",
+        "",
+        f"Заданий: {len(records)} ({statuses})",
+        "",
+        "| Задание | Источник | Статус | Файлов | Ошибок | Запросов | Из кэша | Время, с | Отчет |",
+        "|---|---|---|---|---|---|---|---|---|",
+    ]
+    for record in records:
+        status = record["status"]
+        if record.get("error"):
+            status += f": {record['error']}".replace("|", "\\|")
+        report = record.get("report") or ""
+        report = os.path.basename(report) if os.path.exists(report) else ""
+        lines.append(
+            f"| {record['id']} | {record['source']} | {status} "
+            f"| {record.get('files_reported', '')} | {record.get('file_errors', '')} "
+            f"| {record.get('model_requests', '')} | {record.get('cache_hits', '')} "
+            f"| {record.get('duration_sec', '')} | {report} |"
+        )
+    lines += [
+        "",
+        f"Всего файлов в отчетах: {totals['files_reported']}, с ошибкой анализа: "
+        f"{totals['file_errors']}; запросов к модели: {totals['model_requests']}, "
+        f"ответов из кэша: {totals['cache_hits']}; токенов: {totals['prompt_tokens']} "
+        f"+ {totals['completion_tokens']}.",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class _JobsHandler(BaseHTTPRequestHandler):
+    """POST /jobs — JSONL или JSON-объект с заданиями; GET /jobs — состояние заданий."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send(404, {"error": "not found"})
+            return
+        self._send(200, {"jobs": self.server.runner.status()})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            jobs = parse_jobs(self.rfile.read(length).decode("utf-8"))
+        except (UnicodeDecodeError, ValueError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        ids = [self.server.runner.submit(job) for job in jobs]
+        print(f"[batch] Получено по HTTP заданий: {len(ids)}")
+        self._send(202, {"ids": ids})
+
+    def _send(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    """Пакетный режим: задания из JSONL, пул процессов, отчеты и сводка в --out-dir.
+
+    Аргументы после -- передаются main.py для каждого задания (например, --provider groq).
+    """
+    parser = argparse.ArgumentParser(
+        description="AI-Agent: пакетный анализ многих репозиториев",
+        epilog="Аргументы после -- передаются анализу каждого задания, например: "
+        "batch_runner.py jobs.jsonl -- --provider groq --dedup",
+    )
+    parser.add_argument(
+        "jobs", nargs="?", default=None, help="JSONL-файл заданий (source, id, options)"
+    )
+    parser.add_argument(
+        "--out-dir", default="batch_reports", help="Каталог отчетов и сводки"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Число процессов (по умолчанию по числу CPU)"
+    )
+    parser.add_argument(
+        "--queue-dir",
+        default=None,
+        help="Папка очереди: новые файлы *.jsonl в ней забираются во время работы",
+    )
+    parser.add_argument(
+        "--serve",
+        type=int,
+        default=None,
+        metavar="PORT",
+        help="HTTP-интерфейс на 127.0.0.1:PORT: POST /jobs (JSONL), GET /jobs",
+    )
+    argv = sys.argv[1:]
+    default_argv = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, default_argv = argv[:split], argv[split + 1 :]
+    args = parser.parse_args(argv)
+    runner = BatchRunner(args.out_dir, args.workers, default_argv, args.queue_dir)
+    if args.jobs:
+        with open(args.jobs, "r", encoding="utf-8") as file:
+            for job in parse_jobs(file.read()):
+                runner.submit(job)
+    if args.serve is not None:
+        print(f"[batch] Прием заданий: {runner.serve_http(args.serve)}")
+    keep_running = args.serve is not None or args.queue_dir is not None
+    if keep_running:
+        print("[batch] Режим службы: ожидание заданий до Ctrl+C")
+    runner.run(keep_running=keep_running)
+    print(f"[batch] Сводка: {runner.summary_path}.json, {runner.summary_path}.md")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from gigachat_api import GigaChatAPI
+from groq_api import GroqAPI
+from http_transport import AsyncHTTPTransport
+from main import _load_agent_class
+import metrics
+from memory import CodeMemory
+from mock_llm_server import MockLLMServer
+from request_scheduler import RequestScheduler
+
+# Доли языков в синтетическом проекте
+_LANGUAGE_MIX = [(".py", 4), (".java", 2), (".cpp", 2), (".sql", 1)]
+
+
+def make_synthetic_repo(root: str, files: int, lines: int, seed: int = 0) -> list[str]:
+    """Создает проект из files файлов примерно по lines строк (Python, Java, C++, SQL)."""
+    rnd = random.Random(seed)
+    extensions = [ext for ext, weight in _LANGUAGE_MIX for _ in range(weight)]
+    paths = []
+    for idx in range(files):
+        ext = extensions[idx % len(extensions)]
+        package = os.path.join(root, f"pkg{idx % 10}")
+        os.makedirs(package, exist_ok=True)
+        path = os.path.join(package, f"module_{idx}{ext}")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(_synthetic_code(ext, idx, lines, rnd))
+        paths.append(path)
+    return paths
+
+
+def _synthetic_code(ext: str, idx: int, lines: int, rnd: random.Random) -> str:
+    """Генерирует код из однотипных функций со случайными константами."""
+    out = []
+    func = 0
+    while len(out) < lines:
+        a, b = rnd.randint(1, 1000), rnd.randint(0, 9)
+        name = f"calc_{idx}_{func}"
+        if ext == ".py":
+            out += [
+                f"def {name}(items, limit={a}):",
+                "    total = 0",
+                "    for item in items:",
+                f"        if item % {b + 2} == 0 and total < limit:",
+                f"            total += item // {b + 1}",
+                "    return total",
+                "",
+            ]
+        elif ext == ".sql":
+            out += [
+                f"SELECT o.id, SUM(o.amount) AS total_{func}",
+                "FROM orders o JOIN customers c ON c.id = o.customer_id",
+                f"WHERE o.amount > {a} AND c.region = {b}",
+                "GROUP BY o.id;",
+                "",
+            ]
+        else:
+            typed = "int[] items" if ext == ".java" else "const std::vector<int>& items"
+            loop = "for (int item : items) {"
+            out += [
+                f"static int {name}({typed}, int limit) {{",
+                "    int total = 0;",
+                f"    {loop}",
+                f"        if (item % {b + 2} == 0 && total < limit + {a}) {{",
+                f"            total += item / {b + 1};",
+                "        }",
+                "    }",
+                "    return total;",
+                "}",
+                "",
+            ]
+        func += 1
+    if ext == ".java":
+        out = [f"public class Module{idx} {{"] + ["    " + line for line in out] + ["}"]
+    return "\n".join(out) + "\n"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Перцентиль по ближайшему рангу (0 для пустого списка)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def peak_rss_mb() -> float | None:
+    """Пиковое потребление памяти процессом, МБ (None, если модуль resource недоступен)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS — байты
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _timed_agent_class():
+    """Agent, который замеряет длительность анализа каждого файла."""
+    Agent = _load_agent_class()
+
+    class TimedAgent(Agent):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.file_latency: dict[str, float] = {}
+
+        async def _run_file_actions(self, file_path, primary_result=None):
+            started = time.perf_counter()
+            outcome = await super()._run_file_actions(file_path, primary_result)
+            # Время файлов из пакета учитывается целиком в _run_batch_actions
+            if primary_result is None:
+                self.file_latency[file_path] = time.perf_counter() - started
+            return outcome
+
+        async def _run_batch_actions(self, file_paths):
+            started = time.perf_counter()
+            outcomes = await super()._run_batch_actions(file_paths)
+            elapsed = time.perf_counter() - started
+            for file_path in file_paths:
+                self.file_latency[file_path] = elapsed
+            return outcomes
+
+    return TimedAgent
+
+
+def run_benchmark(args) -> dict:
+    """Запускает mock-сервер и Agent.run_from_path на синтетическом проекте."""
+    server = MockLLMServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        finding_rate=args.finding_rate,
+        seed=args.seed,
+    )
+    url = server.start()
+    if args.provider == "gigachat":
+        os.environ["GIGACHAT_BASE_URL"] = url
+        os.environ["GIGACHAT_API_TOKEN"] = "benchmark"
+    else:
+        os.environ["GROQ_BASE_URL"] = url
+        os.environ["GROQ_API_KEY"] = "benchmark"
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        project = os.path.join(workdir, "project")
+        make_synthetic_repo(project, args.files, args.lines, args.seed)
+        scheduler = RequestScheduler(
+            max_concurrency=max(1, args.concurrency) * 2, max_retries=args.max_retries
+        )
+        provider = GigaChatAPI if args.provider == "gigachat" else GroqAPI
+        model = provider(
+            transport=AsyncHTTPTransport(pool_size=args.concurrency),
+            stream=args.stream,
+            memory=CodeMemory(collection_name="benchmark"),
+            scheduler=scheduler,
+        )
+        agent = _timed_agent_class()(
+            model=model, concurrency=args.concurrency, batch_tokens=args.batch_tokens
+        )
+        output = os.path.join(workdir, "report.md")
+        metrics.reset()
+        started = time.perf_counter()
+        with open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                asyncio.run(agent.run_from_path(project, output_file=output))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    latencies = list(agent.file_latency.values())
+    stats = server.stats()
+    rss = peak_rss_mb()
+    return {
+        "files": args.files,
+        "concurrency": args.concurrency,
+        "elapsed_sec": round(elapsed, 3),
+        "files_per_sec": round(args.files / elapsed, 2) if elapsed else None,
+        "latency_p50_sec": round(percentile(latencies, 50), 3),
+        "latency_p95_sec": round(percentile(latencies, 95), 3),
+        "latency_p99_sec": round(percentile(latencies, 99), 3),
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        "requests": stats["requests"],
+        "statuses": stats["statuses"],
+        "retries": scheduler.retries,
+    }
+
+
+def main():
+    """Парсит аргументы, запускает бенчмарк и печатает метрики."""
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк агента на mock LLM API")
+    parser.add_argument("--files", type=int, default=200, help="Число файлов в проекте")
+    parser.add_argument("--lines", type=int, default=80, help="Строк в файле")
+    parser.add_argument("--provider", choices=["groq", "gigachat"], default="groq")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-tokens", type=int, default=0)
+    parser.add_argument("--stream", action="store_true", help="Ответы потоком (SSE)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Задержка ответа, с")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Разброс задержки, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After для 429, с")
+    parser.add_argument("--finding-rate", type=float, default=0.2, help="Доля ответов с находкой")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="Сохранить метрики в JSON-файл")
+    parser.add_argument(
+        "--metrics-out", default=None, help="Подробные метрики прогона: PATH.json и PATH.prom"
+    )
+    parser.add_argument("--verbose", action="store_true", help="Показывать вывод агента")
+    args = parser.parse_args()
+    result = run_benchmark(args)
+    for key, value in result.items():
+        print(f"[bench] {key}: {value}")
+    if args.metrics_out:
+        metrics.get_metrics().export(args.metrics_out)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
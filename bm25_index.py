@@ -0,0 +1,215 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+from array import array
+from functools import lru_cache
+
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_SUBTOKEN_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+@lru_cache(maxsize=200_000)
+def _split_word(word: str) -> tuple[str, ...]:
+    """Возвращает слово и его части (для составных имен) в нижнем регистре."""
+    lowered = word.lower()
+    # Части ищем только у составных имен: snake_case, camelCase, буквы+цифры
+    if "_" in word or (word != lowered and not word.isupper()) or not word.isalpha():
+        parts = _SUBTOKEN_RE.findall(word)
+        if len(parts) > 1:
+            return (lowered, *(part.lower() for part in parts))
+    return (lowered,)
+
+
+def tokenize_code(text: str) -> list[str]:
+    """Выделяет идентификаторы и их части (camelCase, snake_case) в нижнем регистре."""
+    tokens = []
+    for word in _TOKEN_RE.findall(text):
+        tokens.extend(_split_word(word))
+    return tokens
+
+
+class BM25Index:
+    """Инвертированный индекс (токен -> постинги) с ранжированием BM25.
+
+    Постинги хранятся компактно: array('I') из пар (номер документа, частота).
+    Индекс можно сохранить на диск и загрузить через mmap; документы, добавленные
+    после загрузки, попадают в оперативную часть и объединяются при поиске.
+    """
+
+    POSTINGS_FILE = "postings.bin"
+    META_FILE = "index.json"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """Создает пустой индекс с параметрами BM25."""
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: list[str] = []
+        self.doc_texts: list[str] = []
+        self.doc_lengths = array("I")
+        self.total_length = 0
+        self._id_to_idx: dict[str, int] = {}
+        self._deleted: set[int] = set()
+        self._postings: dict[str, array] = {}
+        self._mapped = None
+        self._mapped_file = None
+        self._mapped_vocab: dict[str, tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        """Возвращает количество актуальных документов."""
+        return len(self.doc_ids) - len(self._deleted)
+
+    def add(self, doc_id: str, text: str):
+        """Добавляет документ; документ с тем же id заменяется."""
+        self.remove(doc_id)
+        tokens = tokenize_code(text)
+        doc_idx = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_texts.append(text)
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        self._id_to_idx[doc_id] = doc_idx
+        counts: dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = array("I")
+            posting.append(doc_idx)
+            posting.append(tf)
+
+    def remove(self, doc_id: str):
+        """Помечает документ удаленным (постинги очищаются при сохранении)."""
+        doc_idx = self._id_to_idx.pop(doc_id, None)
+        if doc_idx is None:
+            return
+        self._deleted.add(doc_idx)
+        self.total_length -= self.doc_lengths[doc_idx]
+        self.doc_texts[doc_idx] = ""
+
+    def get_text(self, doc_id: str) -> str | None:
+        """Возвращает текст документа по id."""
+        doc_idx = self._id_to_idx.get(doc_id)
+        if doc_idx is None:
+            return None
+        return self.doc_texts[doc_idx]
+
+    def _iter_postings(self, token: str):
+        """Возвращает пары (документ, частота) из загруженной и оперативной частей."""
+        if self._mapped is not None and token in self._mapped_vocab:
+            offset, count = self._mapped_vocab[token]
+            view = self._mapped[offset : offset + 2 * count]
+            for i in range(0, len(view), 2):
+                yield view[i], view[i + 1]
+        posting = self._postings.get(token)
+        if posting is not None:
+            for i in range(0, len(posting), 2):
+                yield posting[i], posting[i + 1]
+
+    def search(self, query: str, top_k: int = 3) -> list[tuple[str, float]]:
+        """Возвращает top_k документов (id, score), ранжированных по BM25."""
+        live_docs = len(self)
+        if not live_docs:
+            return []
+        avg_length = self.total_length / live_docs or 1.0
+        scores: dict[int, float] = {}
+        for token in set(tokenize_code(query)):
+            postings = [
+                (doc_idx, tf)
+                for doc_idx, tf in self._iter_postings(token)
+                if doc_idx not in self._deleted
+            ]
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1.0 + (live_docs - df + 0.5) / (df + 0.5))
+            for doc_idx, tf in postings:
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[doc_idx] / avg_length)
+                weight = idf * tf * (self.k1 + 1.0) / (tf + norm)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + weight
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(self.doc_ids[doc_idx], score) for doc_idx, score in best]
+
+    def save(self, path: str):
+        """Сохраняет индекс в каталог: постинги в бинарный файл, остальное в JSON.
+
+        Удаленные документы при сохранении вычищаются, номера документов уплотняются.
+        """
+        os.makedirs(path, exist_ok=True)
+        remap = {}
+        doc_ids, doc_texts, doc_lengths = [], [], []
+        for doc_idx, doc_id in enumerate(self.doc_ids):
+            if doc_idx in self._deleted:
+                continue
+            remap[doc_idx] = len(doc_ids)
+            doc_ids.append(doc_id)
+            doc_texts.append(self.doc_texts[doc_idx])
+            doc_lengths.append(self.doc_lengths[doc_idx])
+        tokens = set(self._mapped_vocab) | set(self._postings)
+        postings = array("I")
+        vocab = {}
+        for token in sorted(tokens):
+            offset = len(postings)
+            for doc_idx, tf in self._iter_postings(token):
+                if doc_idx in remap:
+                    postings.append(remap[doc_idx])
+                    postings.append(tf)
+            count = (len(postings) - offset) // 2
+            if count:
+                vocab[token] = (offset, count)
+        meta = {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_ids": doc_ids,
+            "doc_texts": doc_texts,
+            "doc_lengths": doc_lengths,
+            "vocab": vocab,
+        }
+        postings_path = os.path.join(path, self.POSTINGS_FILE)
+        meta_path = os.path.join(path, self.META_FILE)
+        self.close()
+        with open(f"{postings_path}.tmp", "wb") as f:
+            postings.tofile(f)
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(f"{postings_path}.tmp", postings_path)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Загружает индекс из каталога, отображая постинги в память через mmap."""
+        with open(os.path.join(path, cls.META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(k1=meta.get("k1", 1.2), b=meta.get("b", 0.75))
+        index.doc_ids = meta["doc_ids"]
+        index.doc_texts = meta["doc_texts"]
+        index.doc_lengths = array("I", meta["doc_lengths"])
+        index.total_length = sum(index.doc_lengths)
+        index._id_to_idx = {doc_id: idx for idx, doc_id in enumerate(index.doc_ids)}
+        index._mapped_vocab = {token: tuple(pos) for token, pos in meta["vocab"].items()}
+        postings_path = os.path.join(path, cls.POSTINGS_FILE)
+        if os.path.getsize(postings_path):
+            index._mapped_file = open(postings_path, "rb")
+            buffer = mmap.mmap(index._mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+            index._mapped = memoryview(buffer).cast("I")
+        return index
+
+    def close(self):
+        """Освобождает mmap загруженной части, перенося ее постинги в память."""
+        if self._mapped is None:
+            return
+        for token in self._mapped_vocab:
+            offset, count = self._mapped_vocab[token]
+            merged = array("I", self._mapped[offset : offset + 2 * count])
+            merged.extend(self._postings.get(token, array("I")))
+            self._postings[token] = merged
+        buffer = self._mapped.obj
+        self._mapped.release()
+        buffer.close()
+        self._mapped_file.close()
+        self._mapped = None
+        self._mapped_file = None
+        self._mapped_vocab = {}
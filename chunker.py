@@ -0,0 +1,225 @@
+import ast
+import os
+import re
+
+# Грубая оценка: ~3 символа кода на токен (с запасом для кириллицы и символов)
+CHARS_PER_TOKEN = 3
+
+# Пометка в тексте окна: строка длиннее бюджета отправлена не целиком
+TRUNCATED_LINE_MARKER = "[строка обрезана]"
+
+BRACE_LANGS = {"C++", "Java", "JavaScript", "TypeScript"}
+# Комментарии и строковые/символьные литералы C++/Java: их вырезают перед поиском по токенам
+BRACE_STRIP_RE = re.compile(
+    r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.DOTALL
+)
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "Python",
+    ".pyw": "Python",
+    ".cpp": "C++",
+    ".cc": "C++",
+    ".cxx": "C++",
+    ".hpp": "C++",
+    ".h": "C++",
+    ".java": "Java",
+    ".sql": "SQL",
+}
+
+
+def detect_language(file_path: str) -> str:
+    """Определяет язык по расширению файла."""
+    ext = os.path.splitext(file_path)[1].lower()
+    return LANGUAGE_BY_EXTENSION.get(ext, "Generic")
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценивает число токенов в тексте без токенизатора модели."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_code(code: str, lang: str, max_tokens: int) -> list[tuple[int, int, str]]:
+    """Делит код на окна не больше max_tokens по синтаксическим границам.
+
+    Возвращает список (первая строка, последняя строка, текст), строки с 1.
+    Режет по границам функций/классов (Python — ast, C++/Java — парные скобки),
+    по концу SQL-выражений или по пустым строкам; соседние куски упаковываются
+    в окна максимально плотно, а слишком большие куски делятся глубже.
+    Строка, которая одна больше бюджета, обрезается с пометкой TRUNCATED_LINE_MARKER.
+    """
+    lines = code.splitlines(keepends=True)
+    if not lines:
+        return []
+    prefix = [0]
+    for line in lines:
+        prefix.append(prefix[-1] + len(line))
+    cuts = _find_cuts(code, lines, lang)
+    budget = max(1, max_tokens)
+
+    def tokens(start: int, end: int) -> int:
+        return (prefix[end] - prefix[start]) // CHARS_PER_TOKEN + 1
+
+    pieces = _split_range(0, len(lines), cuts, budget, tokens)
+    windows = []
+    for start, end in _merge_pieces(pieces, budget, tokens):
+        text = "".join(lines[start:end])
+        if tokens(start, end) > budget:
+            # Больше бюджета бывает только одна строка (данные, минифицированный код)
+            text = _truncate_line(text, budget)
+        windows.append((start + 1, end, text))
+    return windows
+
+
+def _truncate_line(line: str, budget: int) -> str:
+    """Обрезает строку до бюджета токенов с явной пометкой об обрезке."""
+    limit = budget * CHARS_PER_TOKEN - 1
+    marker = f" {TRUNCATED_LINE_MARKER}\n"
+    if len(marker) >= limit:
+        return line[:limit]
+    return line[: limit - len(marker)] + marker
+
+
+def _split_range(start, end, cuts, budget, tokens) -> list[tuple[int, int]]:
+    """Рекурсивно делит диапазон строк по самому верхнему уровню границ."""
+    if tokens(start, end) <= budget or end - start <= 1:
+        return [(start, end)]
+    inner = [(pos, level) for pos, level in cuts if start < pos < end]
+    if not inner:
+        return _split_lines(start, end, budget, tokens)
+    top_level = min(level for _, level in inner)
+    points = [start] + [pos for pos, level in inner if level == top_level] + [end]
+    pieces = []
+    for piece_start, piece_end in zip(points, points[1:]):
+        pieces.extend(_split_range(piece_start, piece_end, cuts, budget, tokens))
+    return _merge_pieces(pieces, budget, tokens)
+
+
+def _split_lines(start, end, budget, tokens) -> list[tuple[int, int]]:
+    """Делит диапазон по строкам, когда синтаксических границ не осталось."""
+    pieces = []
+    piece_start = start
+    for pos in range(start + 1, end):
+        if tokens(piece_start, pos + 1) > budget:
+            pieces.append((piece_start, pos))
+            piece_start = pos
+    pieces.append((piece_start, end))
+    return pieces
+
+
+def _merge_pieces(pieces, budget, tokens) -> list[tuple[int, int]]:
+    """Жадно объединяет соседние куски, пока окно укладывается в бюджет."""
+    merged = []
+    for start, end in pieces:
+        if merged and tokens(merged[-1][0], end) <= budget:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _find_cuts(code: str, lines: list[str], lang: str) -> list[tuple[int, int]]:
+    """Возвращает допустимые места разреза: (индекс строки, уровень вложенности)."""
+    if lang == "Python":
+        try:
+            return _python_cuts(ast.parse(code))
+        except (SyntaxError, ValueError):
+            return _blank_line_cuts(lines)
+    if lang in BRACE_LANGS:
+        return _brace_cuts(lines)
+    if lang == "SQL":
+        return _sql_cuts(lines)
+    return _blank_line_cuts(lines)
+
+
+def _python_cuts(tree: ast.AST) -> list[tuple[int, int]]:
+    """Границы операторов верхнего уровня и тел классов/функций (с декораторами)."""
+    cuts = []
+
+    def visit(body, level):
+        for node in body:
+            first_line = node.lineno
+            for decorator in getattr(node, "decorator_list", []):
+                first_line = min(first_line, decorator.lineno)
+            cuts.append((first_line - 1, level))
+            if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                visit(node.body, level + 1)
+
+    visit(tree.body, 0)
+    return cuts
+
+
+_BRACE_TOKEN_RE = re.compile(r'//|/\*|\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[{};]')
+
+
+def _brace_cuts(lines: list[str]) -> list[tuple[int, int]]:
+    """Границы по парным скобкам: после строки, где блок или оператор закрылся.
+
+    Уровень разреза — глубина вложенности, на которую вернулся код.
+    Строки и комментарии при подсчете скобок пропускаются.
+    """
+    cuts = []
+    depth = 0
+    in_block_comment = False
+    for idx, line in enumerate(lines):
+        closed_at = None
+        for match in _BRACE_TOKEN_RE.finditer(line):
+            token = match.group(0)
+            if in_block_comment:
+                if token == "*/":
+                    in_block_comment = False
+                continue
+            if token == "/*":
+                in_block_comment = True
+            elif token == "//":
+                break
+            elif token == "{":
+                depth += 1
+            elif token == "}":
+                depth = max(0, depth - 1)
+                closed_at = depth
+            elif token == ";":
+                closed_at = depth if closed_at is None else min(closed_at, depth)
+        # Строка вида "} else {" снова открывает блок — это не граница
+        if closed_at is not None and not in_block_comment and depth <= closed_at:
+            cuts.append((idx + 1, depth))
+    return cuts
+
+
+def _sql_cuts(lines: list[str]) -> list[tuple[int, int]]:
+    """Границы SQL-выражений: строки, заканчивающиеся ';' вне строк и комментариев."""
+    cuts = []
+    in_string = False
+    in_block_comment = False
+    for idx, line in enumerate(lines):
+        pos = 0
+        ends_statement = False
+        while pos < len(line):
+            char = line[pos]
+            pair = line[pos : pos + 2]
+            if in_block_comment:
+                if pair == "*/":
+                    in_block_comment = False
+                    pos += 1
+            elif in_string:
+                if char == "'":
+                    in_string = False
+            elif pair == "--":
+                break
+            elif pair == "/*":
+                in_block_comment = True
+                pos += 1
+            elif char == "'":
+                in_string = True
+            elif char == ";":
+                ends_statement = True
+            elif not char.isspace():
+                ends_statement = False
+            pos += 1
+        if ends_statement and not in_string and not in_block_comment:
+            cuts.append((idx + 1, 0))
+    return cuts
+
+
+def _blank_line_cuts(lines: list[str]) -> list[tuple[int, int]]:
+    """Границы по пустым строкам (для языков без разбора)."""
+    return [(idx + 1, 0) for idx, line in enumerate(lines) if not line.strip()]
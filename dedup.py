@@ -0,0 +1,158 @@
+import hashlib
+import random
+import re
+import zlib
+from functools import lru_cache
+
+import chunker
+from parallel import parallel_map
+
+# MinHash: NUM_PERM хэш-функций, LSH — BANDS полос по ROWS значений.
+# При 8x8 пара попадает в кандидаты с вероятностью ~50% уже при сходстве ~0.77
+NUM_PERM = 64
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+# Меньше шинглов — только точные совпадения: у крошечных файлов сходство случайно
+MIN_SHINGLES = 20
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+_PERM_A = [_rng.randrange(1, 1 << 31) for _ in range(NUM_PERM)]
+_PERM_B = [_rng.randrange(0, 1 << 31) for _ in range(NUM_PERM)]
+
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+|\S")
+_COMMENT_RE = {
+    "Python": re.compile(r"#[^\n]*"),
+    "C++": re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL),
+    "Java": re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL),
+    "SQL": re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL),
+}
+
+
+def file_signature(file_path: str) -> tuple[str, str, str | None, list[int] | None]:
+    """Возвращает (путь, язык, точный хэш, MinHash-сигнатура).
+
+    Точный хэш считается по содержимому без различий в переводах строк и
+    концевых пробелах; сигнатура — по шинглам токенов без комментариев
+    (None для слишком маленьких файлов). Недоступный файл — без хэша.
+    """
+    lang = chunker.detect_language(file_path)
+    try:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+            code = file.read()
+    except OSError:
+        return file_path, lang, None, None
+    normalized = "\n".join(line.rstrip() for line in code.splitlines()).strip()
+    exact = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    comment_re = _COMMENT_RE.get(lang)
+    if comment_re is not None:
+        code = comment_re.sub(" ", code)
+    tokens = _TOKEN_RE.findall(code)
+    shingles = {
+        zlib.crc32(" ".join(tokens[i : i + SHINGLE_SIZE]).encode("utf-8"))
+        for i in range(len(tokens) - SHINGLE_SIZE + 1)
+    }
+    if len(shingles) < MIN_SHINGLES:
+        return file_path, lang, exact, None
+    return file_path, lang, exact, _minhash(shingles)
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """NumPy для векторного расчета MinHash; импортируется при первом использовании."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _minhash(shingles: set[int]) -> list[int]:
+    """MinHash-сигнатура: минимум (a*x + b) mod p по шинглам для каждой перестановки."""
+    np = _numpy()
+    if np is not None:
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        a = np.array(_PERM_A, dtype=np.uint64)[:, None]
+        b = np.array(_PERM_B, dtype=np.uint64)[:, None]
+        # a < 2^31 и x < 2^32: произведение помещается в uint64 без переполнения
+        hashed = (a * values[None, :] + b) % np.uint64(_MERSENNE_PRIME)
+        return hashed.min(axis=1).tolist()
+    return [
+        min((a * x + b) % _MERSENNE_PRIME for x in shingles)
+        for a, b in zip(_PERM_A, _PERM_B)
+    ]
+
+
+def _similarity(left: list[int], right: list[int]) -> float:
+    """Оценка сходства Жаккара по доле совпавших значений сигнатур."""
+    return sum(1 for a, b in zip(left, right) if a == b) / NUM_PERM
+
+
+def find_duplicates(
+    files: list[str], threshold: float = 0.85, workers: int | None = None
+) -> dict[str, tuple[str, float]]:
+    """Находит точные и почти точные копии среди файлов одного языка.
+
+    Возвращает {копия: (представитель, сходство)}; представитель кластера —
+    первый файл в порядке files, его результат переиспользуется для копий.
+    Кандидаты ищутся через LSH по полосам сигнатур, затем проверяются
+    по оценке сходства не ниже threshold.
+    """
+    signatures = parallel_map(file_signature, files, workers, label="dedup")
+    parent = {file_path: file_path for file_path in files}
+    order = {file_path: idx for idx, file_path in enumerate(files)}
+
+    def find(file_path: str) -> str:
+        while parent[file_path] != file_path:
+            parent[file_path] = parent[parent[file_path]]
+            file_path = parent[file_path]
+        return file_path
+
+    def union(left: str, right: str):
+        left, right = find(left), find(right)
+        if left != right:
+            # Корень — файл, идущий раньше: он и будет представителем
+            if order[right] < order[left]:
+                left, right = right, left
+            parent[right] = left
+
+    by_exact = {}
+    buckets = {}
+    for file_path, lang, exact, signature in signatures:
+        if exact is None:
+            continue
+        first = by_exact.setdefault((lang, exact), file_path)
+        if first != file_path:
+            union(first, file_path)
+            continue
+        if signature is None:
+            continue
+        for band in range(BANDS):
+            key = (lang, band, tuple(signature[band * ROWS : (band + 1) * ROWS]))
+            buckets.setdefault(key, []).append(file_path)
+
+    by_path = {entry[0]: entry for entry in signatures}
+    for members in buckets.values():
+        for idx, left in enumerate(members):
+            for right in members[idx + 1 :]:
+                if find(left) == find(right):
+                    continue
+                if _similarity(by_path[left][3], by_path[right][3]) >= threshold:
+                    union(left, right)
+
+    duplicates = {}
+    for file_path, lang, exact, signature in signatures:
+        root = find(file_path)
+        if root == file_path:
+            continue
+        root_entry = by_path[root]
+        if exact is not None and exact == root_entry[2]:
+            similarity = 1.0
+        elif signature is not None and root_entry[3] is not None:
+            similarity = _similarity(signature, root_entry[3])
+        else:
+            similarity = threshold
+        duplicates[file_path] = (root, similarity)
+    return duplicates
+
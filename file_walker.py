@@ -0,0 +1,261 @@
+import os
+import re
+from collections import Counter
+
+import chunker
+
+# Каталоги, которые не содержат кода проекта: VCS, кэши инструментов, окружения и
+# зависимости. Результаты сборки (build, dist, target, out) здесь не перечислены:
+# так называются и обычные пакеты с кодом, сборку отсекает .gitignore проекта
+DEFAULT_EXCLUDE_DIRS = {
+    ".git",
+    ".hg",
+    ".svn",
+    ".idea",
+    ".vscode",
+    ".tox",
+    ".venv",
+    "venv",
+    "__pycache__",
+    ".mypy_cache",
+    ".pytest_cache",
+    "node_modules",
+    "bower_components",
+}
+DEFAULT_MAX_FILE_SIZE = 1024 * 1024
+
+# Маркеры сгенерированного кода в первых строках файла
+GENERATED_RE = re.compile(
+    r"@generated|do not edit|auto-?generated|code generated by|generated by the protocol",
+    re.IGNORECASE,
+)
+GENERATED_HEAD_LINES = 10
+
+# Сколько байт начала файла читать для проверки на бинарный/сгенерированный код
+_SNIFF_BYTES = 8192
+# Средняя длина строки, начиная с которой файл считается минифицированным
+_MINIFIED_LINE_LENGTH = 1000
+
+
+class FileWalker:
+    """Обходит проект через os.scandir и лениво выдает файлы для анализа.
+
+    Каталоги из DEFAULT_EXCLUDE_DIRS и игнорируемые .gitignore не посещаются;
+    файлы отбираются по расширению, include/exclude-маскам и размеру,
+    бинарные, минифицированные и сгенерированные файлы пропускаются.
+    """
+
+    def __init__(
+        self,
+        root_path: str,
+        extensions: set[str] | None = None,
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
+        max_file_size: int | None = DEFAULT_MAX_FILE_SIZE,
+        use_gitignore: bool = True,
+        skip_generated: bool = True,
+    ):
+        """Настраивает фильтры обхода.
+
+        extensions — допустимые расширения (по умолчанию языки chunker);
+        include/exclude — glob-маски относительных путей (например, "src/**/*.py");
+        max_file_size — максимальный размер файла в байтах (None — без ограничения).
+        """
+        self.root_path = root_path
+        self.extensions = extensions or set(chunker.LANGUAGE_BY_EXTENSION)
+        self.include = [_compile_glob(pattern) for pattern in include or []]
+        self.exclude = [_compile_glob(pattern) for pattern in exclude or []]
+        self.max_file_size = max_file_size
+        self.use_gitignore = use_gitignore
+        self.skip_generated = skip_generated
+        # Причины пропуска файлов и каталогов — для сводки в логе
+        self.skipped = Counter()
+
+    def __iter__(self):
+        return self.walk()
+
+    def walk(self):
+        """Генератор путей файлов: каталоги обходятся в глубину, имена — по алфавиту."""
+        rules = []
+        if self.use_gitignore:
+            exclude_file = os.path.join(self.root_path, ".git", "info", "exclude")
+            rules.append(_IgnoreRules.from_file(exclude_file, ""))
+        yield from self._walk_dir(self.root_path, "", rules)
+
+    def _walk_dir(self, dir_path: str, rel_dir: str, rules: list):
+        try:
+            with os.scandir(dir_path) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError:
+            self.skipped["недоступный каталог"] += 1
+            return
+        if self.use_gitignore and any(entry.name == ".gitignore" for entry in entries):
+            rules = rules + [_IgnoreRules.from_file(os.path.join(dir_path, ".gitignore"), rel_dir)]
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in DEFAULT_EXCLUDE_DIRS:
+                    self.skipped["служебный каталог"] += 1
+                elif _is_ignored(rules, rel_path, True):
+                    self.skipped[".gitignore"] += 1
+                elif _matches_any(self.exclude, rel_path):
+                    self.skipped["exclude"] += 1
+                else:
+                    yield from self._walk_dir(entry.path, rel_path, rules)
+                continue
+            reason = self._skip_reason(entry, rel_path, rules)
+            if reason is None:
+                yield entry.path
+            elif reason:
+                self.skipped[reason] += 1
+
+    def _skip_reason(self, entry: os.DirEntry, rel_path: str, rules: list) -> str | None:
+        """Причина пропуска файла, "" — не файл кода (не учитывается), None — взять."""
+        if os.path.splitext(entry.name)[1].lower() not in self.extensions:
+            return ""
+        if _is_ignored(rules, rel_path, False):
+            return ".gitignore"
+        if self.include and not _matches_any(self.include, rel_path):
+            return "include"
+        if _matches_any(self.exclude, rel_path):
+            return "exclude"
+        try:
+            if not entry.is_file():
+                return ""
+            size = entry.stat().st_size
+        except OSError:
+            return "недоступный файл"
+        if self.max_file_size is not None and size > self.max_file_size:
+            return "превышен размер"
+        return _sniff(entry.path, self.skip_generated)
+
+
+def is_generated(text: str) -> bool:
+    """Есть ли в первых строках текста маркер сгенерированного кода."""
+    head = "\n".join(text.splitlines()[:GENERATED_HEAD_LINES])
+    return bool(GENERATED_RE.search(head))
+
+
+def _sniff(file_path: str, skip_generated: bool) -> str | None:
+    """Проверяет начало файла: бинарный, минифицированный или сгенерированный."""
+    try:
+        with open(file_path, "rb") as file:
+            sample = file.read(_SNIFF_BYTES)
+    except OSError:
+        return "недоступный файл"
+    if b"\0" in sample:
+        return "бинарный файл"
+    if len(sample) == _SNIFF_BYTES and sample.count(b"\n") < _SNIFF_BYTES // _MINIFIED_LINE_LENGTH:
+        return "минифицированный файл"
+    if skip_generated and is_generated(sample.decode("utf-8", errors="ignore")):
+        return "сгенерированный файл"
+    return None
+
+
+def _matches_any(patterns: list[re.Pattern], rel_path: str) -> bool:
+    return any(pattern.match(rel_path) for pattern in patterns)
+
+
+def _compile_glob(pattern: str) -> re.Pattern:
+    """Glob-маска относительного пути; маска без "/" сравнивается с именем файла."""
+    pattern = pattern.strip().strip("/")
+    if "/" not in pattern:
+        return re.compile(r"(?:.*/)?" + _glob_to_regex(pattern) + r"$")
+    return re.compile(_glob_to_regex(pattern) + r"$")
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """Переводит glob с ** в регулярное выражение; * не пересекает "/"."""
+    parts = []
+    pos = 0
+    while pos < len(pattern):
+        if pattern.startswith("**/", pos):
+            parts.append(r"(?:.*/)?")
+            pos += 3
+        elif pattern.startswith("**", pos):
+            parts.append(r".*")
+            pos += 2
+        elif pattern[pos] == "*":
+            parts.append(r"[^/]*")
+            pos += 1
+        elif pattern[pos] == "?":
+            parts.append(r"[^/]")
+            pos += 1
+        elif pattern[pos] == "[":
+            end = pattern.find("]", pos + 1)
+            if end == -1:
+                parts.append(re.escape(pattern[pos]))
+                pos += 1
+            else:
+                chars = pattern[pos + 1 : end]
+                if chars.startswith("!"):
+                    chars = "^" + chars[1:]
+                parts.append("[" + chars.replace("\\", "\\\\") + "]")
+                pos = end + 1
+        else:
+            parts.append(re.escape(pattern[pos]))
+            pos += 1
+    return "".join(parts)
+
+
+def _is_ignored(rules: list, rel_path: str, is_dir: bool) -> bool:
+    """Последнее совпавшее правило решает, как в git; глубже — приоритетнее."""
+    ignored = False
+    for rule_set in rules:
+        verdict = rule_set.match(rel_path, is_dir)
+        if verdict is not None:
+            ignored = verdict
+    return ignored
+
+
+class _IgnoreRules:
+    """Правила одного .gitignore, заданные относительно его каталога."""
+
+    def __init__(self, base: str, lines: list[str]):
+        self.base = base
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate or line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            # Маска со "/" в начале или середине привязана к каталогу .gitignore
+            anchored = "/" in line
+            regex = _glob_to_regex(line.lstrip("/"))
+            if not anchored:
+                regex = r"(?:.*/)?" + regex
+            self.rules.append((re.compile(regex + r"$"), negate, dir_only))
+
+    @classmethod
+    def from_file(cls, path: str, base: str) -> "_IgnoreRules":
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as file:
+                return cls(base, file.readlines())
+        except OSError:
+            return cls(base, [])
+
+    def match(self, rel_path: str, is_dir: bool) -> bool | None:
+        """True — игнорировать, False — явно вернуть (!), None — правила не сработали."""
+        if not self.rules:
+            return None
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return None
+            rel_path = rel_path[len(self.base) + 1 :]
+        verdict = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                verdict = not negate
+        return verdict
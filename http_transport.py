@@ -0,0 +1,345 @@
+import asyncio
+import json
+import ssl
+import urllib.parse
+
+
+class HTTPResponse:
+    """Ответ HTTP: статус, заголовки (в нижнем регистре) и тело."""
+
+    def __init__(self, status: int, reason: str, headers: dict[str, str], body: bytes):
+        """Сохраняет разобранный ответ."""
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def text(self) -> str:
+        """Возвращает тело ответа как UTF-8 строку."""
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self):
+        """Разбирает тело ответа как JSON."""
+        return json.loads(self.body)
+
+
+class _Connection:
+    """Открытое соединение с хостом и признак повторного использования."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+
+    def is_usable(self) -> bool:
+        """Проверяет, что соединение не закрыто сервером."""
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def close(self):
+        """Закрывает соединение, игнорируя ошибки."""
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class AsyncHTTPTransport:
+    """Асинхронный HTTP/1.1-клиент с пулом keep-alive соединений.
+
+    На каждый хост открывается не больше pool_size соединений; после ответа
+    соединение возвращается в пул и переиспользуется без нового TCP/TLS-рукопожатия.
+    Работает на asyncio-потоках, без отдельного потока на запрос.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        timeout: float = 120.0,
+        ssl_context: ssl.SSLContext | None = None,
+    ):
+        """Задает размер пула на хост, таймаут запроса и TLS-контекст."""
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self._idle: dict[tuple[str, str, int], list[_Connection]] = {}
+        self._limits: dict[tuple[str, str, int], asyncio.Semaphore] = {}
+        self._loop = None
+
+    async def post_json(
+        self, url: str, payload: dict, headers: dict[str, str] | None = None
+    ) -> HTTPResponse:
+        """Отправляет POST с JSON-телом и возвращает полный ответ."""
+        body, request_headers = self._json_request(payload, headers)
+        return await asyncio.wait_for(
+            self._request("POST", url, request_headers, body), timeout=self.timeout
+        )
+
+    async def stream_post_json(
+        self, url: str, payload: dict, headers: dict[str, str] | None = None
+    ) -> "HTTPStream":
+        """Отправляет POST с JSON-телом и возвращает поток ответа (например, SSE).
+
+        Таймаут действует на ожидание заголовков и на каждую следующую порцию тела.
+        """
+        body, request_headers = self._json_request(payload, headers)
+        key, connection, status, reason, response_headers = await asyncio.wait_for(
+            self._open("POST", url, request_headers, body), timeout=self.timeout
+        )
+        return HTTPStream(self, key, connection, status, reason, response_headers)
+
+    def _json_request(
+        self, payload: dict, headers: dict[str, str] | None
+    ) -> tuple[bytes, dict[str, str]]:
+        """Кодирует JSON-тело и добавляет заголовок Content-Type."""
+        request_headers = {"Content-Type": "application/json"}
+        request_headers.update(headers or {})
+        return json.dumps(payload).encode("utf-8"), request_headers
+
+    async def _request(
+        self, method: str, url: str, headers: dict[str, str], body: bytes
+    ) -> HTTPResponse:
+        """Выполняет запрос и читает ответ целиком."""
+        key, connection, status, reason, response_headers = await self._open(
+            method, url, headers, body
+        )
+        try:
+            chunks = [chunk async for chunk in self._iter_body(connection, response_headers)]
+        except BaseException:
+            self._finish(key, connection, keep_alive=False)
+            raise
+        self._finish(key, connection, keep_alive=self._keep_alive(response_headers))
+        return HTTPResponse(status, reason, response_headers, b"".join(chunks))
+
+    async def _open(self, method: str, url: str, headers: dict[str, str], body: bytes):
+        """Отправляет запрос через соединение из пула и читает заголовки ответа.
+
+        Занимает место в пуле хоста до вызова _finish. Если переиспользованное
+        соединение оказалось закрыто сервером, запрос повторяется на новом.
+        """
+        parsed = urllib.parse.urlsplit(url)
+        key = self._pool_key(parsed)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += f"?{parsed.query}"
+        limit = self._limit(key)
+        await limit.acquire()
+        try:
+            for attempt in range(2):
+                connection = await self._acquire(key, parsed.hostname)
+                try:
+                    await self._send(connection, method, parsed, path, headers, body)
+                    status, reason, response_headers = await self._read_head(connection)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    connection.close()
+                    # Сервер мог закрыть простаивающее соединение — пробуем новое
+                    if connection.reused and attempt == 0:
+                        continue
+                    raise ConnectionError(f"Соединение с {parsed.hostname} прервано: {e}") from e
+                except BaseException:
+                    connection.close()
+                    raise
+                return key, connection, status, reason, response_headers
+            raise ConnectionError(f"Не удалось выполнить запрос к {parsed.hostname}")
+        except BaseException:
+            limit.release()
+            raise
+
+    def _finish(self, key: tuple[str, str, int], connection: _Connection, keep_alive: bool):
+        """Возвращает соединение в пул (или закрывает) и освобождает место хоста."""
+        if keep_alive:
+            self._release(key, connection)
+        else:
+            connection.close()
+        limit = self._limits.get(key)
+        if limit is not None:
+            limit.release()
+
+    def _pool_key(self, parsed: urllib.parse.SplitResult) -> tuple[str, str, int]:
+        """Возвращает ключ пула (схема, хост, порт)."""
+        scheme = parsed.scheme or "http"
+        port = parsed.port or (443 if scheme == "https" else 80)
+        return scheme, parsed.hostname or "", port
+
+    def _check_loop(self):
+        """Сбрасывает пул, если транспорт используется в новом event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle = {}
+            self._limits = {}
+            self._loop = loop
+
+    def _limit(self, key: tuple[str, str, int]) -> asyncio.Semaphore:
+        """Возвращает семафор, ограничивающий число соединений с хостом."""
+        self._check_loop()
+        if key not in self._limits:
+            self._limits[key] = asyncio.Semaphore(self.pool_size)
+        return self._limits[key]
+
+    async def _acquire(self, key: tuple[str, str, int], hostname: str) -> _Connection:
+        """Берет живое соединение из пула или открывает новое."""
+        idle = self._idle.setdefault(key, [])
+        while idle:
+            connection = idle.pop()
+            if connection.is_usable():
+                connection.reused = True
+                return connection
+            connection.close()
+        scheme, host, port = key
+        ssl_context = self.ssl_context if scheme == "https" else None
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=ssl_context, server_hostname=hostname if ssl_context else None
+        )
+        return _Connection(reader, writer)
+
+    def _release(self, key: tuple[str, str, int], connection: _Connection):
+        """Возвращает соединение в пул простаивающих."""
+        self._idle.setdefault(key, []).append(connection)
+
+    async def _send(self, connection, method, parsed, path, headers, body):
+        """Записывает HTTP-запрос в соединение."""
+        host = parsed.hostname or ""
+        if parsed.port:
+            host = f"{host}:{parsed.port}"
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host}", "Connection: keep-alive"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Content-Length: {len(body)}")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        connection.writer.write(head + body)
+        await connection.writer.drain()
+
+    async def _read_head(self, connection) -> tuple[int, str, dict[str, str]]:
+        """Читает строку статуса и заголовки ответа."""
+        status_line = await connection.reader.readline()
+        if not status_line:
+            raise ConnectionError("сервер закрыл соединение")
+        parts = status_line.decode("latin-1").strip().split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise ConnectionError(f"некорректный ответ: {status_line!r}")
+        headers = {}
+        while True:
+            line = await connection.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return int(parts[1]), parts[2] if len(parts) > 2 else "", headers
+
+    async def _iter_body(self, connection, headers: dict[str, str]):
+        """Отдает тело ответа по частям (Content-Length, chunked или до закрытия)."""
+        reader = connection.reader
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await reader.readline()
+                if not size_line:
+                    # Соединение закрыто до завершающего нулевого куска: тело неполное
+                    raise asyncio.IncompleteReadError(b"", None)
+                size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    # Завершающие заголовки (trailers) до пустой строки
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining > 0:
+                data = await reader.read(min(remaining, 65536))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                yield data
+        else:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                yield data
+
+    def _keep_alive(self, headers: dict[str, str]) -> bool:
+        """Можно ли вернуть соединение в пул после ответа."""
+        if headers.get("connection", "").lower() == "close":
+            return False
+        return "content-length" in headers or "transfer-encoding" in headers
+
+    async def close(self):
+        """Закрывает все простаивающие соединения пула."""
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle = {}
+
+
+class HTTPStream:
+    """Потоковый ответ: статус и заголовки известны сразу, тело читается по мере прихода."""
+
+    def __init__(self, transport, key, connection, status, reason, headers):
+        """Привязывает поток к соединению из пула транспорта."""
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._transport = transport
+        self._key = key
+        self._connection = connection
+        self._body = transport._iter_body(connection, headers)
+        self._complete = False
+        self._closed = False
+
+    async def __aenter__(self) -> "HTTPStream":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _next_chunk(self) -> bytes | None:
+        """Читает следующую порцию тела с таймаутом; None — тело закончилось."""
+        try:
+            return await asyncio.wait_for(self._body.__anext__(), self._transport.timeout)
+        except StopAsyncIteration:
+            self._complete = True
+            return None
+
+    async def iter_lines(self):
+        """Отдает строки тела ответа (без перевода строки) по мере поступления."""
+        buffer = b""
+        while True:
+            chunk = await self._next_chunk()
+            if chunk is None:
+                break
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line.rstrip(b"\r").decode("utf-8", errors="replace")
+        if buffer:
+            yield buffer.rstrip(b"\r").decode("utf-8", errors="replace")
+
+    async def read(self) -> bytes:
+        """Дочитывает тело ответа целиком."""
+        chunks = []
+        while (chunk := await self._next_chunk()) is not None:
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def aclose(self):
+        """Возвращает соединение в пул, если тело прочитано полностью, иначе закрывает."""
+        if self._closed:
+            return
+        self._closed = True
+        keep_alive = self._complete and self._transport._keep_alive(self.headers)
+        self._transport._finish(self._key, self._connection, keep_alive)
+
+
+_shared_transport: AsyncHTTPTransport | None = None
+
+
+def get_shared_transport(pool_size: int | None = None) -> AsyncHTTPTransport:
+    """Возвращает общий транспорт процесса (создается при первом обращении)."""
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = AsyncHTTPTransport(pool_size=pool_size or 10)
+    elif pool_size:
+        _shared_transport.pool_size = max(1, pool_size)
+    return _shared_transport
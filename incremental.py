@@ -0,0 +1,58 @@
+import json
+import os
+
+
+def load_state(state_file: str) -> dict:
+    """Загружает состояние прошлого запуска (коммит и результаты по файлам)."""
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[incremental] Не удалось прочитать состояние {state_file}: {e}")
+        return {}
+    if not isinstance(state, dict):
+        return {}
+    return state
+
+
+def save_state(state_file: str, commit: str | None, results: dict[str, str]):
+    """Сохраняет коммит и результаты по относительным путям файлов."""
+    state = {"commit": commit, "results": results}
+    tmp_path = f"{state_file}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, state_file)
+    except Exception as e:
+        print(f"[incremental] Не удалось сохранить состояние {state_file}: {e}")
+
+
+def select_files(
+    files: list[str],
+    root_path: str,
+    changed: set[str] | None,
+    previous: dict[str, str],
+) -> tuple[list[str], dict[str, str]]:
+    """Делит файлы на требующие анализа и переиспользуемые из прошлого запуска.
+
+    changed — относительные пути измененных файлов (None — анализировать все).
+    Возвращает список файлов для анализа и готовые результаты по абсолютным путям.
+    """
+    if changed is None:
+        return list(files), {}
+    to_analyze = []
+    reused = {}
+    for file_path in files:
+        rel_path = relative_path(file_path, root_path)
+        if rel_path in changed or rel_path not in previous:
+            to_analyze.append(file_path)
+        else:
+            reused[file_path] = previous[rel_path]
+    return to_analyze, reused
+
+
+def relative_path(file_path: str, root_path: str) -> str:
+    """Возвращает путь файла относительно корня проекта в формате git."""
+    return os.path.relpath(file_path, root_path).replace(os.sep, "/")
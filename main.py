@@ -1,11 +1,18 @@
 import argparse
 import asyncio
 import importlib.util
+import os
+import sys
 from pathlib import Path
 
-from model_api import ModelAPI
-from gigachat_api import GigaChatAPI
-from groq_api import GroqAPI
+from response_cache import ResponseCache
+from file_walker import FileWalker
+from memory import CodeMemory
+from http_transport import get_shared_transport
+import metrics
+from project_loader import ProjectLoader
+from provider_router import ProviderRouter
+from request_scheduler import RequestScheduler
 
 
 def _load_agent_class():
@@ -19,8 +26,122 @@ def _load_agent_class():
     return module.Agent
 
 
-def main():
-    """Парсит аргументы и запускает анализ репозитория."""
+DEFAULT_MODELS = {"openai": "gpt-4", "gigachat": "GigaChat", "groq": "llama-3.1-8b-instant"}
+# Повторов на провайдере при запасном провайдере: дальше быстрее переключиться
+FAILOVER_RETRIES = 1
+
+
+def _build_model(
+    provider: str,
+    model_name: str | None,
+    args,
+    cache,
+    memory,
+    max_retries: int | None = None,
+    keep_connections: bool = False,
+):
+    """Создает модель провайдера со своим планировщиком запросов.
+
+    Модуль провайдера (и его зависимости, например openai) импортируется только здесь.
+    keep_connections — не закрывать общий пул HTTP-соединений по окончании анализа.
+    """
+    scheduler = RequestScheduler(
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_concurrency=max(1, args.concurrency) * 2,
+        max_retries=args.max_retries if max_retries is None else max_retries,
+    )
+    model_options = {
+        "cache": cache,
+        "memory": memory,
+        "token_budget": args.token_budget,
+        "scheduler": scheduler,
+        "request_timeout": args.request_timeout,
+    }
+    model_name = model_name or DEFAULT_MODELS[provider]
+    if provider == "gigachat":
+        from gigachat_api import GigaChatAPI
+
+        return GigaChatAPI(
+            model_name=model_name,
+            transport=get_shared_transport(args.http_pool_size),
+            stream=args.stream,
+            close_transport=not keep_connections,
+            **model_options,
+        )
+    if provider == "groq":
+        from groq_api import GroqAPI
+
+        return GroqAPI(
+            model_name=model_name,
+            transport=get_shared_transport(args.http_pool_size),
+            stream=args.stream,
+            close_transport=not keep_connections,
+            **model_options,
+        )
+    from model_api import ModelAPI
+
+    return ModelAPI(model_name=model_name, **model_options)
+
+
+def _build_primary_model(args, cache, memory, keep_connections: bool = False):
+    """Основная модель; с запасным провайдером или хеджированием — ProviderRouter.
+
+    Кэш ответов подключается к маршрутизатору, провайдеры под ним работают без кэша.
+    """
+    if not args.fallback_provider and not args.hedge:
+        return _build_model(
+            args.provider, args.model, args, cache, memory, keep_connections=keep_connections
+        )
+    retries = args.max_retries
+    if args.fallback_provider:
+        retries = min(retries, FAILOVER_RETRIES)
+    backends = [
+        _build_model(args.provider, args.model, args, None, memory, retries, keep_connections)
+    ]
+    if args.fallback_provider:
+        backends.append(
+            _build_model(
+                args.fallback_provider,
+                args.fallback_model,
+                args,
+                None,
+                memory,
+                retries,
+                keep_connections,
+            )
+        )
+    return ProviderRouter(
+        backends, hedge=args.hedge, cooldown=args.failover_cooldown, cache=cache
+    )
+
+
+def _is_remote(source: str) -> bool:
+    """Источник — URL Git-репозитория, а не локальный путь."""
+    return source.startswith("http://") or source.startswith("https://")
+
+
+def _list_files(source: str, loader_options: dict, walker_options: dict):
+    """Печатает файлы, которые попадут в анализ, по мере обхода (без модели и памяти)."""
+    loader = ProjectLoader(**loader_options) if _is_remote(source) else None
+    path = loader.clone_project(source) if loader is not None else source
+    try:
+        walker = FileWalker(path, **walker_options)
+        count = 0
+        for file_path in walker:
+            print(os.path.relpath(file_path, path))
+            count += 1
+        # Сводка — в stderr, чтобы список файлов можно было передать дальше по конвейеру
+        skipped = ", ".join(f"{reason}: {n}" for reason, n in walker.skipped.items())
+        summary = f"[walker] Файлов: {count}" + (f"; пропущено — {skipped}" if skipped else "")
+        print(summary, file=sys.stderr)
+    finally:
+        if loader is not None:
+            loader.cleanup()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Аргументы командной строки анализа (используются и пакетным режимом)."""
     parser = argparse.ArgumentParser(description="AI-Agent: анализ кода из Git-репозитория")
     parser.add_argument(
         "source",
@@ -45,20 +166,317 @@ def main():
         default=None,
         help="Имя модели провайдера (например, gpt-4 или GigaChat)",
     )
-    args = parser.parse_args()
-    Agent = _load_agent_class()
-    if args.provider == "gigachat":
-        model = GigaChatAPI(model_name=args.model or "GigaChat")
-    elif args.provider == "groq":
-        model = GroqAPI(model_name=args.model or "llama-3.1-8b-instant")
-    else:
-        model = ModelAPI(model_name=args.model or "gpt-4")
-    agent = Agent(model=model)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Сколько файлов анализировать параллельно (по умолчанию 4)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Не использовать дисковый кэш ответов модели",
+    )
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Игнорировать сохраненные ответы и перезаписать кэш свежими",
+    )
+    parser.add_argument(
+        "--since",
+        default=None,
+        help="Анализировать только файлы, измененные после указанной git-ссылки",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Инкрементальный режим: изменения с прошлого запуска, прошлые результаты в отчете",
+    )
+    parser.add_argument(
+        "--state-file",
+        default="analysis_state.json",
+        help="Файл состояния инкрементального режима (по умолчанию analysis_state.json)",
+    )
+    parser.add_argument(
+        "--no-clone-cache",
+        action="store_true",
+        help="Клонировать напрямую, без кэша bare-зеркал в sandbox/mirrors",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=None,
+        help="Shallow clone: глубина истории (например, 1)",
+    )
+    parser.add_argument(
+        "--blobless",
+        action="store_true",
+        help="Частичный клон без содержимого истории (--filter=blob:none, без кэша зеркал)",
+    )
+    parser.add_argument(
+        "--sparse",
+        nargs="+",
+        default=None,
+        metavar="DIR",
+        help="Выгружать только указанные каталоги (sparse checkout)",
+    )
+    parser.add_argument(
+        "--persist-index",
+        action="store_true",
+        help="Сохранять BM25-индекс памяти (без ChromaDB) на диск между запусками",
+    )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        default=None,
+        help="Максимальный размер промпта в токенах (по умолчанию половина контекста модели)",
+    )
+    parser.add_argument(
+        "--batch-tokens",
+        type=int,
+        default=0,
+        help="Анализировать мелкие файлы одного языка пакетами до N токенов (0 — выключено)",
+    )
+    parser.add_argument(
+        "--http-pool-size",
+        type=int,
+        default=None,
+        help="Размер пула keep-alive соединений к API Groq/GigaChat (по умолчанию 10)",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=None,
+        help="Лимит запросов в минуту к провайдеру",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=float,
+        default=None,
+        help="Лимит токенов в минуту к провайдеру",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="Число повторов при 429/5xx/сетевых ошибках (по умолчанию 5)",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Предел одной попытки запроса к модели; зависший запрос повторяется",
+    )
+    parser.add_argument(
+        "--fallback-provider",
+        choices=["openai", "gigachat", "groq"],
+        default=None,
+        help="Запасной провайдер: на него переключаются запросы при ошибках основного "
+        f"(повторов на провайдере тогда не больше {FAILOVER_RETRIES})",
+    )
+    parser.add_argument(
+        "--fallback-model",
+        default=None,
+        help="Модель запасного провайдера (по умолчанию модель провайдера по умолчанию)",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Дублировать запрос, если ответа нет дольше p95 задержки провайдера "
+        "(запасному провайдеру или тому же)",
+    )
+    parser.add_argument(
+        "--failover-cooldown",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help="На сколько выключать провайдера после серии ошибок (по умолчанию 30)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Получать ответы Groq/GigaChat потоком (SSE)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Продолжить прерванный запуск по журналу <output>.journal.jsonl",
+    )
+    parser.add_argument(
+        "--include",
+        nargs="+",
+        default=None,
+        metavar="GLOB",
+        help="Анализировать только файлы, подходящие под маски (например, 'src/**/*.py')",
+    )
+    parser.add_argument(
+        "--exclude",
+        nargs="+",
+        default=None,
+        metavar="GLOB",
+        help="Не анализировать файлы и каталоги, подходящие под маски",
+    )
+    parser.add_argument(
+        "--max-file-size",
+        type=int,
+        default=1024,
+        help="Пропускать файлы больше N КБ (по умолчанию 1024, 0 — без ограничения)",
+    )
+    parser.add_argument(
+        "--no-gitignore",
+        action="store_true",
+        help="Не учитывать .gitignore при обходе проекта",
+    )
+    parser.add_argument(
+        "--dedup",
+        type=float,
+        nargs="?",
+        const=0.85,
+        default=None,
+        metavar="THRESHOLD",
+        help="Анализировать копии файлов один раз: точные и почти точные (сходство MinHash "
+        "не ниже THRESHOLD, по умолчанию 0.85)",
+    )
+    parser.add_argument(
+        "--metrics-out",
+        default=None,
+        metavar="PATH",
+        help="Сохранить метрики запуска в PATH.json и PATH.prom (формат Prometheus)",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        metavar="PATH",
+        help="Профилировать запуск через cProfile и сохранить статистику в PATH",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Отслеживать выделения памяти (tracemalloc), N крупнейших мест — в метрики",
+    )
+    parser.add_argument(
+        "--escalate-provider",
+        choices=["openai", "gigachat", "groq"],
+        default=None,
+        help="Каскад: провайдер сильной модели для файлов, отмеченных первичным анализом",
+    )
+    parser.add_argument(
+        "--escalate-model",
+        default=None,
+        help="Имя сильной модели каскада (по умолчанию модель провайдера по умолчанию)",
+    )
+    parser.add_argument(
+        "--pretriage",
+        type=int,
+        nargs="?",
+        const=1,
+        default=None,
+        metavar="MIN_SCORE",
+        help="Статическая оценка риска до LLM: пропуск файлов с оценкой ниже MIN_SCORE "
+        "(по умолчанию 1), анализ остальных по убыванию риска",
+    )
+    parser.add_argument(
+        "--pretriage-workers",
+        type=int,
+        default=None,
+        help="Число процессов статической оценки (по умолчанию по числу CPU)",
+    )
+    parser.add_argument(
+        "--list-files",
+        action="store_true",
+        help="Только вывести файлы, которые попадут в анализ (с учетом фильтров), и выйти",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Показать, что будет сделано с каждым файлом (анализ, пакет, копия, пропуск), "
+        "без обращений к модели",
+    )
+    parser.add_argument(
+        "--no-symbol-index",
+        action="store_true",
+        help="Не строить индекс символов: контекст промпта — поиск в памяти по имени файла",
+    )
+    parser.add_argument(
+        "--memory-collection",
+        default="code_memory",
+        help="Имя коллекции внешней памяти (по умолчанию code_memory)",
+    )
+    return parser
+
+
+def run(args: argparse.Namespace, run_coroutine=asyncio.run, keep_connections: bool = False):
+    """Запускает анализ по разобранным аргументам.
+
+    run_coroutine выполняет корутину анализа; пакетный режим передает сюда
+    event loop процесса-обработчика и keep_connections=True, чтобы keep-alive
+    соединения общего транспорта жили между заданиями (их закрывает сам обработчик).
+    """
     source = args.source or "sandbox"
-    if source.startswith("http://") or source.startswith("https://"):
-        asyncio.run(agent.run_from_git(source, output_file=args.output))
-    else:
-        asyncio.run(agent.run_from_path(source, output_file=args.output))
+    loader_options = {
+        "use_cache": not args.no_clone_cache,
+        "depth": args.depth,
+        "blobless": args.blobless,
+        "sparse_paths": args.sparse,
+    }
+    walker_options = {
+        "include": args.include,
+        "exclude": args.exclude,
+        "max_file_size": args.max_file_size * 1024 or None,
+        "use_gitignore": not args.no_gitignore,
+    }
+    if args.list_files:
+        _list_files(source, loader_options, walker_options)
+        return
+    Agent = _load_agent_class()
+    model = escalation_model = None
+    if not args.dry_run:
+        cache = None if args.no_cache else ResponseCache(refresh=args.refresh_cache)
+        memory = CodeMemory(
+            collection_name=args.memory_collection, persist_index=args.persist_index
+        )
+        model = _build_primary_model(args, cache, memory, keep_connections)
+        if args.escalate_provider:
+            escalation_model = _build_model(
+                args.escalate_provider,
+                args.escalate_model,
+                args,
+                cache,
+                memory,
+                keep_connections=keep_connections,
+            )
+    agent = Agent(
+        model=model,
+        escalation_model=escalation_model,
+        concurrency=args.concurrency,
+        batch_tokens=args.batch_tokens,
+        journal_file=f"{args.output}.journal.jsonl",
+        resume=args.resume,
+        pretriage_min_score=args.pretriage,
+        pretriage_workers=args.pretriage_workers,
+        dedup_threshold=args.dedup,
+        dry_run=args.dry_run,
+        symbol_index=not args.no_symbol_index,
+        walker_options=walker_options,
+        since=args.since,
+        state_file=args.state_file if args.incremental else None,
+        loader_options=loader_options,
+    )
+    with metrics.profiled(args.profile, args.tracemalloc):
+        if _is_remote(source):
+            run_coroutine(agent.run_from_git(source, output_file=args.output))
+        else:
+            run_coroutine(agent.run_from_path(source, output_file=args.output))
+    if args.metrics_out:
+        metrics.get_metrics().export(args.metrics_out)
+
+
+def main():
+    """Парсит аргументы и запускает анализ репозитория."""
+    run(build_parser().parse_args())
 
 
 if __name__ == "__main__":
@@ -1,58 +1,201 @@
+import hashlib
+import importlib
+import math
 import os
+import zlib
+from functools import lru_cache
 
-try:
-    import chromadb
-except ImportError:
-    chromadb = None
+import metrics
+from bm25_index import BM25Index, tokenize_code
+
+
+@lru_cache(maxsize=None)
+def _optional_import(name: str):
+    """Импортирует модуль при первом использовании; None, если он не установлен."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+@lru_cache(maxsize=200_000)
+def _hash_token(token: str, dim: int) -> tuple[int, float]:
+    """Возвращает индекс и знак токена в хэш-пространстве (стабильно между запусками)."""
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
 
 
 class CodeMemory:
     """Внешняя память для хранения чанков кода (ChromaDB или fallback)."""
 
-    def __init__(self, collection_name: str = "code_memory"):
-        """Создает память и готовит хранилище для чанков."""
+    embedding_dim = 128
+    upsert_batch_size = 4000
+
+    def __init__(self, collection_name: str = "code_memory", persist_index: bool = False):
+        """Создает память; хранилище (ChromaDB или BM25) открывается при первом обращении.
+
+        persist_index — сохранять BM25-индекс fallback-хранилища на диск (см. save)
+        и загружать его при следующем запуске.
+        """
         self.collection_name = collection_name
         self.persist_dir = os.path.join(os.path.dirname(__file__), "chroma_db")
-        self._init_storage()
+        self.index_dir = os.path.join(self.persist_dir, f"{collection_name}_bm25")
+        self.persist_index = persist_index
+        # Хэш содержимого и id чанков каждого сохраненного файла (для идемпотентности)
+        self._file_hashes: dict[str, str] = {}
+        self._file_chunk_ids: dict[str, list[str]] = {}
+        # Файлы, в которых встречается чанк (один и тот же текст хранится один раз)
+        self._chunk_owners: dict[str, set[str]] = {}
+        # Хранилище открывается при первом обращении: запуск без анализа
+        # (--dry-run, --list-files) не импортирует chromadb
+        self._ready = False
+        self.client = None
+        self.collection = None
+        self.fallback_index = None
+
+    def _ensure_storage(self):
+        """Инициализирует хранилище при первом сохранении или поиске."""
+        if not self._ready:
+            self._init_storage()
+            self._ready = True
 
     def _init_storage(self):
         """Инициализирует ChromaDB или fallback-хранилище."""
+        chromadb = _optional_import("chromadb")
         if chromadb is None:
             self.client = None
             self.collection = None
-            self.fallback_chunks = []
+            self.fallback_index = self._load_fallback_index()
             return
         os.makedirs(self.persist_dir, exist_ok=True)
         self.client = chromadb.PersistentClient(path=self.persist_dir)
-        self.collection = self.client.create_collection(self.collection_name)
-        self.fallback_chunks = []
+        self.collection = self.client.get_or_create_collection(self.collection_name)
+        self.fallback_index = BM25Index()
+
+    def _load_fallback_index(self) -> BM25Index:
+        """Загружает сохраненный BM25-индекс или создает пустой."""
+        if self.persist_index and os.path.isdir(self.index_dir):
+            try:
+                return BM25Index.load(self.index_dir)
+            except Exception as e:
+                print(f"[memory] Не удалось загрузить индекс {self.index_dir}: {e}")
+        return BM25Index()
 
-    def _fake_embed(self, text: str) -> list[float]:
-        """Возвращает фиктивный эмбеддинг для совместимости с ChromaDB."""
-        return [0.0] * 128
+    def save(self):
+        """Сохраняет BM25-индекс fallback-хранилища, если включено persist_index."""
+        if not self._ready or self.collection is not None or not self.persist_index:
+            return
+        try:
+            self.fallback_index.save(self.index_dir)
+        except Exception as e:
+            print(f"[memory] Не удалось сохранить индекс {self.index_dir}: {e}")
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Строит хэширующие эмбеддинги (signed feature hashing) для пачки текстов.
+
+        Токены — идентификаторы и их части, вес — log(1 + tf), вектора нормированы по L2,
+        поэтому косинусная близость отражает общие имена в коде.
+        """
+        dim = self.embedding_dim
+        np = _optional_import("numpy")
+        if np is not None:
+            rows, cols, signs = [], [], []
+            for row, text in enumerate(texts):
+                for token in tokenize_code(text):
+                    col, sign = _hash_token(token, dim)
+                    rows.append(row)
+                    cols.append(col)
+                    signs.append(sign)
+            matrix = np.zeros((len(texts), dim), dtype=np.float32)
+            if rows:
+                values = np.array(signs, dtype=np.float32)
+                np.add.at(matrix, (np.array(rows), np.array(cols)), values)
+            matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            return (matrix / norms).tolist()
+        vectors = []
+        for text in texts:
+            vector = [0.0] * dim
+            for token in tokenize_code(text):
+                col, sign = _hash_token(token, dim)
+                vector[col] += sign
+            vector = [math.copysign(math.log1p(abs(v)), v) for v in vector]
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
 
     def store_chunks(self, file_path: str, lang: str, chunks: list[str]):
-        """Сохраняет чанки кода в ChromaDB или локальный fallback."""
+        """Сохраняет чанки кода в ChromaDB (пакетным upsert) или локальный fallback.
+
+        Повторное сохранение того же содержимого файла ничего не делает. id чанка —
+        хэш его текста, поэтому одинаковые чанки разных файлов (вендоринг, копии)
+        хранятся один раз; чанк удаляется, когда на него не ссылается ни один файл.
+        """
+        with metrics.span("memory_store"):
+            self._store_chunks(file_path, lang, chunks)
+
+    def _store_chunks(self, file_path: str, lang: str, chunks: list[str]):
+        """Реализация store_chunks (без замера времени)."""
+        self._ensure_storage()
+        content_hash = hashlib.sha1("\0".join(chunks).encode("utf-8")).hexdigest()
+        if self._file_hashes.get(file_path) == content_hash:
+            return
+        unique = {}
+        for chunk in chunks:
+            chunk_hash = hashlib.sha1(chunk.encode("utf-8")).hexdigest()[:16]
+            unique.setdefault(f"chunk:{chunk_hash}", chunk)
+        old_ids = set(self._file_chunk_ids.get(file_path, []))
+        self._file_hashes[file_path] = content_hash
+        self._file_chunk_ids[file_path] = list(unique)
+        stale = []
+        for doc_id in old_ids - set(unique):
+            owners = self._chunk_owners.get(doc_id, set())
+            owners.discard(file_path)
+            if not owners:
+                self._chunk_owners.pop(doc_id, None)
+                stale.append(doc_id)
+        new = {}
+        for doc_id, chunk in unique.items():
+            owners = self._chunk_owners.setdefault(doc_id, set())
+            if not owners:
+                new[doc_id] = chunk
+            owners.add(file_path)
+        ids, chunks = list(new), list(new.values())
+        metrics.incr("memory_chunks_stored", len(chunks))
         if self.collection is None:
-            for idx, chunk in enumerate(chunks):
-                self.fallback_chunks.append(
-                    {"id": f"{file_path}:{idx}", "lang": lang, "text": chunk}
-                )
+            for doc_id in stale:
+                self.fallback_index.remove(doc_id)
+            for doc_id, chunk in zip(ids, chunks):
+                # Индекс, загруженный с диска, уже может содержать этот чанк
+                if self.fallback_index.get_text(doc_id) is None:
+                    self.fallback_index.add(doc_id, chunk)
             return
-        for idx, chunk in enumerate(chunks):
-            doc_id = f"{file_path}:{idx}"
-            self.collection.add(
-                documents=[chunk],
-                embeddings=[self._fake_embed(chunk)],
-                metadatas=[{"path": file_path, "lang": lang, "chunk": idx}],
-                ids=[doc_id],
+        if stale:
+            self.collection.delete(ids=stale)
+        if not chunks:
+            return
+        embeddings = self._embed_batch(chunks)
+        for start in range(0, len(chunks), self.upsert_batch_size):
+            end = start + self.upsert_batch_size
+            self.collection.upsert(
+                documents=chunks[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=[{"path": file_path, "lang": lang} for _ in ids[start:end]],
+                ids=ids[start:end],
             )
 
     def query(self, query_text: str, top_k: int = 3) -> list[str]:
         """Возвращает наиболее релевантные чанки по текстовому запросу."""
+        with metrics.span("memory_query"):
+            return self._query(query_text, top_k)
+
+    def _query(self, query_text: str, top_k: int) -> list[str]:
+        """Реализация query (без замера времени)."""
+        self._ensure_storage()
         if self.collection is not None:
             try:
-                embedding = self._fake_embed(query_text)
+                embedding = self._embed_batch([query_text])[0]
                 result = self.collection.query(
                     query_embeddings=[embedding],
                     n_results=top_k,
@@ -63,11 +206,8 @@ class CodeMemory:
                     return docs[0]
             except Exception:
                 return []
-        # Fallback: простой поиск по подстроке
-        matches = []
-        for item in self.fallback_chunks:
-            if query_text in item["text"]:
-                matches.append(item["text"])
-                if len(matches) >= top_k:
-                    break
-        return matches
+        # Fallback: ранжирование BM25 по инвертированному индексу
+        return [
+            self.fallback_index.get_text(doc_id)
+            for doc_id, _ in self.fallback_index.search(query_text, top_k=top_k)
+        ]
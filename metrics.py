@@ -0,0 +1,219 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROMETHEUS_PREFIX = "ai_code_analyzer_"
+# Сколько последних значений хранить на метрику для перцентилей
+MAX_SAMPLES = 10000
+_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Metrics:
+    """Счетчики и распределения (длительности, размеры) одного запуска.
+
+    Метрика определяется именем и метками (например, provider="groq");
+    длительности пишутся через span(), экспорт — JSON и текстовый формат Prometheus.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters: dict[tuple, float] = {}
+        self.summaries: dict[tuple, dict] = {}
+        self.extra: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """Увеличивает счетчик."""
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Добавляет значение в распределение (сумма, количество, максимум, перцентили)."""
+        key = _key(name, labels)
+        with self._lock:
+            summary = self.summaries.get(key)
+            if summary is None:
+                summary = {"count": 0, "sum": 0.0, "max": value, "samples": []}
+                self.summaries[key] = summary
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+            samples = summary["samples"]
+            if len(samples) >= MAX_SAMPLES:
+                # Кольцевой буфер: перцентили считаются по последним значениям
+                samples[summary["count"] % MAX_SAMPLES] = value
+            else:
+                samples.append(value)
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Замеряет длительность блока (в том числе с await внутри) в {name}_seconds.
+
+        Исключение внутри блока учитывается в счетчике {name}_errors и пробрасывается.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.incr(f"{name}_errors", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+
+    def to_dict(self) -> dict:
+        """Снимок метрик для JSON: счетчики и распределения с перцентилями."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            summaries = []
+            for (name, labels), summary in sorted(self.summaries.items()):
+                ordered = sorted(summary["samples"])
+                entry = {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": summary["count"],
+                    "sum": round(summary["sum"], 6),
+                    "max": round(summary["max"], 6),
+                }
+                for quantile in _QUANTILES:
+                    entry[f"p{int(quantile * 100)}"] = round(_quantile(ordered, quantile), 6)
+                summaries.append(entry)
+        return {
+            "started": self.started,
+            "duration_seconds": round(time.time() - self.started, 3),
+            "counters": counters,
+            "summaries": summaries,
+            **self.extra,
+        }
+
+    def to_prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus (counter и summary)."""
+        data = self.to_dict()
+        lines = []
+        typed = set()
+        for counter in data["counters"]:
+            name = _prom_name(counter["name"]) + "_total"
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_prom_labels(counter['labels'])} {counter['value']}")
+        for summary in data["summaries"]:
+            name = _prom_name(summary["name"])
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary")
+                typed.add(name)
+            for quantile in _QUANTILES:
+                labels = {**summary["labels"], "quantile": str(quantile)}
+                value = summary[f"p{int(quantile * 100)}"]
+                lines.append(f"{name}{_prom_labels(labels)} {value}")
+            labels = _prom_labels(summary["labels"])
+            lines.append(f"{name}_sum{labels} {summary['sum']}")
+            lines.append(f"{name}_count{labels} {summary['count']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """Сохраняет метрики в <path>.json и <path>.prom (расширение path отбрасывается)."""
+        base = os.path.splitext(path)[0]
+        directory = os.path.dirname(base)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{base}.json", "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=2)
+        with open(f"{base}.prom", "w", encoding="utf-8") as file:
+            file.write(self.to_prometheus())
+        print(f"[metrics] Метрики сохранены: {base}.json, {base}.prom")
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Возвращает метрики текущего процесса."""
+    return _metrics
+
+
+def reset():
+    """Начинает сбор метрик заново (например, между прогонами бенчмарка)."""
+    global _metrics
+    _metrics = Metrics()
+
+
+def incr(name: str, value: float = 1, **labels):
+    _metrics.incr(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    _metrics.observe(name, value, **labels)
+
+
+def span(name: str, **labels):
+    return _metrics.span(name, **labels)
+
+
+@contextmanager
+def profiled(profile_path: str | None = None, tracemalloc_top: int = 0):
+    """Хуки профилирования вокруг блока: cProfile и/или tracemalloc.
+
+    profile_path — файл для статистики cProfile (смотреть через pstats/snakeviz),
+    топ функций по cumulative печатается в консоль; tracemalloc_top — сколько
+    мест с наибольшими выделениями памяти сохранить в метриках (0 — выключено).
+    """
+    profiler = cProfile.Profile() if profile_path else None
+    if tracemalloc_top:
+        tracemalloc.start(10)
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(20)
+            print(f"[metrics] Профиль cProfile сохранен: {profile_path}")
+            print(out.getvalue())
+        if tracemalloc_top:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = snapshot.statistics("lineno")[:tracemalloc_top]
+            _metrics.extra["tracemalloc_peak_bytes"] = peak
+            _metrics.extra["tracemalloc_top"] = [
+                {"location": str(stat.traceback), "size": stat.size, "count": stat.count}
+                for stat in top
+            ]
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _quantile(ordered: list[float], quantile: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+def _prom_name(name: str) -> str:
+    return PROMETHEUS_PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _prom_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
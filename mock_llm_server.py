@@ -0,0 +1,188 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_FINDING = "Найдена ошибка в строке {line}: возможное деление на ноль в `value`."
+_CLEAN = "Проблем не найдено."
+
+
+class MockLLMServer:
+    """Локальный OpenAI-совместимый chat/completions для бенчмарков без сети.
+
+    Отвечает с заданной задержкой и разбросом, с долей ответов 500 и 429
+    (с Retry-After), поддерживает stream=true (SSE) и keep-alive; считает запросы.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.2,
+        jitter: float = 0.05,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 1.0,
+        finding_rate: float = 0.2,
+        seed: int = 0,
+    ):
+        """latency/jitter/retry_after — в секундах; *_rate — доли запросов от 0 до 1.
+
+        finding_rate — доля ответов с найденной проблемой (запускают deep_dive).
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.finding_rate = finding_rate
+        self.requests = 0
+        self.statuses = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> str:
+        """Запускает сервер в фоновом потоке и возвращает адрес chat/completions."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def serve_forever(self):
+        """Обслуживает запросы в текущем потоке до остановки."""
+        self._server.serve_forever()
+
+    def stop(self):
+        """Останавливает сервер и закрывает сокет."""
+        if self._thread is not None:
+            self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict:
+        """Число запросов и распределение HTTP-статусов."""
+        with self._lock:
+            return {"requests": self.requests, "statuses": dict(self.statuses)}
+
+    def _plan_response(self) -> tuple[int, float, bool]:
+        """Выбирает статус, задержку и наличие находки для очередного запроса."""
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            if roll < self.error_rate:
+                status = 500
+            elif roll < self.error_rate + self.throttle_rate:
+                status = 429
+            else:
+                status = 200
+            self.statuses[status] += 1
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter))
+            finding = self._random.random() < self.finding_rate
+        return status, delay, finding
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            payload = {}
+        status, delay, finding = mock._plan_response()
+        time.sleep(delay)
+        if status != 200:
+            body = json.dumps({"error": {"message": f"mock status {status}"}}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 429:
+                self.send_header("Retry-After", str(mock.retry_after))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        text = _FINDING.format(line=1 + length % 40) if finding else _CLEAN
+        if payload.get("stream"):
+            self._send_stream(payload.get("model", "mock"), text)
+            return
+        body = json.dumps(
+            {
+                "model": payload.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": length // 3, "completion_tokens": len(text) // 3},
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, model: str, text: str):
+        """Отдает ответ как Server-Sent Events в chunked-теле, по нескольку слов."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = text.split(" ")
+        for idx in range(0, len(words), 3):
+            piece = " ".join(words[idx : idx + 3]) + (" " if idx + 3 < len(words) else "")
+            event = {"model": model, "choices": [{"index": 0, "delta": {"content": piece}}]}
+            self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def main():
+    """Запускает mock-сервер отдельно, например для ручной проверки main.py."""
+    parser = argparse.ArgumentParser(description="Mock OpenAI-совместимого LLM API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="Задержка ответа, с")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Разброс задержки, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--finding-rate", type=float, default=0.2, help="Доля ответов с находкой")
+    args = parser.parse_args()
+    server = MockLLMServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        finding_rate=args.finding_rate,
+    )
+    print(f"[mock] Слушаем {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"[mock] {server.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,13 @@ except ImportError:
 
 import openai
 from analysis_api_base import AnalysisAPIBase
+from request_scheduler import ProviderError
 
 
 class ModelAPI(AnalysisAPIBase):
-    def __init__(self, model_name: str = "gpt-4"):
+    provider_name = "openai"
+
+    def __init__(self, model_name: str = "gpt-4", **kwargs):
         """Инициализирует API модели, загружает ключ и память."""
         if load_dotenv is not None:
             load_dotenv()
@@ -20,7 +23,7 @@ class ModelAPI(AnalysisAPIBase):
             raise RuntimeError(
                 "Не задан API-ключ для OpenAI. Установите переменную окружения OPENAI_API_KEY."
             )
-        super().__init__(model_name)
+        super().__init__(model_name, **kwargs)
 
     async def call_model(self, messages: list[dict]) -> str:
         """Отправляет сообщения в модель и возвращает текст ответа."""
@@ -30,9 +33,18 @@ class ModelAPI(AnalysisAPIBase):
                 **{"model": self.model_name, "messages": messages, "temperature": 0},
             )
         except Exception as e:
-            return f"ERROR: Ошибка запроса к модели - {e}"
+            # RateLimitError, Timeout, APIConnectionError, ServiceUnavailableError и т.п.
+            name = type(e).__name__
+            status = getattr(e, "http_status", None)
+            retryable = (status is not None and (status == 429 or status >= 500)) or any(
+                marker in name for marker in ("RateLimit", "Timeout", "Connection", "Unavailable")
+            )
+            raise ProviderError(
+                f"Ошибка запроса к модели - {e}", status=status, retryable=retryable
+            ) from e
         try:
             content = response["choices"][0]["message"]["content"].strip()
         except Exception as e:
             return f"ERROR: Некорректный ответ модели - {e}"
+        self._record_usage(response.get("usage"))
         return content
@@ -0,0 +1,124 @@
+import json
+
+from analysis_api_base import AnalysisAPIBase
+from http_transport import get_shared_transport
+from request_scheduler import ProviderError, parse_retry_after
+
+
+class OpenAICompatibleAPI(AnalysisAPIBase):
+    """Общая часть провайдеров с OpenAI-совместимым chat/completions (Groq, GigaChat)."""
+
+    provider_label = "OpenAI-compatible API"
+
+    def __init__(
+        self,
+        model_name: str,
+        base_url: str,
+        api_key: str,
+        transport=None,
+        stream: bool = False,
+        close_transport: bool = True,
+        **kwargs,
+    ):
+        """Запоминает адрес и ключ API; запросы идут через общий пул HTTP-соединений.
+
+        stream=True — получать ответ потоком (SSE) вместо ожидания полного тела;
+        close_transport=False — aclose не закрывает соединения пула, их закрывает
+        владелец транспорта (например, процесс пакетного режима между заданиями).
+        """
+        self.base_url = base_url
+        self.api_key = api_key
+        self.transport = transport or get_shared_transport()
+        self.stream = stream
+        self.close_transport = close_transport
+        super().__init__(model_name, **kwargs)
+
+    def _headers(self) -> dict[str, str]:
+        """Возвращает заголовки авторизации запроса."""
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def _status_error(self, status: int, reason: str, headers: dict, text: str) -> ProviderError:
+        """Строит ProviderError для HTTP-ответа с кодом, отличным от 200."""
+        return ProviderError(
+            f"Ошибка запроса к {self.provider_label} - HTTP {status} {reason}: {text[:200]}",
+            status=status,
+            retry_after=parse_retry_after(headers.get("retry-after")),
+            retryable=status == 429 or status >= 500,
+        )
+
+    async def call_model(self, messages: list[dict]) -> str:
+        """Отправляет сообщения в chat/completions и возвращает текст ответа.
+
+        429, 5xx и сетевые сбои бросают повторяемый ProviderError.
+        """
+        if self.stream:
+            return await self._call_model_stream(messages)
+        payload = {"model": self.model_name, "messages": messages, "temperature": 0}
+        try:
+            response = await self.transport.post_json(self.base_url, payload, self._headers())
+        except Exception as e:
+            raise ProviderError(
+                f"Ошибка запроса к {self.provider_label} - {e!r}", retryable=True
+            ) from e
+        if response.status != 200:
+            raise self._status_error(
+                response.status, response.reason, response.headers, response.text()
+            )
+        try:
+            data = response.json()
+            content = data["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            return f"ERROR: Некорректный ответ {self.provider_label} - {e}"
+        self._record_usage(data.get("usage"))
+        return content
+
+    async def _call_model_stream(self, messages: list[dict]) -> str:
+        """Получает ответ потоком Server-Sent Events и собирает текст из delta."""
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": 0,
+            "stream": True,
+        }
+        try:
+            stream = await self.transport.stream_post_json(
+                self.base_url, payload, self._headers()
+            )
+        except Exception as e:
+            raise ProviderError(
+                f"Ошибка запроса к {self.provider_label} - {e!r}", retryable=True
+            ) from e
+        async with stream:
+            if stream.status != 200:
+                text = (await stream.read()).decode("utf-8", errors="replace")
+                raise self._status_error(stream.status, stream.reason, stream.headers, text)
+            parts = []
+            try:
+                async for line in stream.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        continue
+                    event = json.loads(data)
+                    if "error" in event:
+                        return f"ERROR: Ошибка {self.provider_label} - {event['error']}"
+                    # usage приходит в последнем событии, если провайдер его отдает
+                    self._record_usage(event.get("usage"))
+                    if not event.get("choices"):
+                        continue
+                    delta = event["choices"][0].get("delta") or {}
+                    if delta.get("content"):
+                        parts.append(delta["content"])
+            except (KeyError, IndexError, ValueError) as e:
+                return f"ERROR: Некорректный ответ {self.provider_label} - {e}"
+            except Exception as e:
+                raise ProviderError(
+                    f"Обрыв потока ответа {self.provider_label} - {e!r}", retryable=True
+                ) from e
+        return "".join(parts).strip()
+
+    async def aclose(self):
+        """Закрывает простаивающие HTTP-соединения (если транспорт не оставлен владельцу)."""
+        if self.close_transport:
+            await self.transport.close()
@@ -0,0 +1,31 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Меньше элементов не стоит запуска процессов: старт пула дороже самой работы
+MIN_ITEMS_FOR_POOL = 32
+
+
+def parallel_map(
+    fn,
+    items: list,
+    workers: int | None = None,
+    min_items: int = MIN_ITEMS_FOR_POOL,
+    label: str = "pool",
+) -> list:
+    """Применяет fn к items в пуле процессов, результат — в порядке items.
+
+    workers — число процессов (по умолчанию по числу CPU). При одном процессе,
+    меньше чем min_items элементах или недоступном пуле (например, без
+    поддержки процессов в окружении) fn выполняется в текущем процессе;
+    label — префикс сообщения об этом в логе. fn должна быть функцией уровня модуля.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(items) < min_items:
+        return [fn(item) for item in items]
+    chunksize = max(1, len(items) // (workers * 4))
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(fn, items, chunksize=chunksize))
+    except (OSError, RuntimeError) as e:
+        print(f"[{label}] Пул процессов недоступен ({e}), расчет в одном процессе")
+        return [fn(item) for item in items]
@@ -0,0 +1,270 @@
+import ast
+import re
+
+import chunker
+import file_walker
+from parallel import parallel_map
+
+# Python: опасные встроенные функции и вызовы модулей (модуль, функция)
+_PY_RISKY_BUILTINS = {
+    "eval": (5, "eval/exec"),
+    "exec": (5, "eval/exec"),
+    "compile": (2, "компиляция кода"),
+    "__import__": (2, "динамический импорт"),
+}
+_PY_RISKY_ATTRS = {
+    ("os", "system"): (5, "запуск команд оболочки"),
+    ("os", "popen"): (5, "запуск команд оболочки"),
+    ("tempfile", "mktemp"): (3, "небезопасный временный файл"),
+    ("hashlib", "md5"): (1, "слабый хэш"),
+    ("hashlib", "sha1"): (1, "слабый хэш"),
+}
+_PY_DESERIALIZERS = {"pickle", "cPickle", "marshal", "shelve", "dill", "yaml"}
+_PY_SQL_METHODS = {"execute", "executemany", "executescript", "raw", "text"}
+_PY_BRANCHES = (
+    ast.If,
+    ast.For,
+    ast.AsyncFor,
+    ast.While,
+    ast.Try,
+    ast.With,
+    ast.AsyncWith,
+    ast.BoolOp,
+    ast.IfExp,
+    ast.comprehension,
+)
+
+# C++/Java: токены риска (шаблон, вес, причина)
+_CPP_RISKS = [
+    (r"\b(?:gets|strcpy|strcat|sprintf|vsprintf)\s*\(", 5, "небезопасные строковые функции"),
+    (r"\b(?:scanf|sscanf|fscanf)\s*\(", 3, "scanf без ограничений"),
+    (r"\b(?:memcpy|memmove|memset|alloca)\s*\(", 2, "ручная работа с памятью"),
+    (r"\b(?:malloc|calloc|realloc|free)\s*\(", 2, "ручное управление памятью"),
+    (r"\bdelete\b|\bnew\s+\w", 2, "сырые new/delete"),
+    (r"\b(?:system|popen|exec[lv]p?e?)\s*\(", 5, "запуск команд оболочки"),
+    (r"\b(?:reinterpret_cast|const_cast)\b", 2, "небезопасные приведения"),
+    (r"\bchar\s+\w+\s*\[\s*\d+\s*\]", 2, "буфер фиксированного размера"),
+    (r"\bgoto\b", 1, "goto"),
+    (r"\b(?:pthread_create|std::thread|std::mutex)\b", 2, "многопоточность"),
+]
+_JAVA_RISKS = [
+    (r"\bRuntime\s*\.\s*getRuntime\s*\(\s*\)\s*\.\s*exec\b", 5, "запуск команд"),
+    (r"\bnew\s+ProcessBuilder\b", 4, "запуск команд"),
+    (r"\bObjectInputStream\b|\.readObject\s*\(", 5, "десериализация"),
+    (r"\bClass\s*\.\s*forName\s*\(|\.getDeclaredMethod\s*\(", 2, "рефлексия"),
+    (r"\bcatch\s*\(\s*(?:final\s+)?(?:Exception|Throwable)\b", 2, "широкий catch"),
+    (r"\bcatch\s*\([^)]*\)\s*\{\s*\}", 3, "пустой catch"),
+    (r'MessageDigest\s*\.\s*getInstance\s*\(\s*"(?:MD5|SHA-?1)"', 2, "слабый хэш"),
+    (r"\bnew\s+Random\s*\(", 1, "небезопасный Random"),
+    (r"\bsynchronized\b|\bnew\s+Thread\b|\bExecutorService\b", 2, "многопоточность"),
+    (r"\bcreateStatement\s*\(", 2, "Statement вместо PreparedStatement"),
+]
+_BRACE_BRANCH_RE = re.compile(r"\b(?:if|for|while|switch|case|catch)\b")
+# Тело функции/метода: закрывающая скобка параметров и открывающая фигурная
+_BRACE_BODY_RE = re.compile(r"\)\s*(?:const\s*)?(?:noexcept\s*)?(?:throws\s+[\w.,\s]+)?\{")
+
+# Строка с SQL-командой, склеиваемая с переменной через + (C++/Java)
+_SQL_LITERAL = r'"[^"\n]*\b(?:SELECT|INSERT|UPDATE|DELETE|WHERE|FROM|VALUES)\b[^"\n]*"'
+_SQL_CONCAT_RE = re.compile(
+    rf"{_SQL_LITERAL}\s*\+|\+\s*{_SQL_LITERAL}", re.IGNORECASE
+)
+
+# SQL: динамический SQL и массовые изменения без условий
+_SQL_DYNAMIC_RE = re.compile(
+    r"\b(?:EXEC(?:UTE)?(?:\s+IMMEDIATE)?|sp_executesql|PREPARE)\b[^;]*(?:\|\||\+|CONCAT\s*\()",
+    re.IGNORECASE,
+)
+_SQL_STATEMENT_RE = re.compile(r"[^;]+", re.DOTALL)
+_SQL_NO_WHERE_RE = re.compile(r"^\s*(?:DELETE\s+FROM|UPDATE)\b(?![\s\S]*\bWHERE\b)", re.IGNORECASE)
+_SQL_RISKS = [
+    (r"\bGRANT\s+ALL\b", 3, "GRANT ALL"),
+    (r"\bDROP\s+(?:TABLE|DATABASE|SCHEMA)\b", 2, "DROP"),
+    (r"\bTRUNCATE\b", 2, "TRUNCATE"),
+    (r"\bSELECT\s+\*", 1, "SELECT *"),
+    (r"\bCURSOR\b", 1, "курсоры"),
+]
+_SQL_LOGIC_RE = re.compile(
+    r"\b(?:BEGIN|IF\b(?!\s+(?:NOT\s+)?EXISTS)|LOOP|WHILE|CASE|JOIN"
+    r"|FUNCTION|PROCEDURE|TRIGGER|UPDATE|DELETE|MERGE)\b",
+    re.IGNORECASE,
+)
+_SQL_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+
+def score_file(file_path: str) -> tuple[str, int, list[str]]:
+    """Оценивает риск файла без обращения к модели.
+
+    Возвращает (путь, оценка, причины). Оценка 0 — файл не стоит анализа:
+    пустой, сгенерированный или содержащий только объявления без логики.
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+            code = file.read()
+    except OSError as e:
+        # Ошибку чтения покажет основной анализ
+        return file_path, 1, [f"не удалось прочитать ({e})"]
+    if not code.strip():
+        return file_path, 0, ["пустой файл"]
+    if file_walker.is_generated(code):
+        return file_path, 0, ["сгенерированный файл"]
+    lang = chunker.detect_language(file_path)
+    if lang == "Python":
+        risk, complexity, reasons = _score_python(code)
+    elif lang == "C++":
+        risk, complexity, reasons = _score_braces(code, _CPP_RISKS)
+    elif lang == "Java":
+        risk, complexity, reasons = _score_braces(code, _JAVA_RISKS)
+    elif lang == "SQL":
+        risk, complexity, reasons = _score_sql(code)
+    else:
+        return file_path, 1, ["язык без статических правил"]
+    if risk == 0 and complexity == 0:
+        return file_path, 0, ["только объявления, без логики"]
+    # Сложность повышает приоритет, но не перевешивает явные признаки риска
+    score = risk + min(10, complexity)
+    return file_path, score, reasons or [f"сложность {complexity}"]
+
+
+def triage_files(files: list[str], workers: int | None = None) -> list[tuple[str, int, list[str]]]:
+    """Оценивает файлы параллельно в пуле процессов, результат — в порядке files.
+
+    workers — число процессов (по умолчанию по числу CPU); для небольшого
+    числа файлов или при недоступном пуле оценка выполняется в текущем процессе.
+    """
+    return parallel_map(score_file, files, workers, label="pretriage")
+
+
+def _score_python(code: str) -> tuple[int, int, list[str]]:
+    """Риск и сложность Python-кода по ast: опасные вызовы, SQL из строк, except."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return 5, 0, ["синтаксическая ошибка"]
+    risk = 0
+    complexity = 0
+    reasons = []
+
+    def flag(weight: int, reason: str):
+        nonlocal risk
+        risk += weight
+        if reason not in reasons:
+            reasons.append(reason)
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            complexity += 1
+            defaults = node.args.defaults + [d for d in node.args.kw_defaults if d]
+            if any(isinstance(d, (ast.List, ast.Dict, ast.Set)) for d in defaults):
+                flag(2, "изменяемые значения по умолчанию")
+        elif isinstance(node, _PY_BRANCHES):
+            complexity += 1
+        elif isinstance(node, ast.ExceptHandler):
+            complexity += 1
+            if node.type is None or all(isinstance(stmt, ast.Pass) for stmt in node.body):
+                flag(2, "широкий или пустой except")
+        elif isinstance(node, ast.Global):
+            flag(1, "global")
+        elif isinstance(node, ast.Call):
+            _check_python_call(node, flag)
+    return risk, complexity, reasons
+
+
+def _check_python_call(node: ast.Call, flag):
+    """Проверяет один вызов: eval/exec, shell=True, десериализацию, SQL из строк."""
+    func = node.func
+    if isinstance(func, ast.Name):
+        name, owner = func.id, None
+    elif isinstance(func, ast.Attribute):
+        name = func.attr
+        owner = func.value.id if isinstance(func.value, ast.Name) else None
+    else:
+        return
+    if isinstance(func, ast.Name):
+        weight, reason = _PY_RISKY_BUILTINS.get(name, (0, ""))
+    else:
+        weight, reason = _PY_RISKY_ATTRS.get((owner, name), (0, ""))
+    if weight:
+        flag(weight, reason)
+    if owner in _PY_DESERIALIZERS and name in ("load", "loads", "open", "unsafe_load"):
+        if not (owner == "yaml" and _has_safe_loader(node)):
+            flag(4, "небезопасная десериализация")
+    for keyword in node.keywords:
+        value = keyword.value
+        if keyword.arg == "shell" and isinstance(value, ast.Constant) and value.value:
+            flag(5, "запуск команд оболочки")
+        elif keyword.arg == "verify" and isinstance(value, ast.Constant) and value.value is False:
+            flag(3, "отключена проверка TLS")
+    if name in _PY_SQL_METHODS and node.args and _is_built_string(node.args[0]):
+        flag(5, "SQL-запрос собирается из строк")
+
+
+def _has_safe_loader(node: ast.Call) -> bool:
+    """yaml.load с Loader=SafeLoader/CSafeLoader считается безопасным."""
+    for keyword in node.keywords:
+        if keyword.arg == "Loader":
+            loader = keyword.value
+            name = loader.attr if isinstance(loader, ast.Attribute) else getattr(loader, "id", "")
+            return "Safe" in name
+    return False
+
+
+def _is_built_string(node: ast.AST) -> bool:
+    """f-строка, конкатенация, % или .format — запрос собран из частей."""
+    if isinstance(node, ast.JoinedStr):
+        return any(isinstance(value, ast.FormattedValue) for value in node.values)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Mod)):
+        return True
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "format"
+    )
+
+
+def _score_braces(code: str, risks: list[tuple[str, int, str]]) -> tuple[int, int, list[str]]:
+    """Риск и сложность C++/Java по токенам; комментарии и строки не учитываются."""
+    risk = 0
+    reasons = []
+    if _SQL_CONCAT_RE.search(code):
+        risk += 5
+        reasons.append("SQL-запрос собирается из строк")
+    stripped = chunker.BRACE_STRIP_RE.sub(_blank_literal, code)
+    for pattern, weight, reason in risks:
+        hits = len(re.findall(pattern, stripped))
+        if hits:
+            # Повторы увеличивают риск, но не линейно: одна находка уже повод для анализа
+            risk += weight + min(hits - 1, 3)
+            if reason not in reasons:
+                reasons.append(reason)
+    complexity = len(_BRACE_BRANCH_RE.findall(stripped)) + len(_BRACE_BODY_RE.findall(stripped))
+    return risk, complexity, reasons
+
+
+def _blank_literal(match: re.Match) -> str:
+    """Заменяет комментарий или литерал пустой строкой той же природы."""
+    token = match.group(0)
+    if token.startswith('"'):
+        return '""'
+    if token.startswith("'"):
+        return "''"
+    return " "
+
+
+def _score_sql(code: str) -> tuple[int, int, list[str]]:
+    """Риск SQL: динамический SQL со склейкой строк, DELETE/UPDATE без WHERE и т.п."""
+    code = _SQL_COMMENT_RE.sub(" ", code)
+    risk = 0
+    reasons = []
+    if _SQL_DYNAMIC_RE.search(code):
+        risk += 5
+        reasons.append("динамический SQL со склейкой строк")
+    for statement in _SQL_STATEMENT_RE.findall(code):
+        if _SQL_NO_WHERE_RE.search(statement):
+            risk += 3
+            if "DELETE/UPDATE без WHERE" not in reasons:
+                reasons.append("DELETE/UPDATE без WHERE")
+    for pattern, weight, reason in _SQL_RISKS:
+        if re.search(pattern, code, re.IGNORECASE):
+            risk += weight
+            reasons.append(reason)
+    return risk, len(_SQL_LOGIC_RE.findall(code)), reasons
@@ -1,24 +1,122 @@
+import hashlib
 import os
+import re
 import shutil
 import subprocess
 import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import metrics
 
 
 class ProjectLoader:
-    def __init__(self):
-        """Готовит загрузчик для клонирования проекта во временную папку."""
+    def __init__(
+        self,
+        use_cache: bool = True,
+        depth: int | None = None,
+        blobless: bool = False,
+        sparse_paths: list[str] | None = None,
+    ):
+        """Готовит загрузчик для клонирования проекта во временную папку.
+
+        use_cache — держать bare-зеркала репозиториев в sandbox/mirrors и обновлять их fetch;
+        depth — глубина истории (shallow clone);
+        blobless — частичный клон без содержимого файлов истории (--filter=blob:none),
+        выполняется напрямую из удаленного репозитория, минуя кэш зеркал;
+        sparse_paths — выгружать в рабочую копию только указанные каталоги.
+        """
         self.project_dir = None
         self.sandbox_dir = os.path.join(os.getcwd(), "sandbox")
+        self.mirror_dir = os.path.join(self.sandbox_dir, "mirrors")
+        self.use_cache = use_cache
+        self.depth = depth
+        self.blobless = blobless
+        self.sparse_paths = list(sparse_paths or [])
 
     def clone_project(self, git_url: str) -> str:
         """Клонирует репозиторий и возвращает путь к временной директории."""
+        with metrics.span("clone"):
+            return self._clone_project(git_url)
+
+    def _clone_project(self, git_url: str) -> str:
         os.makedirs(self.sandbox_dir, exist_ok=True)
         print(f"[loader] Клонирование репозитория: {git_url}")
         self.project_dir = tempfile.mkdtemp(prefix="project_", dir=self.sandbox_dir)
         print(f"[loader] Папка проекта: {self.project_dir}")
-        subprocess.run(["git", "clone", git_url, self.project_dir], check=True)
+        if self.use_cache and not self.blobless:
+            mirror_path = self._update_mirror(git_url)
+            # --shared: рабочая копия ссылается на объекты зеркала, без копирования
+            command = ["git", "clone", "--shared", "--no-checkout", mirror_path, self.project_dir]
+        else:
+            command = ["git", "clone", "--no-checkout"]
+            if self.depth:
+                command += ["--depth", str(self.depth)]
+            if self.blobless:
+                command.append("--filter=blob:none")
+            command += [git_url, self.project_dir]
+        subprocess.run(command, check=True)
+        self._checkout()
         return self.project_dir
 
+    def _mirror_path(self, git_url: str) -> str:
+        """Возвращает путь к bare-зеркалу для URL репозитория.
+
+        Shallow-зеркала хранятся отдельно, чтобы fetch с --depth не обрезал полную историю.
+        """
+        digest = hashlib.sha1(git_url.encode("utf-8")).hexdigest()[:12]
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", git_url.rstrip("/").rsplit("/", 1)[-1])
+        if name.endswith(".git"):
+            name = name[:-4]
+        suffix = f"_depth{self.depth}" if self.depth else ""
+        return os.path.join(self.mirror_dir, f"{name}_{digest}{suffix}.git")
+
+    def _update_mirror(self, git_url: str) -> str:
+        """Создает bare-зеркало репозитория или обновляет существующее через fetch."""
+        os.makedirs(self.mirror_dir, exist_ok=True)
+        mirror_path = self._mirror_path(git_url)
+        # Пакетный режим клонирует из нескольких процессов: одно зеркало обновляет один
+        with _file_lock(f"{mirror_path}.lock"):
+            return self._fetch_mirror(git_url, mirror_path)
+
+    def _fetch_mirror(self, git_url: str, mirror_path: str) -> str:
+        depth_args = ["--depth", str(self.depth)] if self.depth else []
+        if os.path.isdir(mirror_path):
+            print(f"[loader] Обновление зеркала: {mirror_path}")
+            try:
+                subprocess.run(
+                    ["git", "-C", mirror_path, "fetch", "--prune", *depth_args, "origin"],
+                    check=True,
+                )
+                return mirror_path
+            except subprocess.CalledProcessError:
+                print("[loader] Не удалось обновить зеркало, создаем заново")
+                shutil.rmtree(mirror_path, ignore_errors=True)
+        print(f"[loader] Создание зеркала: {mirror_path}")
+        tmp_path = tempfile.mkdtemp(prefix="mirror_", dir=self.mirror_dir)
+        try:
+            subprocess.run(
+                ["git", "clone", "--mirror", *depth_args, git_url, tmp_path], check=True
+            )
+            os.replace(tmp_path, mirror_path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return mirror_path
+
+    def _checkout(self):
+        """Выгружает рабочую копию, при необходимости только sparse-каталоги."""
+        if self.sparse_paths:
+            subprocess.run(
+                ["git", "-C", self.project_dir, "sparse-checkout", "set", *self.sparse_paths],
+                check=True,
+            )
+        subprocess.run(["git", "-C", self.project_dir, "checkout", "--quiet"], check=True)
+
     def use_local_project(self, local_path: str) -> str:
         """Использует локальный путь проекта без клонирования."""
         abs_path = os.path.abspath(local_path)
@@ -33,3 +131,55 @@ class ProjectLoader:
         if self.project_dir and os.path.exists(self.project_dir):
             print(f"[loader] Очистка временной папки: {self.project_dir}")
             shutil.rmtree(self.project_dir)
+
+    def get_head_commit(self, path: str | None = None) -> str | None:
+        """Возвращает хэш HEAD проекта или None, если это не git-репозиторий."""
+        repo_dir = path or self.project_dir
+        try:
+            result = subprocess.run(
+                ["git", "-C", repo_dir, "rev-parse", "HEAD"],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return result.stdout.strip() or None
+
+    def get_changed_files(self, since: str, path: str | None = None) -> set[str] | None:
+        """Возвращает относительные пути файлов, добавленных или измененных после since.
+
+        Учитываются коммиты после since, незакоммиченные правки и новые файлы;
+        пути считаются относительно анализируемой папки.
+        Возвращает None, если сравнение выполнить не удалось.
+        """
+        repo_dir = path or self.project_dir
+        commands = [
+            [
+                "git", "-C", repo_dir, "diff", "--name-only", "--relative",
+                "--diff-filter=ACMR", since,
+            ],
+            ["git", "-C", repo_dir, "ls-files", "--others", "--exclude-standard"],
+        ]
+        changed = set()
+        for command in commands:
+            try:
+                result = subprocess.run(command, check=True, capture_output=True, text=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"[loader] Не удалось получить изменения относительно {since}: {e}")
+                return None
+            changed.update(line.strip() for line in result.stdout.splitlines() if line.strip())
+        return changed
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """Эксклюзивная блокировка файла между процессами (без fcntl — без блокировки)."""
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
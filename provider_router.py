@@ -0,0 +1,286 @@
+import asyncio
+import time
+from collections import deque
+
+import metrics
+from analysis_api_base import AnalysisAPIBase
+from request_scheduler import ProviderError
+
+# Сколько последних запросов каждого провайдера учитывать в статистике
+STATS_WINDOW = 200
+# Минимум ответов, после которого p95 задержки считается надежным для хеджирования
+MIN_SAMPLES = 10
+
+
+class BackendStats:
+    """Живая статистика провайдера: задержки успешных ответов и исходы последних запросов.
+
+    Подряд идущие ошибки (failure_threshold) временно выключают провайдера на
+    cooldown секунд; после паузы он снова получает запросы, и первая же ошибка
+    выключает его повторно.
+    """
+
+    def __init__(self, label: str, window: int = STATS_WINDOW):
+        """Создает пустую статистику провайдера label."""
+        self.label = label
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def quantile(self, quantile: float) -> float | None:
+        """Квантиль задержки успешных ответов (None, пока ответов меньше MIN_SAMPLES)."""
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+    def error_rate(self) -> float:
+        """Доля ошибок среди последних запросов."""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def is_down(self, now: float) -> bool:
+        return now < self.down_until
+
+    def record(self, ok: bool, latency: float, failure_threshold: int, cooldown: float):
+        """Учитывает исход запроса; возвращает True, если провайдер только что выключен."""
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            return False
+        self.errors += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures < failure_threshold:
+            return False
+        now = time.monotonic()
+        was_down = self.is_down(now)
+        self.down_until = now + cooldown
+        return not was_down
+
+    def snapshot(self) -> dict:
+        """Статистика для метрик запуска."""
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "hedges": self.hedges,
+            "wins": self.wins,
+            "error_rate": round(self.error_rate(), 3),
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class ProviderRouter(AnalysisAPIBase):
+    """Маршрутизатор запросов между провайдерами: хеджирование и переключение при сбоях.
+
+    Промпты, кэш и память — как у обычной модели (AnalysisAPIBase); меняется только
+    отправка запроса. Запрос уходит первому здоровому провайдеру в порядке
+    backends; если ответа нет дольше p95 его задержки, дублирующий запрос
+    уходит следующему провайдеру (или тому же, если он один), и побеждает
+    первый ответ. Ошибка провайдера сразу переключает запрос на следующий.
+    Провайдер с серией ошибок выключается на cooldown, с долей ошибок выше
+    max_error_rate или медианой задержки в slow_factor раз хуже лучшей —
+    опускается в конец очереди.
+    """
+
+    provider_name = "router"
+
+    def __init__(
+        self,
+        backends: list[AnalysisAPIBase],
+        hedge: bool = True,
+        hedge_quantile: float = 0.95,
+        hedge_budget: float = 0.1,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        max_error_rate: float = 0.5,
+        slow_factor: float = 3.0,
+        cache=None,
+    ):
+        """Создает маршрутизатор поверх моделей backends (первая — основная).
+
+        hedge_budget — наибольшая доля дублирующих запросов от всех запросов,
+        чтобы хеджирование не удваивало нагрузку на провайдеров при общей деградации.
+        Бюджет промпта — наименьший среди провайдеров: промпт должен подойти любому.
+        """
+        primary = backends[0]
+        super().__init__(
+            model_name=",".join(_label(backend) for backend in backends),
+            prompt_dir=primary.prompt_dir,
+            memory=primary.memory,
+            cache=cache,
+            token_budget=min(backend.token_budget for backend in backends),
+        )
+        self.backends = backends
+        self.stats = [BackendStats(_label(backend)) for backend in backends]
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_budget = hedge_budget
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_error_rate = max_error_rate
+        self.slow_factor = slow_factor
+        self.requests = 0
+        self.hedges = 0
+
+    @property
+    def symbol_index(self):
+        return self._symbol_index
+
+    @symbol_index.setter
+    def symbol_index(self, index):
+        # Промпты строит маршрутизатор, но индекс нужен и провайдерам для прямых вызовов
+        self._symbol_index = index
+        for backend in getattr(self, "backends", []):
+            backend.symbol_index = index
+
+    async def aclose(self):
+        """Закрывает провайдеров и сохраняет их статистику в метриках запуска."""
+        metrics.get_metrics().extra["router"] = {
+            stats.label: stats.snapshot() for stats in self.stats
+        }
+        for stats in self.stats:
+            snapshot = stats.snapshot()
+            print(
+                f"[router] {stats.label}: запросов {snapshot['requests']}, "
+                f"ошибок {snapshot['errors']}, дублей {snapshot['hedges']}, "
+                f"побед {snapshot['wins']}, p95 {snapshot['latency_p95']} с"
+            )
+        for backend in self.backends:
+            await backend.aclose()
+
+    async def _dispatch(self, messages: list[dict]) -> str:
+        """Отправляет запрос провайдерам; возвращает первый успешный ответ."""
+        self.requests += 1
+        order = self._ranked()
+        pending: dict[asyncio.Task, int] = {}
+        hedged = False
+        last_error = None
+        last_result = None
+
+        def launch(idx: int):
+            self.stats[idx].requests += 1
+            task = asyncio.ensure_future(self._attempt(idx, messages))
+            pending[task] = idx
+
+        current = order[0]
+        launch(current)
+        next_idx = 1
+        try:
+            while pending:
+                delay = None if hedged else self._hedge_delay(current)
+                done, _ = await asyncio.wait(
+                    pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Ответа нет дольше p95: дублируем запрос, побеждает первый ответ
+                    hedged = True
+                    target = order[next_idx] if next_idx < len(order) else order[0]
+                    next_idx += 1
+                    self.hedges += 1
+                    self.stats[target].hedges += 1
+                    metrics.incr("router_hedges", provider=self.stats[target].label)
+                    launch(target)
+                    continue
+                for task in done:
+                    idx = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except ProviderError as e:
+                        last_error = e
+                        continue
+                    if result and not result.startswith("ERROR"):
+                        self.stats[idx].wins += 1
+                        metrics.incr("router_wins", provider=self.stats[idx].label)
+                        return result
+                    last_result = result
+                if not pending and next_idx < len(order):
+                    current = order[next_idx]
+                    next_idx += 1
+                    metrics.incr("router_failovers", provider=self.stats[current].label)
+                    print(f"[router] Переключение на {self.stats[current].label}")
+                    launch(current)
+        finally:
+            # Проигравшие дубли больше не нужны
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        if last_result is not None:
+            return last_result
+        raise last_error
+
+    async def _attempt(self, idx: int, messages: list[dict]) -> str:
+        """Запрос к одному провайдеру (с его планировщиком) с учетом исхода в статистике."""
+        stats = self.stats[idx]
+        started = time.perf_counter()
+        try:
+            result = await self.backends[idx]._dispatch(messages)
+        except ProviderError:
+            self._record(idx, False, time.perf_counter() - started)
+            raise
+        except asyncio.CancelledError:
+            # Проигравший дубль: его время — нижняя оценка задержки. Без нее p95
+            # считался бы только по быстрым ответам и дублей становилось бы все больше
+            stats.latencies.append(time.perf_counter() - started)
+            raise
+        ok = bool(result) and not result.startswith("ERROR")
+        latency = time.perf_counter() - started
+        self._record(idx, ok, latency)
+        if ok:
+            metrics.observe("router_latency_seconds", latency, provider=stats.label)
+        return result
+
+    def _record(self, idx: int, ok: bool, latency: float):
+        """Обновляет статистику провайдера и сообщает о его выключении."""
+        stats = self.stats[idx]
+        if not ok:
+            metrics.incr("router_errors", provider=stats.label)
+        if stats.record(ok, latency, self.failure_threshold, self.cooldown):
+            metrics.incr("router_circuit_open", provider=stats.label)
+            print(
+                f"[router] {stats.label}: {stats.consecutive_failures} ошибок подряд, "
+                f"выключен на {self.cooldown:g} с"
+            )
+
+    def _ranked(self) -> list[int]:
+        """Порядок провайдеров для запроса: здоровые, затем деградировавшие, затем выключенные.
+
+        Внутри группы сохраняется порядок из конфигурации. Если выключены все,
+        запрос все равно уходит им — лучше попытка, чем гарантированная ошибка.
+        """
+        now = time.monotonic()
+        medians = [stats.quantile(0.5) for stats in self.stats]
+        known = [median for median in medians if median is not None]
+        best = min(known) if known else None
+
+        def rank(idx: int) -> tuple[int, int]:
+            stats = self.stats[idx]
+            if stats.is_down(now):
+                return 2, idx
+            degraded = (
+                len(stats.outcomes) >= MIN_SAMPLES and stats.error_rate() >= self.max_error_rate
+            ) or (
+                medians[idx] is not None and best and medians[idx] > best * self.slow_factor
+            )
+            return (1 if degraded else 0), idx
+
+        return sorted(range(len(self.backends)), key=rank)
+
+    def _hedge_delay(self, idx: int) -> float | None:
+        """Через сколько секунд дублировать запрос (None — не дублировать)."""
+        if not self.hedge or self.hedges >= self.hedge_budget * self.requests:
+            return None
+        return self.stats[idx].quantile(self.hedge_quantile)
+
+
+def _label(model: AnalysisAPIBase) -> str:
+    return f"{model.provider_name}/{model.model_name}"
@@ -1,4 +1,10 @@
 import os
+import tempfile
+
+import metrics
+
+# Сколько разделов, пришедших раньше очереди, держать в памяти; остальные — во временном файле
+MAX_PENDING_SECTIONS = 64
 
 
 def generate_report(
@@ -12,19 +18,36 @@ def generate_report(
     lines.append("# Отчет анализа кода")
     # Раздел с обнаруженными проблемами по файлам
     if analysis_results:
-        lines.append("\n## Обнаруженные проблемы по файлам:\n")
+        lines.append(FILES_HEADER)
         for file_path, analysis in analysis_results.items():
-            file_name = os.path.basename(file_path)
-            lines.append(f"### Файл: `{file_name}`")
-            # Добавляем пустую строку перед списком проблем для корректного Markdown-форматирования
-            if analysis and not analysis.startswith("\n"):
-                lines.append("")
-            # Если в анализе содержится отметка об ошибке, выделяем курсивом
-            analysis_text = analysis.strip()
-            if analysis_text.upper().startswith("ERROR"):
-                analysis_text = f"*{analysis_text}*"
-            lines.append(analysis_text)
-            lines.append("")  # пустая строка после каждого файла
+            lines.extend(_file_section_lines(file_path, analysis))
+    lines.extend(_closing_lines(summary, reflection))
+    # Объединяем все линии в один текст с переводами строк
+    return "\n".join(lines)
+
+
+FILES_HEADER = "\n## Обнаруженные проблемы по файлам:\n"
+
+
+def _file_section_lines(file_path: str, analysis: str) -> list[str]:
+    """Формирует строки раздела отчета для одного файла."""
+    file_name = os.path.basename(file_path)
+    lines = [f"### Файл: `{file_name}`"]
+    # Добавляем пустую строку перед списком проблем для корректного Markdown-форматирования
+    if analysis and not analysis.startswith("\n"):
+        lines.append("")
+    # Если в анализе содержится отметка об ошибке, выделяем курсивом
+    analysis_text = analysis.strip()
+    if analysis_text.upper().startswith("ERROR"):
+        analysis_text = f"*{analysis_text}*"
+    lines.append(analysis_text)
+    lines.append("")  # пустая строка после каждого файла
+    return lines
+
+
+def _closing_lines(summary: str | None, reflection: str | None) -> list[str]:
+    """Формирует разделы общего вывода и рефлексии."""
+    lines = []
     # Раздел общий вывод/заключение, если есть
     if summary:
         lines.append("## Общий вывод\n")
@@ -32,8 +55,107 @@ def generate_report(
     if reflection:
         lines.append("## Рефлексия\n")
         lines.append(reflection.strip())
-    # Объединяем все линии в один текст с переводами строк
-    return "\n".join(lines)
+    return lines
+
+
+class ReportWriter:
+    """Пишет Markdown-отчет в файл и консоль по мере готовности файлов.
+
+    Разделы выводятся в порядке order: результат, пришедший раньше предыдущих,
+    ждет своей очереди. В памяти ждут не больше max_pending разделов, остальные
+    откладываются во временный файл, поэтому долгий файл в начале очереди
+    не накапливает в памяти весь отчет.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        order: list[str],
+        echo: bool = True,
+        max_pending: int = MAX_PENDING_SECTIONS,
+    ):
+        """Открывает файл отчета и записывает заголовок."""
+        self.file_path = file_path
+        self.echo = echo
+        self.max_pending = max_pending
+        self._order = list(order)
+        self._next = 0
+        # Путь -> текст раздела или (смещение, длина) во временном файле _spool
+        self._pending: dict[str, str | tuple[int, int]] = {}
+        self._in_memory = 0
+        self._spool = None
+        self._has_files = False
+        self._file = None
+        try:
+            self._file = open(file_path, "w", encoding="utf-8")
+        except Exception as e:
+            print(f"Не удалось сохранить отчет в файл {file_path}: {e}")
+        self._write(["# Отчет анализа кода"])
+
+    def add(self, file_path: str, analysis: str):
+        """Принимает результат файла и выводит все разделы, чья очередь подошла."""
+        self._hold(file_path, analysis)
+        while self._next < len(self._order) and self._order[self._next] in self._pending:
+            ready_path = self._order[self._next]
+            self._next += 1
+            self._write_section(ready_path, self._take(ready_path))
+
+    def finish(self, summary: str | None = None, reflection: str | None = None):
+        """Дописывает оставшиеся разделы, вывод и рефлексию, закрывает файл."""
+        for file_path in self._order[self._next :]:
+            if file_path in self._pending:
+                self._write_section(file_path, self._take(file_path))
+        self._next = len(self._order)
+        self._write(_closing_lines(summary, reflection))
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def _hold(self, file_path: str, analysis: str):
+        """Откладывает раздел до его очереди: в память или, сверх max_pending, на диск."""
+        if self._in_memory < self.max_pending:
+            self._pending[file_path] = analysis
+            self._in_memory += 1
+            return
+        if self._spool is None:
+            self._spool = tempfile.TemporaryFile()
+        data = analysis.encode("utf-8")
+        offset = self._spool.seek(0, os.SEEK_END)
+        self._spool.write(data)
+        self._pending[file_path] = (offset, len(data))
+
+    def _take(self, file_path: str) -> str:
+        """Забирает отложенный раздел."""
+        held = self._pending.pop(file_path)
+        if isinstance(held, str):
+            self._in_memory -= 1
+            return held
+        offset, size = held
+        self._spool.seek(offset)
+        return self._spool.read(size).decode("utf-8")
+
+    def _write_section(self, file_path: str, analysis: str):
+        """Выводит раздел файла (перед первым — заголовок списка файлов)."""
+        lines = _file_section_lines(file_path, analysis)
+        if not self._has_files:
+            self._has_files = True
+            lines.insert(0, FILES_HEADER)
+        self._write(lines)
+
+    def _write(self, lines: list[str]):
+        """Дописывает фрагмент в файл (со сбросом буфера) и выводит в консоль."""
+        if not lines:
+            return
+        text = "\n".join(lines) + "\n"
+        with metrics.span("report_write"):
+            if self._file is not None:
+                self._file.write(text)
+                self._file.flush()
+            if self.echo:
+                print_report_console(text)
 
 
 def save_report(report_md: str, file_path: str):
@@ -0,0 +1,165 @@
+import asyncio
+import random
+import time
+
+import metrics
+
+
+class ProviderError(Exception):
+    """Ошибка запроса к провайдеру LLM с признаком, стоит ли повторять запрос."""
+
+    def __init__(
+        self,
+        message: str,
+        status: int | None = None,
+        retry_after: float | None = None,
+        retryable: bool = False,
+    ):
+        """Сохраняет текст ошибки, HTTP-статус и подсказку Retry-After (в секундах)."""
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Разбирает заголовок Retry-After в секундах (дата HTTP не поддерживается)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """Ведро токенов: не больше rate_per_minute единиц в минуту с накоплением до capacity."""
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        """Создает полное ведро."""
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Пополняет ведро пропорционально прошедшему времени."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """Ждет, пока в ведре наберется amount (запрос больше емкости ждет полного ведра)."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    """Ограничитель параллельных запросов с AIMD-подстройкой лимита.
+
+    Успешный ответ увеличивает лимит примерно на 1 за «окно» из limit запросов,
+    ответ 429/перегрузка уменьшает лимит вдвое.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        """Начинает с максимального лимита."""
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """Ждет свободного места в пределах текущего лимита."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, throttled: bool):
+        """Освобождает место и подстраивает лимит по исходу запроса."""
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class RequestScheduler:
+    """Планировщик запросов к одному провайдеру: лимиты, повторы и адаптивный параллелизм.
+
+    Перед запросом ждет ведра запросов (RPM) и токенов (TPM), затем места в
+    AdaptiveLimiter. Повторяемые ошибки (429, 5xx, сетевые) повторяются с
+    экспоненциальной задержкой и джиттером; Retry-After от сервера приостанавливает
+    все запросы к провайдеру на указанное время.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_concurrency: int = 16,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        """Задает лимиты провайдера и политику повторов."""
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self._paused_until = 0.0
+
+    async def run(self, call, messages: list[dict], estimated_tokens: int = 0) -> str:
+        """Выполняет call(messages) с учетом лимитов; после исчерпания повторов бросает ошибку."""
+        attempt = 0
+        while True:
+            await self._wait_pause()
+            if self.request_bucket is not None:
+                await self.request_bucket.acquire(1)
+            if self.token_bucket is not None and estimated_tokens:
+                await self.token_bucket.acquire(estimated_tokens)
+            await self.limiter.acquire()
+            try:
+                result = await call(messages)
+            except ProviderError as e:
+                await self.limiter.release(throttled=e.retryable)
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e.retry_after)
+                attempt += 1
+                self.retries += 1
+                metrics.incr("retries", status=e.status or "network")
+                print(f"[scheduler] {e}; повтор {attempt}/{self.max_retries} через {delay:.1f} с")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                await self.limiter.release(throttled=False)
+                raise
+            await self.limiter.release(throttled=False)
+            return result
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        """Возвращает задержку перед повтором; Retry-After приостанавливает всех."""
+        if retry_after is not None:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            return retry_after
+        delay = min(self.max_delay, self.base_delay * (2**attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _wait_pause(self):
+        """Ждет окончания паузы, объявленной сервером через Retry-After."""
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import time
+
+
+class ResponseCache:
+    """Дисковый кэш ответов LLM, адресуемый по содержимому запроса."""
+
+    def __init__(
+        self,
+        cache_dir: str | None = None,
+        max_entries: int = 20000,
+        max_age_days: float = 30.0,
+        refresh: bool = False,
+    ):
+        """Готовит каталог кэша и параметры вытеснения.
+
+        refresh=True отключает чтение из кэша, но свежие ответы сохраняются.
+        """
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(__file__), "llm_cache")
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_evict = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, provider: str, model_name: str, messages: list[dict]) -> str:
+        """Строит ключ по провайдеру, модели и содержимому сообщений."""
+        payload = json.dumps(
+            {"provider": provider, "model": model_name, "messages": messages},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """Возвращает путь к файлу записи (с разбиением по префиксу ключа)."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> str | None:
+        """Возвращает сохраненный ответ или None, если записи нет или она устарела."""
+        if self.refresh:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except Exception:
+            self.misses += 1
+            return None
+        if self.max_age and time.time() - entry.get("created", 0) > self.max_age:
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.get("response")
+
+    def set(self, key: str, response: str):
+        """Атомарно сохраняет ответ в кэш и периодически вытесняет старые записи."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created": time.time(), "response": response}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            return
+        self._writes_since_evict += 1
+        if self._writes_since_evict >= max(1, self.max_entries // 10):
+            self.evict()
+
+    def evict(self):
+        """Удаляет устаревшие записи и самые старые сверх лимита max_entries."""
+        self._writes_since_evict = 0
+        now = time.time()
+        entries = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                if self.max_age and now - mtime > self.max_age:
+                    self._remove(path)
+                else:
+                    entries.append((mtime, path))
+        if self.max_entries and len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[: len(entries) - self.max_entries]:
+                self._remove(path)
+
+    def _remove(self, path: str):
+        """Удаляет файл, игнорируя ошибки."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,76 @@
+import json
+import os
+
+
+class RunJournal:
+    """Журнал запуска (append-only JSONL): план и результаты файлов по мере готовности.
+
+    Каждая запись сразу сбрасывается на диск, поэтому после падения запуска
+    его можно продолжить с флагом --resume, не повторяя готовые файлы.
+    Пути файлов хранятся относительно корня проекта.
+    """
+
+    def __init__(self, path: str):
+        """Запоминает путь к журналу; файл открывается при первой записи."""
+        self.path = path
+        self._file = None
+
+    def reset(self):
+        """Начинает журнал заново (обычный запуск без --resume)."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def load(self) -> tuple[str | None, dict[str, tuple[list[str], str]]]:
+        """Читает журнал: текст плана и результаты завершенных файлов.
+
+        Неполная последняя строка (запись оборвалась при падении) пропускается
+        и отрезается от файла, чтобы новые записи --resume не склеились с ней.
+        """
+        plan_text = None
+        results = {}
+        complete = 0
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    complete += len(line)
+                    try:
+                        record = json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        continue
+                    if record.get("type") == "plan":
+                        plan_text = record.get("text")
+                    elif record.get("type") == "file":
+                        results[record["path"]] = (record.get("steps", []), record["result"])
+        except FileNotFoundError:
+            return plan_text, results
+        if os.path.getsize(self.path) > complete:
+            with open(self.path, "r+b") as f:
+                f.truncate(complete)
+        return plan_text, results
+
+    def record_plan(self, plan_text: str):
+        """Записывает план анализа."""
+        self._append({"type": "plan", "text": plan_text})
+
+    def record_file(self, rel_path: str, steps: list[str], result: str):
+        """Записывает результат анализа файла."""
+        self._append({"type": "file", "path": rel_path, "steps": steps, "result": result})
+
+    def _append(self, record: dict):
+        """Дописывает запись и принудительно сбрасывает ее на диск."""
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Закрывает файл журнала."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
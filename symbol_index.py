@@ -0,0 +1,426 @@
+import ast
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+
+import chunker
+from parallel import parallel_map
+
+# Сколько первых строк определения показывать в контексте (сигнатура и начало тела)
+SNIPPET_LINES = 15
+# Имя, определенное в большем числе файлов, берется только из импортируемых модулей
+MAX_CANDIDATES = 3
+# Виды определений, для которых в контекст идет оглавление: заголовок и сигнатуры членов
+_TYPE_KINDS = {"class", "struct", "interface", "enum", "record", "union"}
+_DOCSTRING_QUOTES = ('"""', "'''")
+
+_SQL_STRIP_RE = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:''|[^'])*'", re.DOTALL)
+_BRACE_KEYWORDS = {
+    "if", "for", "while", "switch", "catch", "return", "sizeof", "else", "do", "new",
+    "delete", "synchronized", "try", "throw", "case", "assert", "static_assert",
+    "decltype", "alignof", "typeid", "defined",
+}
+_BRACE_TYPE_RE = re.compile(
+    r"\b(class|struct|interface|enum|record|union)\s+(?:[A-Z_]+\s+)*([A-Za-z_]\w*)[^;{()]*\{"
+)
+# Имя, параметры (с одним уровнем вложенных скобок), квалификаторы и тело
+_BRACE_FUNC_RE = re.compile(
+    r"\b([A-Za-z_][\w:~]*)\s*\((?:[^;{}()]|\([^()]*\))*\)\s*"
+    r"(?:const\b\s*|noexcept\b\s*|override\b\s*|final\b\s*)*"
+    r"(?:throws\s+[\w.,\s]+)?(?::[^;{}]*)?\{"
+)
+_NEW_BEFORE_RE = re.compile(r"\bnew\s*$")
+_BRACE_CALL_RE = re.compile(r"\b([A-Za-z_]\w*)\s*\(")
+_BRACE_TYPE_REF_RE = re.compile(r"\b(?:new\s+)?([A-Z][A-Za-z0-9_]*)\b|\b([A-Za-z_]\w*)::")
+_INCLUDE_RE = re.compile(r'^\s*#\s*include\s*[<"]([^>"]+)[>"]', re.MULTILINE)
+_JAVA_IMPORT_RE = re.compile(r"^\s*import\s+(?:static\s+)?([\w.]+?)(?:\.\*)?\s*;", re.MULTILINE)
+
+_SQL_NAME = r"[\w.\"`\[\]]+"
+_SQL_DEF_RE = re.compile(
+    r"\bCREATE\s+(?:OR\s+REPLACE\s+)?(?:TEMP(?:ORARY)?\s+)?(?:UNIQUE\s+)?"
+    r"(TABLE|VIEW|FUNCTION|PROCEDURE|TRIGGER|INDEX|TYPE|SEQUENCE)\s+"
+    rf"(?:IF\s+NOT\s+EXISTS\s+)?({_SQL_NAME})",
+    re.IGNORECASE,
+)
+_SQL_REF_RE = re.compile(
+    rf"\b(?:FROM|JOIN|INTO|UPDATE|TABLE|EXEC(?:UTE)?|CALL|REFERENCES)\s+({_SQL_NAME})",
+    re.IGNORECASE,
+)
+# Таблицы в SQL-строках внутри кода на других языках (ключевые слова — заглавными)
+_EMBEDDED_SQL_REF_RE = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE)\s+([A-Za-z_][\w.]*)")
+
+
+def extract_symbols(file_path: str) -> tuple:
+    """Возвращает (путь, язык, определения, импорты, ссылки) одного файла.
+
+    Определение — (имя, вид, полное имя, первая строка, последняя строка);
+    импорты — модули/заголовки, на которые ссылается файл; ссылки — Counter
+    имен вызовов и типов. Имена SQL-объектов приводятся к нижнему регистру.
+    """
+    lang = chunker.detect_language(file_path)
+    try:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+            code = file.read()
+    except OSError:
+        return file_path, lang, [], [], Counter()
+    if lang == "Python":
+        definitions, imports, references = _python_symbols(code)
+    elif lang in chunker.BRACE_LANGS:
+        definitions, imports, references = _brace_symbols(code, lang)
+    elif lang == "SQL":
+        definitions, imports, references = _sql_symbols(code)
+    else:
+        return file_path, lang, [], [], Counter()
+    if lang != "SQL":
+        for match in _EMBEDDED_SQL_REF_RE.finditer(code):
+            references[_sql_name(match.group(1))] += 1
+    return file_path, lang, definitions, imports, references
+
+
+def _python_symbols(code: str) -> tuple[list, list, Counter]:
+    """Функции, классы и методы, импорты и вызываемые/используемые имена по ast."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return [], [], Counter()
+    definitions = []
+    imports = []
+    references = Counter()
+
+    def visit(body, prefix):
+        for node in body:
+            if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                first = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                kind = "class" if isinstance(node, ast.ClassDef) else "def"
+                qualname = prefix + node.name
+                definitions.append((node.name, kind, qualname, first, node.end_lineno))
+                visit(node.body, qualname + ".")
+
+    visit(tree.body, "")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.module:
+                imports.append(node.module)
+            for alias in node.names:
+                # from pkg import module — тоже импорт модуля
+                imports.append(f"{node.module}.{alias.name}" if node.module else alias.name)
+                references[alias.name] += 1
+        elif isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Name):
+                references[func.id] += 1
+            elif isinstance(func, ast.Attribute):
+                references[func.attr] += 1
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            references[node.id] += 1
+    return definitions, imports, references
+
+
+def _brace_symbols(code: str, lang: str) -> tuple[list, list, Counter]:
+    """Классы и функции C++/Java по парным скобкам, #include/import, вызовы и типы."""
+    stripped = chunker.BRACE_STRIP_RE.sub(_blank, code)
+    line_starts = _line_starts(stripped)
+    definitions = []
+    for match in _BRACE_TYPE_RE.finditer(stripped):
+        kind, name = match.group(1), match.group(2)
+        first, last = _brace_extent(stripped, line_starts, match.start(), match.end() - 1)
+        definitions.append((name, kind, name, first, last))
+    for match in _BRACE_FUNC_RE.finditer(stripped):
+        qualname = match.group(1)
+        name = qualname.rsplit("::", 1)[-1]
+        start = match.start()
+        # new Foo() { ... } — анонимный класс, а не определение функции
+        if name in _BRACE_KEYWORDS or _NEW_BEFORE_RE.search(stripped, max(0, start - 40), start):
+            continue
+        first, last = _brace_extent(stripped, line_starts, start, match.end() - 1)
+        definitions.append((name, "function", qualname, first, last))
+    definitions.sort(key=lambda item: item[3])
+    if lang == "Java":
+        imports = _JAVA_IMPORT_RE.findall(code)
+    else:
+        imports = [os.path.splitext(header)[0] for header in _INCLUDE_RE.findall(code)]
+    references = Counter()
+    for name in _BRACE_CALL_RE.findall(stripped):
+        if name not in _BRACE_KEYWORDS:
+            references[name] += 1
+    for type_name, scope in _BRACE_TYPE_REF_RE.findall(stripped):
+        references[type_name or scope] += 1
+    for imported in imports:
+        references[imported.rsplit(".", 1)[-1].rsplit("/", 1)[-1]] += 1
+    return definitions, imports, references
+
+
+def _sql_symbols(code: str) -> tuple[list, list, Counter]:
+    """CREATE-объекты SQL (до конца выражения) и ссылки на таблицы и процедуры."""
+    stripped = _SQL_STRIP_RE.sub(_blank, code)
+    line_starts = _line_starts(stripped)
+    definitions = []
+    for match in _SQL_DEF_RE.finditer(stripped):
+        name = _sql_name(match.group(2))
+        end = stripped.find(";", match.end())
+        end = len(stripped) - 1 if end == -1 else end
+        first = _line_of(line_starts, match.start())
+        last = _line_of(line_starts, end)
+        definitions.append((name, match.group(1).lower(), name, first, last))
+    references = Counter()
+    for match in _SQL_REF_RE.finditer(stripped):
+        references[_sql_name(match.group(1))] += 1
+    for name in _BRACE_CALL_RE.findall(stripped):
+        references[name.lower()] += 1
+    return definitions, [], references
+
+
+def _sql_name(raw: str) -> str:
+    """Имя SQL-объекта без схемы, кавычек и скобок, в нижнем регистре."""
+    return re.sub(r"[\"`\[\]]", "", raw).rsplit(".", 1)[-1].lower()
+
+
+def _blank(match: re.Match) -> str:
+    """Заменяет комментарий или литерал пробелами, сохраняя переводы строк."""
+    return re.sub(r"[^\n]", " ", match.group(0))
+
+
+def _line_starts(text: str) -> list[int]:
+    starts = [0]
+    starts.extend(idx + 1 for idx, char in enumerate(text) if char == "\n")
+    return starts
+
+
+def _line_of(line_starts: list[int], pos: int) -> int:
+    """Номер строки (с 1) для позиции в тексте."""
+    low, high = 0, len(line_starts)
+    while low < high:
+        mid = (low + high) // 2
+        if line_starts[mid] <= pos:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def _brace_extent(stripped: str, line_starts: list[int], start: int, brace: int) -> tuple:
+    """Первая и последняя строка блока, открытого скобкой в позиции brace."""
+    depth = 0
+    end = len(stripped) - 1
+    for pos in range(brace, len(stripped)):
+        char = stripped[pos]
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                end = pos
+                break
+    return _line_of(line_starts, start), _line_of(line_starts, end)
+
+
+def _module_keys(rel_path: str) -> list[str]:
+    """Все хвосты пути модуля без расширения: a/b/c.py -> a/b/c, b/c, c."""
+    parts = os.path.splitext(rel_path)[0].replace(os.sep, "/").split("/")
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts = parts[:-1]
+    return ["/".join(parts[idx:]) for idx in range(len(parts))]
+
+
+def _read_lines(file_path: str) -> tuple[str, ...]:
+    try:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+            return tuple(file.read().splitlines())
+    except OSError:
+        return ()
+
+
+class SymbolIndex:
+    """Индекс определений, импортов и ссылок по всем файлам проекта.
+
+    Строится один раз за запуск (build, в пуле процессов); context_for подбирает
+    для файла определения из других файлов, на которые он ссылается, в пределах
+    бюджета токенов. Текст определений читается с диска только при выдаче контекста.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        # Имя -> [(путь, вид, полное имя, первая строка, последняя строка)]
+        self.definitions: dict[str, list[tuple]] = {}
+        self.imports: dict[str, list[str]] = {}
+        self.languages: dict[str, str] = {}
+        self.references: dict[str, Counter] = {}
+        # Хвост пути модуля -> файлы (для сопоставления импортов с файлами)
+        self._modules: dict[str, set[str]] = {}
+        self._file_definitions: dict[str, list[tuple]] = {}
+        # Текст файлов для фрагментов; кэш живет вместе с индексом, поэтому повторный
+        # анализ того же пути (например, в процессе пакетного режима) читает файл заново
+        self._file_lines = lru_cache(maxsize=256)(_read_lines)
+
+    @classmethod
+    def build(cls, files: list[str], root: str, workers: int | None = None) -> "SymbolIndex":
+        """Разбирает файлы параллельно и строит индекс."""
+        index = cls(root)
+        for file_path, lang, definitions, imports, references in parallel_map(
+            extract_symbols, files, workers, label="symbols"
+        ):
+            index.add(file_path, lang, definitions, imports, references)
+        return index
+
+    def add(
+        self,
+        file_path: str,
+        lang: str,
+        definitions: list,
+        imports: list[str],
+        references: Counter,
+    ):
+        """Добавляет в индекс символы одного файла."""
+        entries = []
+        for name, kind, qualname, first, last in definitions:
+            entry = (file_path, kind, qualname, first, last)
+            self.definitions.setdefault(name, []).append(entry)
+            entries.append(entry)
+        self._file_definitions[file_path] = entries
+        self.imports[file_path] = imports
+        self.languages[file_path] = lang
+        self.references[file_path] = references
+        for key in _module_keys(os.path.relpath(file_path, self.root)):
+            self._modules.setdefault(key, set()).add(file_path)
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self.definitions.values())
+
+    def _imported_files(self, file_path: str) -> set[str]:
+        """Файлы проекта, которые импортирует файл (по хвостам путей модулей)."""
+        imported = set()
+        for module in self.imports.get(file_path, []):
+            imported.update(self._modules.get(module.replace(".", "/").strip("/"), ()))
+        return imported
+
+    def related(self, file_path: str) -> list[tuple]:
+        """Определения из других файлов, на которые ссылается файл, по убыванию пользы.
+
+        Выше — определения из импортируемых файлов и файлов того же каталога, затем
+        однозначные имена и имена с большим числом ссылок. Слишком распространенные
+        имена без импорта (например, run или get в десятке файлов) не берутся, как и
+        методы классов, которые файл не упоминает. В Python чужое имя доступно только
+        через импорт, поэтому определения Python берутся лишь из импортируемых модулей.
+        """
+        imported = self._imported_files(file_path)
+        directory = os.path.dirname(file_path)
+        lang = self.languages.get(file_path)
+        # Определения берутся из файлов того же языка; таблицы и процедуры SQL — для всех
+        allowed = {lang, "SQL"}
+        references = self.references.get(file_path, {})
+        ranked = []
+        for name, count in references.items():
+            candidates = [
+                d
+                for d in self.definitions.get(name, ())
+                if d[0] != file_path and self.languages.get(d[0]) in allowed
+            ]
+            if not candidates:
+                continue
+            for definition in candidates:
+                owner = _owner_name(definition[2])
+                if owner and not references.get(owner):
+                    continue
+                def_path = definition[0]
+                from_import = def_path in imported or os.path.dirname(def_path) == directory
+                if not from_import and lang == "Python" == self.languages.get(def_path):
+                    continue
+                if not from_import and len(candidates) > MAX_CANDIDATES:
+                    continue
+                score = 2 * from_import + (len(candidates) == 1)
+                ranked.append((-score, -count, name, definition))
+        ranked.sort(key=lambda item: item[:3] + (item[3][0], item[3][3]))
+        return [definition for *_, definition in ranked]
+
+    def context_for(self, file_path: str, max_tokens: int) -> str:
+        """Текст определений, на которые ссылается файл, не больше max_tokens токенов."""
+        blocks = []
+        used = 0
+        covered: dict[str, list[tuple[int, int]]] = {}
+        for def_path, kind, qualname, first, last in self.related(file_path):
+            # Метод внутри уже выбранного класса повторно не показывается
+            if any(a <= first and last <= b for a, b in covered.get(def_path, ())):
+                continue
+            lines = self._snippet((def_path, kind, qualname, first, last))
+            if not lines:
+                continue
+            rel_path = os.path.relpath(def_path, self.root)
+            block = f"# {rel_path}:{first} ({kind} {qualname})\n" + "\n".join(lines)
+            tokens = chunker.estimate_tokens(block)
+            if used + tokens > max_tokens:
+                continue
+            blocks.append(block)
+            used += tokens
+            covered.setdefault(def_path, []).append((first, last))
+        return "\n\n".join(blocks)
+
+    def _snippet(self, definition: tuple) -> list[str]:
+        """Строки определения для контекста.
+
+        Для классов — заголовок и сигнатуры прямых членов, для функций — первые
+        SNIPPET_LINES строк (многострочная строка документации Python сворачивается).
+        """
+        def_path, kind, _, first, last = definition
+        lines = self._file_lines(def_path)
+        if kind in _TYPE_KINDS:
+            members = []
+            member_end = first
+            for member in self._file_definitions.get(def_path, ()):
+                # Прямые члены: внутри класса, но не внутри предыдущего члена
+                if first < member[3] <= last and member[3] > member_end:
+                    members.append(member)
+                    member_end = member[4]
+            if members:
+                outline = [lines[first - 1]] if first <= len(lines) else []
+                for member in members[: SNIPPET_LINES - 1]:
+                    outline.append(_signature_line(lines, member))
+                if len(members) >= SNIPPET_LINES:
+                    outline.append("    ...")
+                return outline
+        body = list(lines[first - 1 : last])
+        if self.languages.get(def_path) == "Python":
+            body = _collapse_docstring(body)
+        if len(body) > SNIPPET_LINES:
+            return body[:SNIPPET_LINES] + ["    ..."]
+        return body
+
+
+def _owner_name(qualname: str) -> str | None:
+    """Имя класса метода из полного имени (Class.method, Class::method) или None."""
+    for separator in (".", "::"):
+        if separator in qualname:
+            return qualname.rsplit(separator, 1)[0].rsplit(separator, 1)[-1]
+    return None
+
+
+def _signature_line(lines: tuple[str, ...], definition: tuple) -> str:
+    """Строка с именем члена класса (после декораторов и аннотаций)."""
+    _, _, qualname, first, last = definition
+    name = re.split(r"\.|::", qualname)[-1]
+    for line in lines[first - 1 : min(last, first + 4)]:
+        if name in line:
+            return line
+    return lines[first - 1] if first <= len(lines) else ""
+
+
+def _collapse_docstring(body: list[str]) -> list[str]:
+    """Оставляет от многострочной строки документации Python только первую строку."""
+    result = []
+    skipping = None
+    for line in body:
+        stripped = line.strip()
+        if skipping:
+            if skipping in stripped:
+                skipping = None
+            continue
+        if len(result) < 3 and stripped[:3] in _DOCSTRING_QUOTES:
+            quote = stripped[:3]
+            result.append(line)
+            if stripped.count(quote) == 1:
+                skipping = quote
+            continue
+        result.append(line)
+    return result
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+
+class StubHTTPServer:
+    """Локальный HTTP/1.1-сервер для тестов транспорта.
+
+    На каждый запрос по порядку отдает заранее заданный ответ — список кусков
+    байтов; куски пишутся с паузой, чтобы клиент получал их отдельными чтениями.
+    Ответ с close=True закрывает соединение после отправки.
+    Считает принятые соединения и сохраняет тела запросов (JSON).
+    """
+
+    def __init__(self, responses: list[dict]):
+        """responses — [{"parts": [bytes, ...], "close": bool}, ...]."""
+        self.responses = list(responses)
+        self.requests: list[dict] = []
+        self.connections = 0
+        self._server = None
+
+    async def start(self) -> str:
+        """Запускает сервер на свободном порту и возвращает URL."""
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v1/chat/completions"
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                body = await reader.readexactly(length)
+                self.requests.append(json.loads(body or b"null"))
+                response = self.responses.pop(0)
+                for part in response["parts"]:
+                    writer.write(part)
+                    await writer.drain()
+                    await asyncio.sleep(0.01)
+                if response.get("close"):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def chunked(*pieces: bytes) -> bytes:
+    """Кодирует куски тела в Transfer-Encoding: chunked (с завершающим нулевым куском)."""
+    out = b"".join(b"%x\r\n%s\r\n" % (len(piece), piece) for piece in pieces)
+    return out + b"0\r\n\r\n"
@@ -0,0 +1,34 @@
+import pytest
+
+import chunker
+
+
+def _code_with_blob(blob_chars: int) -> str:
+    functions = "".join(f"def f{n}(x):\n    return x + {n}\n\n" for n in range(200))
+    return functions + f'BLOB = "{"A" * blob_chars}"\n' + "def tail():\n    return BLOB\n"
+
+
+@pytest.mark.parametrize("lang", ["Python", "Generic"])
+@pytest.mark.parametrize("budget", [1, 50, 3000])
+def test_windows_never_exceed_budget_with_huge_line(lang, budget):
+    code = _code_with_blob(240_000)
+    windows = chunker.split_code(code, lang, budget)
+    assert all(chunker.estimate_tokens(text) <= budget for _, _, text in windows)
+    # Все строки файла покрыты окнами по порядку
+    assert windows[0][0] == 1 and windows[-1][1] == len(code.splitlines())
+    for (_, last, _), (first, _, _) in zip(windows, windows[1:]):
+        assert first == last + 1
+
+
+def test_huge_line_is_truncated_with_marker():
+    code = _code_with_blob(240_000)
+    blob_line = next(n for n, line in enumerate(code.splitlines(), 1) if line.startswith("BLOB"))
+    windows = chunker.split_code(code, "Python", 3000)
+    blob_window = next(w for w in windows if w[0] <= blob_line <= w[1])
+    assert blob_window[0] == blob_window[1] == blob_line
+    assert blob_window[2].startswith('BLOB = "AAA')
+    assert blob_window[2].rstrip().endswith(chunker.TRUNCATED_LINE_MARKER)
+    # Обычные строки не обрезаются
+    rest = "".join(text for first, _, text in windows if first != blob_line)
+    assert chunker.TRUNCATED_LINE_MARKER not in rest
+    assert "def f199(x):" in rest and "def tail():" in rest
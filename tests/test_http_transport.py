@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from http_stub import StubHTTPServer, chunked
+from http_transport import AsyncHTTPTransport
+
+OK_HEAD = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _exchange(responses: list[dict], count: int):
+    """Выполняет count запросов через один транспорт; возвращает ответы и сервер."""
+    server = StubHTTPServer(responses)
+    url = await server.start()
+    transport = AsyncHTTPTransport(pool_size=1, timeout=5)
+    try:
+        results = [await transport.post_json(url, {"n": n}) for n in range(count)]
+    finally:
+        await transport.close()
+        await server.close()
+    return results, server
+
+
+def test_content_length_reuses_connection():
+    body = b'{"ok": true}'
+    response = {"parts": [OK_HEAD + b"Content-Length: %d\r\n\r\n" % len(body), body]}
+    results, server = run(_exchange([dict(response) for _ in range(3)], 3))
+    assert [result.json() for result in results] == [{"ok": True}] * 3
+    assert server.requests == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert server.connections == 1
+
+
+def test_chunked_body_split_across_reads():
+    head = OK_HEAD + b"Transfer-Encoding: chunked\r\n\r\n"
+    body = b"5\r\nhel" + b"lo\r\n6;ext=1\r\n world\r\n" + b"0\r\nX-Trailer: 1\r\n\r\n"
+    responses = [
+        {"parts": [head, body[:8], body[8:25], body[25:]]},
+        {"parts": [head + chunked(b'{"second": ', b"1}")]},
+    ]
+    results, server = run(_exchange(responses, 2))
+    assert results[0].body == b"hello world"
+    assert results[1].json() == {"second": 1}
+    # После полного чтения chunked-тела (с trailers) соединение вернулось в пул
+    assert server.connections == 1
+
+
+def test_connection_close_is_not_reused():
+    body = b"{}"
+    closing = {
+        "parts": [OK_HEAD + b"Connection: close\r\nContent-Length: 2\r\n\r\n" + body],
+        "close": True,
+    }
+    plain = {"parts": [OK_HEAD + b"Content-Length: 2\r\n\r\n" + body]}
+    results, server = run(_exchange([closing, plain], 2))
+    assert [result.json() for result in results] == [{}, {}]
+    assert server.connections == 2
+
+
+def test_idle_connection_closed_by_server_is_replaced():
+    body = b"{}"
+    # Сервер закрывает соединение без заголовка Connection: close
+    response = {"parts": [OK_HEAD + b"Content-Length: 2\r\n\r\n" + body], "close": True}
+    results, server = run(_exchange([dict(response), dict(response)], 2))
+    assert [result.json() for result in results] == [{}, {}]
+    assert server.connections == 2
+
+
+def test_truncated_content_length_raises():
+    response = {"parts": [OK_HEAD + b"Content-Length: 10\r\n\r\n", b"abc"], "close": True}
+    with pytest.raises(asyncio.IncompleteReadError):
+        run(_exchange([response], 1))
+
+
+def test_truncated_chunked_body_raises():
+    # Соединение оборвалось до завершающего нулевого куска
+    head = OK_HEAD + b"Transfer-Encoding: chunked\r\n\r\n"
+    response = {"parts": [head, b"5\r\nhello\r\n"], "close": True}
+    with pytest.raises(asyncio.IncompleteReadError):
+        run(_exchange([response], 1))
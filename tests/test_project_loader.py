@@ -0,0 +1,102 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from project_loader import ProjectLoader
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git не установлен")
+
+GIT_USER = ["-c", "user.name=test", "-c", "user.email=test@example.com"]
+
+
+def git(*args: str, cwd: str) -> str:
+    result = subprocess.run(
+        ["git", *GIT_USER, *args], cwd=cwd, check=True, capture_output=True, text=True
+    )
+    return result.stdout.strip()
+
+
+def commit_file(work: str, rel_path: str, text: str) -> str:
+    """Коммитит файл в рабочую копию, отправляет в remote и возвращает хэш коммита."""
+    path = os.path.join(work, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    git("add", rel_path, cwd=work)
+    git("commit", "-q", "-m", f"update {rel_path}", cwd=work)
+    git("push", "-q", "origin", "HEAD:main", cwd=work)
+    return git("rev-parse", "HEAD", cwd=work)
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """Локальный bare-репозиторий в роли удаленного и рабочая копия для новых коммитов."""
+    bare = tmp_path / "remote.git"
+    work = tmp_path / "work"
+    git("init", "-q", "--bare", "-b", "main", str(bare), cwd=str(tmp_path))
+    git("clone", "-q", str(bare), str(work), cwd=str(tmp_path))
+    git("checkout", "-q", "-b", "main", cwd=str(work))
+    commit_file(str(work), "src/main.c", "int main(void) { return 0; }\n")
+    commit_file(str(work), "docs/readme.txt", "docs\n")
+    # sandbox/ создается в текущей папке
+    monkeypatch.chdir(tmp_path)
+    return f"file://{bare}", str(work)
+
+
+def test_mirror_created_then_refreshed(remote, capsys):
+    url, work = remote
+    loader = ProjectLoader()
+    first = loader.clone_project(url)
+    mirror = loader._mirror_path(url)
+    assert os.path.isdir(mirror)
+    assert "Создание зеркала" in capsys.readouterr().out
+
+    head = commit_file(work, "src/util.c", "int util(void) { return 1; }\n")
+    second = loader.clone_project(url)
+    assert "Обновление зеркала" in capsys.readouterr().out
+    # Новый коммит удаленного репозитория подтянут в зеркало и в рабочую копию
+    assert loader.get_head_commit(second) == head
+    assert os.path.isfile(os.path.join(second, "src", "util.c"))
+    assert not os.path.exists(os.path.join(first, "src", "util.c"))
+
+
+def test_broken_mirror_is_recreated(remote, capsys):
+    url, _ = remote
+    loader = ProjectLoader()
+    mirror = loader._mirror_path(url)
+    os.makedirs(mirror)
+    project = loader.clone_project(url)
+    out = capsys.readouterr().out
+    assert "Не удалось обновить зеркало" in out
+    assert "Создание зеркала" in out
+    assert os.path.isfile(os.path.join(project, "src", "main.c"))
+
+
+def test_sparse_checkout_only_listed_dirs(remote):
+    url, _ = remote
+    project = ProjectLoader(sparse_paths=["src"]).clone_project(url)
+    assert os.path.isfile(os.path.join(project, "src", "main.c"))
+    assert not os.path.exists(os.path.join(project, "docs"))
+
+
+def test_blobless_clone_bypasses_mirror(remote):
+    url, _ = remote
+    loader = ProjectLoader(blobless=True)
+    project = loader.clone_project(url)
+    assert os.path.isfile(os.path.join(project, "src", "main.c"))
+    assert not os.path.exists(loader.mirror_dir)
+
+
+def test_shallow_mirror_is_separate(remote):
+    url, _ = remote
+    full = ProjectLoader()
+    shallow = ProjectLoader(depth=1)
+    full.clone_project(url)
+    project = shallow.clone_project(url)
+    full_mirror, shallow_mirror = full._mirror_path(url), shallow._mirror_path(url)
+    assert shallow_mirror.endswith("_depth1.git") and shallow_mirror != full_mirror
+    assert git("rev-parse", "--is-shallow-repository", cwd=shallow_mirror) == "true"
+    assert git("rev-parse", "--is-shallow-repository", cwd=full_mirror) == "false"
+    assert git("rev-list", "--count", "HEAD", cwd=project) == "1"
@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import pytest
+
+import metrics
+from http_stub import StubHTTPServer, chunked
+from http_transport import AsyncHTTPTransport
+from openai_compat_api import OpenAICompatibleAPI
+from request_scheduler import ProviderError
+
+SSE_HEAD = (
+    b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+    b"Transfer-Encoding: chunked\r\n\r\n"
+)
+
+
+def _event(data) -> bytes:
+    text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    return f"data: {text}\r\n\r\n".encode("utf-8")
+
+
+def _delta(content: str) -> bytes:
+    return _event({"choices": [{"delta": {"content": content}}]})
+
+
+def _sse_response(*events: bytes, split: int = 7) -> dict:
+    """SSE-ответ, тело которого приходит кусками по split байт (в том числе внутри UTF-8)."""
+    body = chunked(b"".join(events))
+    parts = [body[pos : pos + split] for pos in range(0, len(body), split)]
+    return {"parts": [SSE_HEAD, *parts]}
+
+
+async def _call(responses: list[dict], count: int = 1):
+    """Выполняет count потоковых запросов; возвращает ответы (или исключения) и сервер."""
+    server = StubHTTPServer(responses)
+    url = await server.start()
+    transport = AsyncHTTPTransport(pool_size=1, timeout=5)
+    model = OpenAICompatibleAPI(
+        "stub-model", url, "key", transport=transport, stream=True, memory=object()
+    )
+    results = []
+    try:
+        for _ in range(count):
+            try:
+                results.append(await model.call_model([{"role": "user", "content": "x"}]))
+            except ProviderError as e:
+                results.append(e)
+    finally:
+        await transport.close()
+        await server.close()
+    return results, server
+
+
+def test_iter_lines_reassembles_split_lines():
+    body = "data: first\r\n\r\ndata: вторая\n: comment\r\ndata: last".encode("utf-8")
+
+    async def scenario():
+        # Второй кусок заканчивается посреди двухбайтовой буквы
+        parts = [SSE_HEAD, chunked(body[:5], body[5:26], body[26:])]
+        server = StubHTTPServer([{"parts": parts}])
+        url = await server.start()
+        transport = AsyncHTTPTransport(timeout=5)
+        try:
+            async with await transport.stream_post_json(url, {}) as stream:
+                return [line async for line in stream.iter_lines()]
+        finally:
+            await transport.close()
+            await server.close()
+
+    lines = asyncio.run(scenario())
+    assert lines == ["data: first", "", "data: вторая", ": comment", "data: last"]
+
+
+def test_stream_collects_deltas_and_usage():
+    metrics.reset()
+    usage = {"choices": [], "usage": {"prompt_tokens": 11, "completion_tokens": 3}}
+    response = _sse_response(
+        _event({"choices": [{"delta": {"role": "assistant"}}]}),
+        _delta("Ошибка "),
+        _delta("в строке 4"),
+        _event(usage),
+        _event("[DONE]"),
+    )
+    results, server = asyncio.run(_call([response, dict(response)], count=2))
+    assert results == ["Ошибка в строке 4", "Ошибка в строке 4"]
+    assert server.requests[0]["stream"] is True
+    # Поток дочитан до конца: соединение вернулось в пул и использовано повторно
+    assert server.connections == 1
+    counters = {c["name"]: c["value"] for c in metrics.get_metrics().to_dict()["counters"]}
+    assert counters["prompt_tokens"] == 22
+    assert counters["completion_tokens"] == 6
+
+
+def test_stream_error_event_becomes_error_result():
+    response = _sse_response(_delta("частичный"), _event({"error": {"message": "overloaded"}}))
+    results, _ = asyncio.run(_call([response]))
+    assert results[0].startswith("ERROR:")
+    assert "overloaded" in results[0]
+
+
+def test_stream_malformed_event_becomes_error_result():
+    response = _sse_response(_delta("a"), b"data: {not json\r\n\r\n")
+    results, _ = asyncio.run(_call([response]))
+    assert results[0].startswith("ERROR: Некорректный ответ")
+
+
+def test_stream_status_error_is_retryable_with_retry_after():
+    body = b'{"error": "rate limited"}'
+    head = b"HTTP/1.1 429 Too Many Requests\r\nRetry-After: 2\r\nContent-Length: %d\r\n\r\n"
+    results, _ = asyncio.run(_call([{"parts": [head % len(body), body]}]))
+    error = results[0]
+    assert isinstance(error, ProviderError)
+    assert error.status == 429 and error.retryable and error.retry_after == 2
+    assert "rate limited" in str(error)
+
+
+def test_stream_cut_mid_body_is_retryable():
+    body = b"".join([_delta("начало"), _delta("продолжение")])
+    # Чанк объявлен длиннее, чем пришло до закрытия соединения
+    response = {"parts": [SSE_HEAD, b"%x\r\n" % (len(body) + 50), body], "close": True}
+    results, _ = asyncio.run(_call([response]))
+    assert isinstance(results[0], ProviderError)
+    assert results[0].retryable
+
+
+def test_stream_closed_without_final_chunk_is_retryable():
+    event = _delta("a")
+    response = {"parts": [SSE_HEAD, b"%x\r\n%s\r\n" % (len(event), event)], "close": True}
+    results, _ = asyncio.run(_call([response]))
+    assert isinstance(results[0], ProviderError)
+    assert results[0].retryable
+
+
+@pytest.mark.parametrize("split", [3, 64])
+def test_stream_any_split_gives_same_text(split):
+    response = _sse_response(
+        _delta("Проблем "), _delta("не найдено"), _event("[DONE]"), split=split
+    )
+    results, _ = asyncio.run(_call([response]))
+    assert results == ["Проблем не найдено"]